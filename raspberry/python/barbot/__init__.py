@@ -1,16 +1,36 @@
 """ All the BarBot logic
 """
+import asyncio
 import subprocess
 import logging
+import os
 import time
-from typing import Callable, List, NamedTuple
+from dataclasses import replace
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
 from enum import Enum, auto
 from .recipes import PartyCollection,Recipe,RecipeItem
-from .config import BarBotConfig, IngredientType, PortConfiguration
-from .communication import Mainboard, CommunicationResult, BoardType, ResponseTypes
-from .communication import ErrorType as CommError, LEDMode, PlatformLEDMode
+from .config import BarBotConfig, Ingredient, PortConfiguration, PORT_COUNT, data_directory
+from .config import GLASS_REMOVAL_DELAY, HANDS_OFF_DELAY
+from .communication import Mainboard, AsyncMainboard, CommunicationResult, BoardType, ResponseTypes
+from .communication import ErrorType as CommError, LEDMode, PlatformLEDMode, CONNECTION_TIMEOUT
+from .communication import CommandStatistics, RawResponse, is_mainboard_error
+from .checkpoint import CheckpointStore, MixingCheckpoint
+from .clock import Clock
+from .events import Event, EventQueue, EventType, StateTransition, TransitionTrace
+from .flow import FlowAlert, FlowRateModel
+from .heartbeat import IdleHeartbeat, IdleMetrics
+from .inventory import PortInventory
+from .orders import Order, OrderMetrics, OrderQueue
+from .overshoot import OvershootModel
+from .planner import MotionModel, choose_port, plan_items, port_position
+from .reconnect import ReconnectManager, ReconnectMetrics
+from .program import MixingProgram, ProgramStep, StepType, compile_mixing
+from .program import ProgramResult, StepwiseProgramExecutor, UploadProgramExecutor
+from .timeline import Timeline, TimelineAccuracy, TimelineAccuracyReport, TimelineSimulator
 
 MIN_IDLE_TIME_SEC = 0.1
+# interval in seconds the glass is checked while waiting for it to be placed or removed
+GLASS_CHECK_INTERVAL = 0.5
 
 def run_command(cmd_str):
     """Run a linux command discarding all its output
@@ -39,6 +59,8 @@ class UserMessageType(Enum):
     BOARD_NOT_CONNECTED_STRAW = auto()
     BOARD_NOT_CONNECTED_CRUSHER = auto()
     BOARD_NOT_CONNECTED_SUGAR = auto()
+    RESUME_MIXING = auto()
+    INGREDIENTS_RUNNING_LOW = auto()
 
 class UserInputType(Enum):
     """Enumeration of the possible user inputs"""
@@ -59,6 +81,42 @@ class BarBotState(Enum):
     CRUSHING = auto()
     STRAW = auto()
 
+class _StateTransitions(NamedTuple):
+    """Transitions of the state machine that leave a state"""
+    # state after the state function returned without changing the state
+    finished: BarBotState
+    # states the user can start while the barbot is in the state
+    startable: FrozenSet[BarBotState]
+
+_RECONNECT = frozenset([BarBotState.CONNECTING])
+_ACTIONS = frozenset([
+    BarBotState.MIXING,
+    BarBotState.CLEANING,
+    BarBotState.CLEANING_CYCLE,
+    BarBotState.SINGLE_INGREDIENT,
+    BarBotState.CRUSHING,
+    BarBotState.STRAW
+])
+
+_TRANSITIONS: Dict[BarBotState, _StateTransitions] = {
+    BarBotState.CONNECTING: _StateTransitions(BarBotState.CONNECTING, _RECONNECT),
+    BarBotState.SEARCHING: _StateTransitions(BarBotState.SEARCHING, _RECONNECT),
+    BarBotState.STARTUP: _StateTransitions(BarBotState.STARTUP, _RECONNECT),
+    BarBotState.IDLE: _StateTransitions(BarBotState.IDLE, _ACTIONS | _RECONNECT),
+    BarBotState.MIXING: _StateTransitions(BarBotState.IDLE, frozenset()),
+    BarBotState.CLEANING: _StateTransitions(BarBotState.IDLE, frozenset()),
+    BarBotState.CLEANING_CYCLE: _StateTransitions(BarBotState.IDLE, frozenset()),
+    BarBotState.SINGLE_INGREDIENT: _StateTransitions(BarBotState.IDLE, frozenset()),
+    BarBotState.CRUSHING: _StateTransitions(BarBotState.IDLE, frozenset()),
+    BarBotState.STRAW: _StateTransitions(BarBotState.IDLE, frozenset()),
+}
+
+class _StartCommand(NamedTuple):
+    """Value of a START event"""
+    state: BarBotState
+    # prepares the state, called by the state machine right before the state is entered
+    prepare: Callable[[], None] = None
+
 class _IdleTaskType(Enum):
     GET = auto()
     SET = auto()
@@ -75,11 +133,20 @@ class _IdleTask():
 
     def execute(self, mainboard:Mainboard):
         """Call this in idle of barbot"""
-        result = {
+        self._handle_result(self._get_method(mainboard)(self._command, *self._parameters))
+
+    async def execute_async(self, mainboard:AsyncMainboard):
+        """Call this in idle of barbot when running in an event loop"""
+        self._handle_result(await self._get_method(mainboard)(self._command, *self._parameters))
+
+    def _get_method(self, mainboard):
+        return {
             _IdleTaskType.DO: mainboard.do,
             _IdleTaskType.GET: mainboard.get,
             _IdleTaskType.SET: mainboard.set
-        }.get(self._task_type)(self._command, *self._parameters)
+        }.get(self._task_type)
+
+    def _handle_result(self, result: CommunicationResult):
         if self._callback is not None:
             self._callback(result)
 
@@ -90,8 +157,13 @@ class MixingOptions(NamedTuple):
     add_ice: bool = False
 
 class BarBot():
-    """The main class containing the statemachine of the barbot"""
-    def __init__(self, config: BarBotConfig, ports: PortConfiguration, mainboard: Mainboard):
+    """The main class containing the statemachine of the barbot
+    :param clock: Clock used for all delays, a virtual clock runs simulations faster than real time
+    :param directory: Directory the learned models, the checkpoint and the order queue are saved in
+    """
+    def __init__(self, config: BarBotConfig, ports: PortConfiguration, mainboard: Mainboard,
+                 clock: Clock = None, directory: str = data_directory):
+        self._clock = clock if clock is not None else Clock()
         self._abort = False
         self._user_input:UserInputType = UserInputType.UNDEFINED
         self._abort_mixing = False
@@ -105,24 +177,66 @@ class BarBot():
         self._state = BarBotState.CONNECTING
         self._current_mixing_options: MixingOptions = None
         self._current_recipe_item: RecipeItem = None
+        # port of the draft that failed, it is shown to the user
+        self._current_port: int = None
+        # ports that ran empty, other ports with the same ingredient are preferred
+        self._empty_ports: Set[int] = set()
+        self._inventory = PortInventory(load_on_init=False, directory=directory)
+        self._flow_model = FlowRateModel(load_on_init=False, directory=directory)
+        self._overshoot_model = OvershootModel(load_on_init=False, directory=directory)
+        self._timeline_accuracy = TimelineAccuracy()
+        # start time and predicted duration of the drink that is mixed
+        self._current_prediction: Tuple[float, float] = None
         self._config = config
         self._ports = ports
         self._parties = PartyCollection()
+        self._checkpoints = CheckpointStore(os.path.join(directory, "checkpoint.yaml"))
+        # checkpoint of an interrupted drink that is offered to be resumed
+        self._resume_checkpoint: MixingCheckpoint = None
+        self._orders = OrderQueue(os.path.join(directory, "queue.yaml"), self._clock)
+        # the next order is started after the glass of the previous drink was removed
+        self._glass_removal_pending = False
+        self._next_glass_check_time = 0
         self._mainboard = mainboard
-        self._state_changed: bool = False
+        # events from other threads, they are handled by the state machine
+        self._events = EventQueue(self._clock)
+        self._transitions = TransitionTrace()
+        # abort event that was handled while the state function runs
+        self._abort_event: Event = None
+        self._saved_round_trips_last_drink = 0
+        self._heartbeat = IdleHeartbeat(
+            config.idle_poll_min_interval, config.idle_poll_max_interval, clock=self._clock
+        )
+        self._reconnect = ReconnectManager(self._mainboard.find_bar_bot, clock=self._clock)
         # callbacks
         self.on_mixing_finished: Callable[[Recipe], None] = lambda current_recipe: None
         self.on_mixing_progress_changed: Callable[[int], None] = lambda progress: None
         self.on_state_changed: Callable[[BarBotState], None] = lambda state: None
         self.on_message_changed: Callable[[UserMessageType], None] = lambda message: None
+        self.on_orders_changed: Callable[[], None] = lambda: None
+        self.on_inventory_changed: Callable[[], None] = lambda: None
+        self.on_flow_alert: Callable[[FlowAlert], None] = lambda alert: None
+
+        # messages of the mainboard wake up the waiting state machine
+        self._mainboard.on_message_received = self._message_received
 
-        # make sure all state functions are defined
-        unknown_state = None
+        # look up the state functions once, make sure all of them are defined
+        self._state_functions: Dict[BarBotState, Callable[[], None]] = {}
         for state in BarBotState:
-            if not hasattr(self, self._get_state_function_name(state)):
-                unknown_state = state
-                break
-        assert unknown_state is None, f"State function not found: {unknown_state.name}"
+            function = getattr(self, self._get_state_function_name(state), None)
+            assert function is not None, f"State function not found: {state.name}"
+            assert state in _TRANSITIONS, f"Transitions not defined: {state.name}"
+            self._state_functions[state] = function
+        self._event_handlers: Dict[EventType, Callable[[Event], None]] = {
+            EventType.USER_INPUT: self._on_user_input,
+            EventType.USER_ACTIVITY: lambda event: self._heartbeat.notify_activity(),
+            EventType.ABORT: self._on_abort,
+            EventType.ORDER: self._on_order,
+            EventType.START: self._on_start,
+            EventType.IDLE_TASK: self._on_idle_task,
+            EventType.BOTTLES_CHANGED: self._on_bottles_changed,
+            EventType.MESSAGE_RECEIVED: lambda event: self._mainboard.discard_pending_messages(),
+        }
 
     @property
     def parties(self) -> PartyCollection:
@@ -154,26 +268,141 @@ class BarBot():
         """Get the ricipe item that is being drafted"""
         return self._current_recipe_item
 
+    @property
+    def current_port(self) -> int:
+        """Get the port of the draft that failed, None if no draft failed"""
+        return self._current_port
+
+    @property
+    def inventory(self) -> PortInventory:
+        """Get the fill levels of the ports"""
+        return self._inventory
+
+    @property
+    def flow_model(self) -> FlowRateModel:
+        """Get the learned flow rates of the ports"""
+        return self._flow_model
+
+    @property
+    def overshoot_model(self) -> OvershootModel:
+        """Get the learned overshoot and the accuracy of the drafts"""
+        return self._overshoot_model
+
+    @property
+    def empty_ports(self) -> Set[int]:
+        """Get the ports that ran empty and were not refilled yet"""
+        return set(self._empty_ports)
+
+    @property
+    def saved_round_trips_last_drink(self) -> int:
+        """Number of SET commands that were skipped for the last drink, because their values were known"""
+        return self._saved_round_trips_last_drink
+
     @property
     def state(self):
         """Get the current state of the barbot"""
         return self._state
+
+    @property
+    def transitions(self) -> List[StateTransition]:
+        """Get the last state changes with their time and the event that caused them"""
+        return self._transitions.transitions
     
     def _delay_and_keep_communicating(self, seconds):
-        """Delay the state machine but keep checking the idle state to handle the communication"""
-        start_time = time.time()
-        while time.time() - start_time > seconds:
-            time_at_send = time.time()
-            self._mainboard.get("IsIdle")
-            self._mainboard.read_message()
-            time_diff = time.time() - time_at_send
-            if time_diff < MIN_IDLE_TIME_SEC:
-                time.sleep(MIN_IDLE_TIME_SEC - time_diff)
+        """Delay the state machine but keep checking the idle state to handle the communication.
+        In between the checks the state machine waits for events, an abort ends the delay."""
+        end_time = self._clock.time() + seconds
+        next_check_time = self._clock.time()
+        while not self._is_waiting_aborted and self._clock.time() < end_time:
+            if self._clock.time() >= next_check_time:
+                self._mainboard.get("IsIdle")
+                next_check_time = self._clock.time() + self._disconnect_check_interval
+            self._wait_for_event(min(next_check_time, end_time) - self._clock.time())
 
     def _reset_user_input(self):
-        """Reset the user input to UserInput.UNDEFINED"""
+        """Reset the user input to UserInput.UNDEFINED.
+        Answers that were given before are discarded."""
+        self._handle_events()
         self._user_input = UserInputType.UNDEFINED
 
+    def _post(self, event_type: EventType, value=None) -> Event:
+        """Add an event for the state machine and wake it up"""
+        event = self._events.put(event_type, value)
+        # the idle state of the event loop waits for the heartbeat
+        self._heartbeat.wake()
+        return event
+
+    def _handle_event(self, event: Event):
+        """Handle an event in the thread of the state machine.
+        Events without handler only wake up the state machine."""
+        handler = self._event_handlers.get(event.type)
+        if handler is not None:
+            handler(event)
+
+    def _handle_events(self):
+        """Handle all pending events without waiting"""
+        while len(self._events) > 0:
+            self._handle_event(self._events.get())
+
+    def _wait_for_event(self, timeout: float):
+        """Wait until an event arrives or the timeout passed and handle it
+        :param timeout: Maximum time to wait in seconds
+        """
+        self._handle_event(self._events.get(timeout))
+
+    def _message_received(self, message: RawResponse):
+        """Called by the reader thread for every message of the mainboard"""
+        # status messages are sent periodically, they do not need a reaction
+        if message.message_type != ResponseTypes.STATUS:
+            self._post(EventType.MESSAGE_RECEIVED)
+
+    def _on_user_input(self, event: Event):
+        self._user_input = event.value
+        logging.debug("User input: %s", event.value.name)
+
+    def _on_abort(self, event: Event):
+        # the value tells whether the whole state machine stops
+        self._abort_mixing = True
+        self._abort = self._abort or event.value
+        self._abort_event = event
+
+    def _on_order(self, event: Event):
+        if event.value and self._state == BarBotState.IDLE:
+            # whoever orders with nothing queued takes care of the glas
+            self._glass_removal_pending = False
+        # start the order right away if the barbot is waiting in idle
+        self._heartbeat.notify_activity()
+
+    def _on_idle_task(self, event: Event):
+        self._idle_tasks.append(event.value)
+        self._heartbeat.notify_activity()
+
+    def _on_bottles_changed(self, event: Event):
+        self._empty_ports.difference_update(event.value)
+        for port in event.value:
+            connected = self._ports.ingredient_at_port(port) is not None
+            self._inventory.set_level(port, self._config.bottle_size if connected else None)
+        self._inventory.save()
+        if self.on_inventory_changed is not None:
+            self.on_inventory_changed()
+
+    def _on_start(self, event: Event):
+        command: _StartCommand = event.value
+        if command.state not in _TRANSITIONS[self._state].startable:
+            logging.warning("Cannot start '%s' while in state '%s'",
+                            command.state.name, self._state.name)
+            return
+        # an abort that was handled before does not affect the new state
+        self._abort_mixing = False
+        self._abort_event = None
+        if command.prepare is not None:
+            command.prepare()
+        self._set_state(command.state, event)
+
+    def _start(self, state: BarBotState, prepare: Callable[[], None] = None):
+        """Let the state machine enter a state as soon as it handles the event"""
+        self._post(EventType.START, _StartCommand(state, prepare))
+
     def set_balance_calibration(self, offset, cal):
         """"Save new offset and calibration for the internal balance to the config.
         Asynchronously send the new values to the esp32.
@@ -189,7 +418,7 @@ class BarBot():
         self._config.load()
 
         # send new values to mainboard
-        self._idle_tasks.append(
+        self._add_idle_task(
             _IdleTask(
                 _IdleTaskType.SET,
                 None,
@@ -197,7 +426,7 @@ class BarBot():
                 int(self._config.balance_offset)
             )
         )
-        self._idle_tasks.append(
+        self._add_idle_task(
             _IdleTask(
                 _IdleTaskType.SET,
                 None,
@@ -209,7 +438,8 @@ class BarBot():
     def reconnect(self):
         """Reinitiate the connection procedure"""
         # in demo mode there is nothing to do here
-        self._set_state(BarBotState.CONNECTING)
+        self._start(BarBotState.CONNECTING)
+        self._reconnect.wake()
 
     def _get_state_function_name(self, state: BarBotState) -> str:
         """Get the name of the barbot function to be called within the defined state.
@@ -220,72 +450,253 @@ class BarBot():
     def run(self):
         """main loop, runs the whole time"""
         logging.debug("State machine started")
-        while not self._abort:
-            # reset abort flag
-            self._abort_mixing = False
+        self._inventory.load()
+        self._flow_model.load()
+        self._overshoot_model.load()
+        self._load_orders()
+        while True:
+            transition_count = self._begin_state_function()
+            if self._abort:
+                break
             # call self._do_<state> function
-            func = getattr(self, self._get_state_function_name(self._state))
-            func()
-            if self._state_changed:
-                self._state_changed = False
-            # only go to idle if there was no state change in between
-            elif self._state not in [
-                    BarBotState.STARTUP,
-                    BarBotState.IDLE,
-                    BarBotState.CONNECTING,
-                    BarBotState.SEARCHING
-                ]:
-                self._go_to_idle()
+            self._state_functions[self._state]()
+            self._handle_state_function_finished(transition_count)
         self._mainboard.disconnect()
 
+    async def run_async(self):
+        """Main loop as a coroutine, runs the whole time.
+        The idle state is awaited within the event loop, so other coroutines
+        like telemetry can run alongside it. All other states are blocking,
+        they are executed in a worker thread.
+        """
+        logging.debug("State machine started (async)")
+        self._inventory.load()
+        self._flow_model.load()
+        self._overshoot_model.load()
+        self._load_orders()
+        loop = asyncio.get_running_loop()
+        mainboard = AsyncMainboard(self._mainboard)
+        while True:
+            transition_count = self._begin_state_function()
+            if self._abort:
+                break
+            if self._state == BarBotState.IDLE:
+                await self._do_idle_async(mainboard)
+            else:
+                await loop.run_in_executor(None, self._state_functions[self._state])
+            await loop.run_in_executor(None, self._handle_state_function_finished,
+                                       transition_count)
+        await mainboard.disconnect()
+
+    def _begin_state_function(self) -> int:
+        """Reset the abort of the last state function and handle the pending events.
+        An abort that was posted in the meantime is not lost, it aborts the next state function.
+        :returns: Number of transitions before the state function is called
+        """
+        self._abort_mixing = False
+        self._abort_event = None
+        self._handle_events()
+        # only state changes while the state function runs are of interest
+        return self._transitions.count
+
+    def _handle_state_function_finished(self, transition_count: int):
+        """Enter the next state after a state function finished, if the state did not change.
+        :param transition_count: Number of transitions before the state function was called
+        """
+        if self._transitions.count != transition_count:
+            return
+        next_state = _TRANSITIONS[self._state].finished
+        if next_state == self._state:
+            return
+        # the state is left because of the abort, if there was one
+        event = self._abort_event
+        if next_state == BarBotState.IDLE:
+            self._go_to_idle(event)
+        else:
+            self._set_state(next_state, event)
+
     def _do_idle(self):
         """Perform idle task"""
-        # read status message
-        start_time = time.time()
-        if self._mainboard.supports_is_idle_command:
-            result = self._mainboard.get("IsIdle")
-            if result.was_successfull and len(result.return_parameters) == 1:
-                if result.return_parameters[0] != "1":
-                    logging.warning("'IsIdle' returned false")
+        start_time = self._clock.time()
+        start_cpu_time = time.thread_time()
+        if len(self._idle_tasks) > 0:
+            self._idle_tasks[0].execute(self._mainboard)
+            self._idle_tasks.pop(0)
+        elif self._can_start_next_order:
+            self._start_next_order()
+        elif self._is_glass_check_due:
+            self._glass_checked(self._mainboard.get("HasGlas"))
+        elif self._heartbeat.is_poll_due:
+            if self._mainboard.supports_is_idle_command:
+                self._check_is_idle_result(self._mainboard.get("IsIdle"))
             else:
-                logging.warning("'IsIdle' command failed")
+                self._mainboard.read_message()
+            self._heartbeat.poll_done()
         else:
-            self._mainboard.read_message()
-        time_diff = time.time() - start_time
-        if time_diff < MIN_IDLE_TIME_SEC:
-            time.sleep(MIN_IDLE_TIME_SEC - time_diff)
-            
-        if not self._mainboard.is_connected:
-            self._set_state(BarBotState.CONNECTING)
+            # a lost connection is detected by the reader, so just check it regularly
+            self._wait_for_event(min(self._idle_wait_interval, self._heartbeat.time_until_poll))
+        self._check_idle_connection()
+        self._heartbeat.add_idle_time(
+            self._clock.time() - start_time,
+            time.thread_time() - start_cpu_time
+        )
+
+    async def _do_idle_async(self, mainboard: AsyncMainboard):
+        """Perform idle task without blocking the event loop"""
+        start_time = self._clock.time()
+        start_cpu_time = time.thread_time()
         if len(self._idle_tasks) > 0:
-            self._idle_tasks[0].execute(self._mainboard)
+            await self._idle_tasks[0].execute_async(mainboard)
             self._idle_tasks.pop(0)
+        elif self._can_start_next_order:
+            self._start_next_order()
+        elif self._is_glass_check_due:
+            self._glass_checked(await mainboard.get("HasGlas"))
+        elif self._heartbeat.is_poll_due:
+            if self._mainboard.supports_is_idle_command:
+                self._check_is_idle_result(await mainboard.get("IsIdle"))
+            else:
+                await mainboard.read_message()
+            self._heartbeat.poll_done()
+        else:
+            await self._heartbeat.wait_async(self._idle_wait_interval)
+        self._check_idle_connection()
+        self._heartbeat.add_idle_time(
+            self._clock.time() - start_time,
+            time.thread_time() - start_cpu_time
+        )
+
+    @property
+    def _disconnect_check_interval(self) -> float:
+        # the reader needs up to CONNECTION_TIMEOUT to notice the connection is lost
+        return max(MIN_IDLE_TIME_SEC, self._config.disconnect_detection_time - CONNECTION_TIMEOUT)
+
+    @property
+    def _idle_wait_interval(self) -> float:
+        if len(self._orders) > 0 and self._glass_removal_pending:
+            return min(self._disconnect_check_interval, GLASS_CHECK_INTERVAL)
+        return self._disconnect_check_interval
+
+    def _check_idle_connection(self):
+        if self._mainboard.is_connected:
+            return
+        latency = self._clock.time() - self._mainboard.last_message_time
+        self._heartbeat.disconnect_detected(latency)
+        logging.warning("Connection lost, detected after %.1f s", latency)
+        self._reconnect.connection_lost()
+        self._set_state(BarBotState.CONNECTING)
+
+    def notify_user_activity(self):
+        """Tell the barbot that the user interacted with it,
+        so the mainboard is polled more frequently again."""
+        self._post(EventType.USER_ACTIVITY)
+
+    @property
+    def idle_metrics(self) -> IdleMetrics:
+        """Get metrics about the communication while idle"""
+        return self._heartbeat.metrics
+
+    @property
+    def reconnect_metrics(self) -> ReconnectMetrics:
+        """Get metrics about reconnecting to the mainboard"""
+        return self._reconnect.metrics
+
+    @property
+    def order_metrics(self) -> OrderMetrics:
+        """Get metrics about the ordered and mixed drinks"""
+        return self._orders.metrics
+
+    @property
+    def command_statistics(self) -> Dict[str, CommandStatistics]:
+        """Get latencies, retries and errors of the commands sent to the mainboard"""
+        return self._mainboard.instrumentation.snapshot()
+
+    def _load_orders(self):
+        """Restore the orders that were queued before the barbot was restarted"""
+        self._orders.load()
+        if len(self._orders) > 0:
+            logging.info("Restored %i orders", len(self._orders))
+            self._notify_orders_changed()
+
+    def _notify_orders_changed(self):
+        if self.on_orders_changed is not None:
+            self.on_orders_changed()
+
+    @property
+    def _can_start_next_order(self) -> bool:
+        return len(self._orders) > 0 and not self._glass_removal_pending
+
+    @property
+    def _is_glass_check_due(self) -> bool:
+        return len(self._orders) > 0 and self._glass_removal_pending \
+            and self._clock.time() >= self._next_glass_check_time
+
+    def _glass_checked(self, result: CommunicationResult):
+        """Handle the answer to 'HasGlas' while the next order waits for the glass to be removed"""
+        self._next_glass_check_time = self._clock.time() + GLASS_CHECK_INTERVAL
+        if result.was_successfull and result.return_parameters[0] == "0":
+            self._glass_removal_pending = False
+
+    def _start_next_order(self):
+        order = self._orders.pop()
+        if order is None:
+            return
+        self._notify_orders_changed()
+        logging.info("Start order %i: %s", order.order_id, order.recipe.name)
+        self._abort_mixing = False
+        self._abort_event = None
+        self._prepare_mixing(MixingOptions(order.recipe, order.add_straw, order.add_ice))
+        self._set_state(BarBotState.MIXING)
+
+    def _add_idle_task(self, task: _IdleTask):
+        self._post(EventType.IDLE_TASK, task)
+
+    def _check_is_idle_result(self, result: CommunicationResult):
+        if result.was_successfull and len(result.return_parameters) == 1:
+            if result.return_parameters[0] != "1":
+                logging.warning("'IsIdle' returned false")
+        else:
+            logging.warning("'IsIdle' command failed")
 
     def _do_searching(self):
-        """Search for a barbot in range, save its mac address and connect to it if one is found."""
+        """Discover a barbot in range without blocking the state machine for long,
+        save its mac address and connect to it if one is found."""
         logging.info("Search for BarBot4")
-        res = self._mainboard.find_bar_bot()
-        if res:
-            self._config.mac_address = res
-            self._config.save()
+        self._reconnect.start_discovery()
+        self._reconnect.wait_for_discovery(1)
+        if self._save_discovered_identifier():
             self._set_state(BarBotState.CONNECTING)
-        else:
-            # nothing found, lets try again later
-            time.sleep(1)
+
+    def _save_discovered_identifier(self) -> bool:
+        """Save the identifier of a discovered mainboard to the config.
+        :returns: True if a mainboard was discovered
+        """
+        identifier = self._reconnect.take_discovered_identifier()
+        if not identifier:
+            return False
+        if identifier != self._config.mac_address:
+            self._config.mac_address = identifier
+            self._config.save()
+        return True
 
     def _do_connecting(self):
-        """Connect to a barbot with the mac address defined in the config"""
+        """Connect to the barbot with the mac address defined in the config.
+        Failed attempts are repeated with a growing delay, after repeated failures
+        the barbot is discovered again in the background."""
+        self._save_discovered_identifier()
         if not self._config.is_mac_address_valid:
             self._set_state(BarBotState.SEARCHING)
+        elif self._mainboard.connect(self._config.mac_address):
+            self._reconnect.connected()
+            self._set_state(BarBotState.STARTUP)
         else:
-            if self._mainboard.connect(self._config.mac_address):
-                self._set_state(BarBotState.STARTUP)
-            else:
-                time.sleep(1)
+            self._reconnect.attempt_failed()
+            self._reconnect.wait()
 
     def _do_startup(self):
         """Startup the barbot by setting values from the config to the mainboard"""
         if not self._mainboard.is_connected:
+            self._reconnect.connection_lost()
             self._set_state(BarBotState.CONNECTING)
             return
         # wait for a status message
@@ -316,35 +727,56 @@ class BarBot():
             if not self._wait_for_user_input():
                 return
         self._set_message(UserMessageType.NONE)
-        self._mainboard.set("SetLED", LEDMode.RAINBOW.value)
-        self._mainboard.set("SetSpeed", self._config.max_speed)
-        self._mainboard.set("SetAccel", self._config.max_accel)
-        self._mainboard.set("SetPumpPower", self._config.pump_power)
-        self._mainboard.set("SetBalanceCalibration", int(self._config.balance_calibration))
-        self._mainboard.set("SetBalanceOffset",int(self._config.balance_offset))
-        self._set_state(BarBotState.IDLE)
+        self._mainboard.set_pipelined(
+            ("SetLED", LEDMode.RAINBOW.value),
+            ("SetSpeed", self._config.max_speed),
+            ("SetAccel", self._config.max_accel),
+            ("SetPumpPower", self._config.pump_power),
+            ("SetBalanceCalibration", int(self._config.balance_calibration)),
+            ("SetBalanceOffset", int(self._config.balance_offset))
+        )
+        # offer to finish a drink that was interrupted by a lost connection
+        checkpoint = self._checkpoints.load()
+        if checkpoint is not None:
+            self._resume_checkpoint = checkpoint
+            self._current_mixing_options = MixingOptions(
+                checkpoint.recipe, checkpoint.add_straw, checkpoint.add_ice
+            )
+            self._set_state(BarBotState.MIXING)
+        else:
+            self._set_state(BarBotState.IDLE)
 
     def set_user_input(self, value: UserInputType):
         """Set the answer of the user to a message."""
-        self._user_input = value
-        logging.debug("User input: %s", value.name)
+        self._post(EventType.USER_INPUT, value)
 
     def abort_mixing(self):
         """Abort an ongoing mixing process"""
-        self._abort_mixing = True
         logging.warning("Mixing aborted")
+        self._post(EventType.ABORT, False)
         # abort can be sent synchronously
         self._mainboard.send_abort()
 
     def abort(self):
         """Abort the barbot state machine"""
-        self._abort_mixing = True
-        self._abort = True
+        self._post(EventType.ABORT, True)
+        self._reconnect.wake()
 
-    def _set_state(self, state):
+    def _set_state(self, state: BarBotState, event: Event = None):
+        """Enter a state, must be called by the state machine.
+        :param event: The event that caused the transition, None if the state function decided
+        """
+        transition = StateTransition(self._clock.time(), self._state, state, event)
         self._state = state
-        logging.debug("State changed to '%s'",self._state)
-        self._state_changed = True
+        self._transitions.add(transition)
+        if event is None:
+            logging.debug("State changed from '%s' to '%s' at %.3f s",
+                transition.source.name, state.name, transition.time)
+        else:
+            logging.debug("State changed from '%s' to '%s' at %.3f s by %s after %.3f s",
+                transition.source.name, state.name, transition.time, event.type.name,
+                transition.latency)
+        self._heartbeat.notify_activity()
         if self.on_state_changed is not None:
             self.on_state_changed(state)
 
@@ -377,40 +809,66 @@ class BarBot():
         """The database can be edited as long as the we are not using the esp32"""
         return self._state in [BarBotState.CONNECTING, BarBotState.IDLE]
 
-    def _wait_for(self, condition : Callable[[],bool]) -> bool:
-        """Wait for the condition to become true.
-        Will return False when operation is aborted. 
+    def _is_mixing_aborted(self) -> bool:
+        """Handle the pending events and check whether mixing was aborted.
+        Called in between the commands of a mixing program."""
+        self._handle_events()
+        return self._abort_mixing
+
+    @property
+    def _is_waiting_aborted(self) -> bool:
+        """Whether waiting for the user or the mainboard should stop"""
+        return self._abort or self._abort_mixing
+
+    def _wait_for(self, condition : Callable[[],bool], check_interval: float) -> bool:
+        """Wait for the condition to become true, any user input or an abort ends the wait.
+        In between the checks the state machine waits for events, so it does not use the cpu.
         :param condition: Callback that is called periodically until it returns True
-        :returns: True if the wait was successfull, False on abort
+        :param check_interval: Minimum time between two calls of the condition in seconds,
+        e.g. to limit the requests sent to the mainboard
+        :returns: True if the condition became true, False on user input or abort
         """
-        while not self._abort and not condition():
-            self._mainboard.read_message()
-        return not self._abort
+        next_check_time = self._clock.time()
+        while not self._is_waiting_aborted and self._user_input == UserInputType.UNDEFINED:
+            if self._clock.time() >= next_check_time:
+                if condition():
+                    return True
+                next_check_time = self._clock.time() + check_interval
+            self._wait_for_event(next_check_time - self._clock.time())
+        return False
 
     def _wait_for_user_input(self):
         """Reset the user input and wait until set_user_input() was called or mixing was aborted.
         """
         self._reset_user_input()
         logging.debug("Wait for user input")
-        while not self._abort and self._user_input == UserInputType.UNDEFINED:
-            self._mainboard.read_message()
-        if self._abort:
+        while not self._is_waiting_aborted and self._user_input == UserInputType.UNDEFINED:
+            self._wait_for_event(self._disconnect_check_interval)
+        if self._is_waiting_aborted:
             logging.warning("Waiting aborted")
             return False
         #else
         logging.debug("User answered: %s",  self._user_input.name)
         return True
 
-    def _go_to_idle(self):
-        """Go to idle state of the barbot, reset the user message and home the hardware"""
+    def _go_to_idle(self, event: Event = None):
+        """Go to idle state of the barbot, reset the user message and home the hardware
+        :param event: The event that caused going to idle, e.g. an abort
+        """
         logging.debug("Go to idle")
         self._set_message(UserMessageType.NONE)
-        self._set_state(BarBotState.IDLE)
-        #reset current values
+        #reset current values before a new process can be started
         self._current_mixing_options = None
         self._current_recipe_item = None
-        self._mainboard.set("SetLED", LEDMode.RAINBOW.value)
-        self._mainboard.set("PlatformLED", PlatformLEDMode.OFF.value)
+        self._current_port = None
+        self._current_prediction = None
+        # the drink was not counted if it did not finish
+        self._orders.drink_finished(was_mixed=False)
+        self._set_state(BarBotState.IDLE, event)
+        self._mainboard.set_pipelined(
+            ("SetLED", LEDMode.RAINBOW.value),
+            ("PlatformLED", PlatformLEDMode.OFF.value)
+        )
         # move to where zero should be, if no motor steps were skipped
         self._mainboard.do("Move", 0)
         self._mainboard.do("Home")
@@ -419,221 +877,281 @@ class BarBot():
         result = self._mainboard.get("HasGlas")
         return result.was_successfull and result.return_parameters[0] == "1"
 
-    def _draft_one(self, item: RecipeItem) -> bool:
-        """Draft a single ingredient.
-        :param item: The recipe item to be draft"""
-        # user aborted
-        if self._abort_mixing:
-            return False
-        if item.ingredient.type == IngredientType.STIRR:
-            logging.info("Start stirring")
-            self._mainboard.do("Mix", int(self._config.stirring_time / 1000))
-            return True
-        if item.ingredient.type == IngredientType.SUGAR:
-            # take sugar per unit from config
-            weight = int(item.amount * self._config.sugar_per_unit)
-            logging.info("Start adding %i g of '%s'", weight, item.ingredient.name)
-        else:
-            # cl to g
-            weight = int(item.amount * item.ingredient.density * 10)
-            port = self._ports.port_of_ingredient(item.ingredient)
-            logging.info("Start adding %i g of '%s' at port %i",\
-                weight, item.ingredient.name, port)
-        while True:
-            if item.ingredient.type == IngredientType.SUGAR:
-                result = self._mainboard.do("Sugar", weight)
+    def _get_weight(self) -> float:
+        """Get the weight on the balance, None if it could not be read"""
+        result = self._mainboard.get("GetWeight")
+        if not result.was_successfull or len(result.return_parameters) == 0:
+            return None
+        return float(result.return_parameters[0])
+
+    def _create_program_executor(self, on_step_started: Callable[[int], None] = None,
+                                 on_step_finished: Callable[[int, float], None] = None):
+        """Get the executor for mixing programs that is supported by the mainboard"""
+        executor_class = UploadProgramExecutor if self._config.upload_mixing_program \
+            else StepwiseProgramExecutor
+        overshoot = self._overshoot_model if self._config.compensate_overshoot else None
+        return executor_class(self._mainboard, on_step_started, self._is_mixing_aborted,
+                              overshoot, on_step_finished)
+
+    def _execute_program(self, program: MixingProgram,
+                         on_step_started: Callable[[int], None] = None, start_step: int = 0,
+                         start_amount: int = None,
+                         on_connection_lost: Callable[[ProgramResult], None] = None) -> bool:
+        """Execute a program and resume it after errors if the user wants to.
+        If the connection is lost, the barbot connects again.
+        :param program: The program to execute
+        :param on_step_started: Called with the index of each step when it starts
+        :param start_step: Index of the first step, used to resume an interrupted drink
+        :param start_amount: Amount of the first step, None for the whole step
+        :param on_connection_lost: Called with the result of the step that was interrupted
+        :returns: True if all steps were executed, False on error or abort
+        """
+        step_index, amount = start_step, start_amount
+        # the platform is where the program left it, when it is continued after an error
+        start_position = program.position_before(start_step)
+        def step_finished(finished_step: int, duration: float):
+            step = program.steps[finished_step]
+            if finished_step == step_index:
+                weight = amount if amount is not None else step.amount
+                self._measure_draft(step, weight, duration, start_position)
             else:
-                if item.ingredient.type == IngredientType.SIRUP:
-                    result = self._mainboard.set("SetPumpPower", self._config.pump_power_sirup)
-                else:
-                    result = self._mainboard.set("SetPumpPower", self._config.pump_power)
-                if not result.was_successfull:
-                    self._set_message(UserMessageType.UNKNOWN_ERROR)
-                    self._wait_for_user_input()
-                    return False
-                result = self._mainboard.do("Draft", port, weight)
+                self._measure_draft(step, step.amount, duration,
+                                    program.position_before(finished_step))
+        executor = self._create_program_executor(on_step_started, step_finished)
+        while not self._is_mixing_aborted():
+            result = executor.execute(program, step_index, amount)
+            self._update_inventory(program, step_index, amount, result)
+            if self._config.compensate_overshoot:
+                self._overshoot_model.save()
             # user aborted
-            if self._abort_mixing:
+            if self._is_mixing_aborted():
                 return False
-            if result.was_successfull is True:
-                # drafting successfull
+            if result.was_successfull:
                 return True
-            logging.error("Error while drafting: '%s'", result.error.name)
-            if result.error == CommError.INGREDIENT_EMPTY:
-                # ingredient is empty
-                # safe how much is left to draft
-                if len(result.return_parameters) > 0:
-                    weight = int(result.return_parameters[0])
-                else:
-                    weight = 0
-                    logging.warning("No remaining weight received")
-                self._set_message(UserMessageType.INGREDIENT_EMPTY)
-                # wait for user input
-                if not self._wait_for_user_input():
-                    return False
-                # remove the message
-                self._set_message(UserMessageType.NONE)
-                if self._user_input != UserInputType.YES:
-                    return False
-                # repeat the loop
-
-            elif result.error == CommError.GLAS_REMOVED:
-                logging.warning("Glas was removed while drafting")
-                self._set_message(UserMessageType.GLAS_REMOVED_WHILE_DRAFTING)
-                self._wait_for_user_input()
+            step = program.steps[result.step_index]
+            logging.error("Error in step '%s': '%s'", step.encode(), result.error.name)
+            if not is_mainboard_error(result.error) and not self._mainboard.is_connected:
+                logging.warning("Connection lost while executing the program")
+                if on_connection_lost is not None:
+                    on_connection_lost(result)
+                self._reconnect.connection_lost()
+                self._set_state(BarBotState.CONNECTING)
                 return False
-
-            else:
-                logging.warning("Unexpected error code")
-                self._set_message(UserMessageType.UNKNOWN_ERROR)
-                self._wait_for_user_input()
+            if result.error == CommError.INGREDIENT_EMPTY and step.type == StepType.DRAFT:
+                self._empty_ports.add(step.port)
+                self._inventory.set_level(step.port, 0)
+                self._inventory.save()
+                sibling_port = self._sibling_port(step)
+                if sibling_port is not None:
+                    # continue with another bottle of the same ingredient without asking
+                    logging.info("Port %i is empty, continue with port %i", step.port, sibling_port)
+                    start_position = program.position_before(result.step_index + 1)
+                    program = program.with_step(result.step_index, replace(step, port=sibling_port))
+                    step_index, amount = self._step_after_error(result)
+                    continue
+            self._current_port = step.port
+            if not self._handle_step_error(step, result.error):
                 return False
+            # repeat the failed step with what is left of it
+            start_position = program.position_before(result.step_index + 1)
+            step_index, amount = self._step_after_error(result)
+        return False
+
+    @staticmethod
+    def _step_after_error(result: ProgramResult) -> Tuple[int, Optional[int]]:
+        """Get the index and the amount of the step to continue with after a failed step.
+        A draft with less than 1 g left is complete, the mainboard can not draft 0 g.
+        """
+        if result.remaining is not None and result.remaining < 1:
+            return result.step_index + 1, None
+        return result.step_index, result.remaining
+
+    def _measure_draft(self, step: ProgramStep, weight: int, duration: float,
+                       start_position: float):
+        """Add a finished draft to the flow rate model.
+        :param weight: Weight that was drafted by the step in g
+        :param duration: Time the mainboard executed the draft in seconds
+        :param start_position: Position of the platform before the draft in mm,
+        the time it needs to move to the port is not part of the pump time
+        """
+        if step.type != StepType.DRAFT or step.item is None:
+            return
+        motion = MotionModel.from_config(self._config)
+        duration -= motion.move_time(start_position, port_position(step.port))
+        alert = self._flow_model.add_draft(step.port, step.item.ingredient.type, weight, duration)
+        self._flow_model.save()
+        if alert is not None and self.on_flow_alert is not None:
+            self.on_flow_alert(alert)
+
+    def _update_inventory(self, program: MixingProgram, start_step: int, start_amount: int,
+                          result: ProgramResult):
+        """Subtract what was drafted by an execution of the program from the fill levels"""
+        drafted = program.drafted(start_step, start_amount, result)
+        for port, weight in drafted:
+            self._inventory.drafted(port, weight)
+        if len(drafted) > 0:
+            self._inventory.save()
+
+    def _sibling_port(self, step: ProgramStep) -> int:
+        """Get another port of the ingredient of a draft step that is not empty.
+        :returns: The port, None if there is no other port
+        """
+        if step.item is None:
+            return None
+        port = choose_port(self._ports, step.item.ingredient, port_position(step.port),
+                           self._empty_ports)
+        if port is None or port in self._empty_ports:
+            return None
+        return port
+
+    def _handle_step_error(self, step: ProgramStep, error: CommError) -> bool:
+        """Show the error of a failed program step and wait for the user.
+        :returns: True if the step should be repeated, False if the program stops
+        """
+        if step.type == StepType.STRAW:
+            message = UserMessageType.STRAWS_EMPTY
+        elif error == CommError.INGREDIENT_EMPTY and step.type == StepType.CRUSH:
+            message = UserMessageType.ICE_EMPTY
+        elif error == CommError.INGREDIENT_EMPTY:
+            message = UserMessageType.INGREDIENT_EMPTY
+        elif error == CommError.CRUSHER_COVER_OPEN:
+            message = UserMessageType.CRUSHER_COVER_OPEN
+        elif error == CommError.CRUSHER_TIMEOUT:
+            message = UserMessageType.CRUSHER_TIMEOUT
+        elif error == CommError.GLAS_REMOVED:
+            logging.warning("Glas was removed while drafting")
+            self._set_message(UserMessageType.GLAS_REMOVED_WHILE_DRAFTING)
+            self._wait_for_user_input()
+            return False
+        elif error == CommError.I2C:
+            self._set_message(UserMessageType.I2C_ERROR)
+            self._wait_for_user_input()
+            # a communication error will always stop the mixing process
+            return False
+        else:
+            logging.warning("Unexpected error code")
+            self._set_message(UserMessageType.UNKNOWN_ERROR)
+            self._wait_for_user_input()
+            return False
+        # ask the user whether the step should be repeated
+        self._set_message(message)
+        if not self._wait_for_user_input():
+            return False
+        # remove the message
+        self._set_message(UserMessageType.NONE)
+        if self._user_input != UserInputType.YES:
+            return False
+        if error == CommError.INGREDIENT_EMPTY and step.type == StepType.DRAFT:
+            # the user refilled the bottle
+            self.bottles_changed([step.port])
+        return True
 
     def _do_mixing(self):
         """Perform mixing process with the current recipe"""
-        progress = 0
-        self._set_mixing_progress(progress)
+        saved_round_trips_at_start = self._mainboard.set_cache.saved_round_trips
+        self._set_mixing_progress(0)
+        self._orders.drink_started()
+        checkpoint, self._resume_checkpoint = self._resume_checkpoint, None
+        if checkpoint is not None:
+            # the drink was interrupted, ask the user whether it should be finished
+            self._set_message(UserMessageType.RESUME_MIXING)
+            answered = self._wait_for_user_input()
+            self._set_message(UserMessageType.NONE)
+            # keep the checkpoint if the barbot is shut down, so it is offered again
+            if answered or not self._abort:
+                self._checkpoints.clear()
+            if not answered or self._user_input != UserInputType.YES:
+                return
+            self._reset_user_input()
+        elif len(self.missing_ingredients(self._current_mixing_options.recipe)) > 0:
+            # the bottles were emptied since the drink was ordered
+            self._set_message(UserMessageType.INGREDIENTS_RUNNING_LOW)
+            self._reset_user_input()
+            if not self._wait_for_user_input():
+                return
+            if self._user_input != UserInputType.YES:
+                return
+            self._set_message(UserMessageType.NONE)
+            self._reset_user_input()
 
         # wait for the glas
         if not self._has_glas():
             self._set_message(UserMessageType.PLACE_GLAS)
             self._reset_user_input()
             self._mainboard.set("PlatformLED", PlatformLEDMode.BLINK.value)
-            # wait for glas or user abort
-            def glas_present_or_user_input():
-                if self._has_glas():
-                    return True
-                # any user input was set
-                if self._user_input != UserInputType.UNDEFINED:
-                    return True
-                return False
-            if not self._wait_for(glas_present_or_user_input):
+            # wait for glas, the user cancels by answering with anything
+            if not self._wait_for(self._has_glas, GLASS_CHECK_INTERVAL):
                 return
             self._set_message(UserMessageType.NONE)
-            # user answered with anything
-            if self._user_input != UserInputType.UNDEFINED:
-                return
+        # the next order has to wait until this glas was taken
+        self._glass_removal_pending = True
+        self._current_prediction = (self._clock.time(),
+                                    self.simulate(self._current_mixing_options).total)
 
         self._mainboard.set("PlatformLED", PlatformLEDMode.ROTATE.value)
         # wait for the user to take the hands off the glas
-        self._delay_and_keep_communicating(1)
-        self._mainboard.set("PlatformLED", PlatformLEDMode.CHASE.value)
-        self._mainboard.set("SetLED", LEDMode.DRAFT_POSITION.value)
+        self._delay_and_keep_communicating(HANDS_OFF_DELAY)
+        self._mainboard.set_pipelined(
+            ("PlatformLED", PlatformLEDMode.CHASE.value),
+            ("SetLED", LEDMode.DRAFT_POSITION.value)
+        )
         self._reset_user_input()
-        for item in self._current_mixing_options.recipe.items:
-            # user aborted
-            if self._abort_mixing:
-                break
-            self._current_recipe_item = item
-            # do the actual draft, exit the loop if it did not succeed
-            if not self._draft_one(item):
-                break
-            progress += 1
-            self._set_mixing_progress(progress)
-
-        # add ice if it was selected and mixing was not aborted
-        if self.current_mixing_options.add_ice and not self._abort_mixing:
-            self._do_crushing()
-            progress += 1
-            self._set_mixing_progress(progress)
-
-        # move to start
-        self._mainboard.do("Move", 0)
-
-        # add straw if it was selected and mixing was not aborted
-        if self._current_mixing_options.add_straw and not self._abort_mixing:
-            self._do_straw()
-            progress += 1
-            self._set_mixing_progress(progress)
+        options = self._current_mixing_options
+        program = compile_mixing(options.recipe.items, self._ports, self._config,
+                                 options.add_ice, options.add_straw, self._empty_ports,
+                                 self._inventory.levels)
+        weight = self._get_weight()
+        if checkpoint is not None:
+            if not checkpoint.matches(program, weight):
+                logging.warning("Drink cannot be resumed, the glass or the ports changed")
+                return
+            start_step, start_amount = checkpoint.resume_point(program, weight)
+            start_weight = checkpoint.start_weight
+            logging.info("Resume mixing at step %i", start_step)
+        else:
+            start_step, start_amount, start_weight = 0, None, weight
+        def step_started(step_index: int):
+            step = program.steps[step_index]
+            if step.item is not None:
+                self._current_recipe_item = step.item
+            self._set_mixing_progress(program.progress_before(step_index))
+        def save_checkpoint(result: ProgramResult):
+            self._checkpoints.save(MixingCheckpoint(options.recipe, options.add_ice,
+                options.add_straw, result.step_index, result.remaining, start_weight))
+        was_completed = self._execute_program(program, step_started, start_step, start_amount,
+                                              save_checkpoint)
+        if was_completed:
+            self._set_mixing_progress(program.progress_before(len(program)))
+        elif self._state != BarBotState.MIXING:
+            # the connection was lost, the drink is resumed after reconnecting
+            return
 
         # mixing is done
         self._set_message(UserMessageType.MIXING_DONE_REMOVE_GLAS)
-        self._mainboard.set("PlatformLED", PlatformLEDMode.BLINK.value)
-        self._mainboard.set("SetLED", LEDMode.POSITION_WATERFALL.value)
+        self._mainboard.set_pipelined(
+            ("PlatformLED", PlatformLEDMode.BLINK.value),
+            ("SetLED", LEDMode.POSITION_WATERFALL.value)
+        )
         # show message and LED for some seconds
-        self._delay_and_keep_communicating(4)
+        self._delay_and_keep_communicating(GLASS_REMOVAL_DELAY)
         self._mainboard.set("PlatformLED", PlatformLEDMode.OFF.value)
+        self._saved_round_trips_last_drink = \
+            self._mainboard.set_cache.saved_round_trips - saved_round_trips_at_start
+        logging.info("Skipped %i SET commands with known values",
+            self._saved_round_trips_last_drink)
         self._parties.current_party.add_order(self._current_mixing_options.recipe)
+        self._orders.drink_finished(was_mixed=was_completed)
+        if was_completed and checkpoint is None:
+            # resumed drinks are not measured, the time before the interruption is unknown
+            start_time, predicted = self._current_prediction
+            self._timeline_accuracy.add(predicted, self._clock.time() - start_time)
         self._set_message(UserMessageType.NONE)
         if self.on_mixing_finished is not None:
             self.on_mixing_finished(self._current_mixing_options.recipe)
 
     def _do_crushing(self):
         """Perform the crushing of ice"""
-        # user aborted
-        if self._abort_mixing:
-            return False
-        # try adding ice until it works or user aborts
-        ice_to_add = self._config.ice_amount
-        while True:
-            result = self._mainboard.do("Crush", ice_to_add)
-            if self._abort_mixing:
-                # user aborted
-                return False
-            if result.was_successfull:
-                # crushing successfull
-                return True
-            logging.error("Error while drafting: '%s'", result.error.name)
-            if result.error == CommError.INGREDIENT_EMPTY:
-                # ice is empty, save how much is left
-                if len(result.return_parameters) > 0:
-                    ice_to_add = int(result.return_parameters[0])
-                else:
-                    ice_to_add = 0
-                    logging.warning("No remaining weight received")
-                self._set_message(UserMessageType.ICE_EMPTY)
-                self._reset_user_input()
-                # wait for user input
-                if not self._wait_for_user_input():
-                    return False
-                # remove the message
-                self._set_message(UserMessageType.NONE)
-                if self._user_input != UserInputType.YES:
-                    return False
-                # repeat the loop
-
-            elif result.error == CommError.GLAS_REMOVED:
-                logging.info("Glas was removed while crushing")
-                self._set_message(UserMessageType.GLAS_REMOVED_WHILE_DRAFTING)
-                self._wait_for_user_input()
-                return False
-
-            elif result.error == CommError.I2C:
-                self._set_message(UserMessageType.I2C_ERROR)
-                # wait for user input
-                self._wait_for_user_input()
-                # a communication error will always stop the mixing process
-                return False
-
-            elif result.error == CommError.CRUSHER_COVER_OPEN:
-                self._set_message(UserMessageType.CRUSHER_COVER_OPEN)
-                self._reset_user_input()
-                # wait for user input
-                if not self._wait_for_user_input():
-                    return False
-                # remove the message
-                self._set_message(UserMessageType.NONE)
-                if self._user_input != UserInputType.YES:
-                    return False
-                # repeat the loop
-
-            elif result.error == CommError.CRUSHER_TIMEOUT:
-                self._set_message(UserMessageType.CRUSHER_TIMEOUT)
-                self._user_input = None
-                # wait for user input
-                if not self._wait_for_user_input():
-                    return False
-                # remove the message
-                self._set_message(UserMessageType.NONE)
-                if self._user_input != UserInputType.YES:
-                    return False
-                # repeat the loop
-
-            else:
-                logging.warning("Unkown error code")
-                self._set_message(UserMessageType.UNKNOWN_ERROR)
-                self._wait_for_user_input()
-                return False
+        self._execute_program(MixingProgram([ProgramStep(StepType.CRUSH, self._config.ice_amount)]))
 
     def _do_cleaning_cycle(self):
         self._set_message(UserMessageType.CLEANING_ADAPTER)
@@ -646,7 +1164,7 @@ class BarBot():
         self._set_message(UserMessageType.NONE)
         for pump_index in self._pumps_to_clean:
             # user aborted
-            if self._abort_mixing:
+            if self._is_mixing_aborted():
                 return
             self._mainboard.do("Clean", pump_index, self._config.cleaning_time)
 
@@ -657,74 +1175,140 @@ class BarBot():
     def _do_single_ingredient(self):
         self._set_message(UserMessageType.PLACE_GLAS)
         self._reset_user_input()
-        # wait for glas or user abort
-        def glas_present_or_user_input():
-            if self._has_glas():
-                return True
-            # any user input was set
-            if self._user_input != UserInputType.UNDEFINED:
-                return True
-            return False
-        if not self._wait_for(glas_present_or_user_input):
+        # wait for glas, the user cancels by answering with anything
+        if not self._wait_for(self._has_glas, GLASS_CHECK_INTERVAL):
             return
         self._set_message(UserMessageType.NONE)
-        # user answered with anything
-        if self._user_input != UserInputType.UNDEFINED:
-            return
-        self._draft_one(self._current_recipe_item)
+        self._execute_program(compile_mixing([self._current_recipe_item], self._ports, self._config,
+                                             empty_ports=self._empty_ports,
+                                             port_levels=self._inventory.levels))
 
     def _do_straw(self):
         """Try dispensing straw until it works or user aborts"""
-        while True:
-            result = self._mainboard.do("Straw")
-            if result.was_successfull:
-                break
-            self._reset_user_input()
-            self._set_message(UserMessageType.STRAWS_EMPTY)
-            if not self._wait_for_user_input():
-                return
-            self._set_message(UserMessageType.NONE)
-            if self._user_input != UserInputType.UNDEFINED:
-                break
+        self._execute_program(MixingProgram([ProgramStep(StepType.STRAW)]))
 
     # start commands
 
     def start_mixing(self, options: MixingOptions):
         """Start mixing a recipe.
         :param options: Mixing options"""
-        self._abort_mixing = False
+        self._start(BarBotState.MIXING, lambda: self._prepare_mixing(options))
+
+    def _prepare_mixing(self, options: MixingOptions):
+        if self._config.minimize_travel and not options.recipe.keep_order:
+            # the planned order is shown and saved in the checkpoint, so it is only planned once
+            recipe = options.recipe.copy()
+            recipe.items = plan_items(recipe.items, self._ports, self._config, options.add_ice)
+            options = options._replace(recipe=recipe)
         self._current_mixing_options = options
-        self._set_state(BarBotState.MIXING)
+
+    def enqueue_order(self, options: MixingOptions) -> Order:
+        """Add a drink to the order queue, it is mixed as soon as the barbot is idle
+        and the glas of the previous drink was removed.
+        :param options: Mixing options
+        :returns: The order, e.g. to cancel it
+        """
+        was_empty = len(self._orders) == 0
+        order = self._orders.enqueue(options.recipe, options.add_straw, options.add_ice)
+        self._notify_orders_changed()
+        self._post(EventType.ORDER, was_empty)
+        return order
+
+    def cancel_order(self, order_id: int) -> bool:
+        """Remove an order from the queue.
+        :returns: False if the order is not queued anymore, e.g. because it is being mixed
+        """
+        if not self._orders.cancel(order_id):
+            return False
+        self._notify_orders_changed()
+        return True
+
+    def move_order(self, order_id: int, position: int) -> bool:
+        """Move an order to another position in the queue.
+        :param position: New index of the order, 0 is mixed next
+        :returns: False if the order is not queued anymore
+        """
+        if not self._orders.move(order_id, position):
+            return False
+        self._notify_orders_changed()
+        return True
+
+    @property
+    def orders(self) -> List[Order]:
+        """Get the queued orders, the next one first"""
+        return self._orders.orders
+
+    def order_etas(self) -> List[Tuple[Order, float]]:
+        """Estimate when the queued orders will be ready.
+        :returns: The orders with the time in seconds until they are ready
+        """
+        def duration_of(order: Order) -> float:
+            options = MixingOptions(order.recipe, order.add_straw, order.add_ice)
+            return self.simulate(options, has_glass=False).total
+        current_remaining = None
+        prediction = self._current_prediction
+        if prediction is not None:
+            start_time, predicted = prediction
+            current_remaining = max(0, predicted - (self._clock.time() - start_time))
+        return self._orders.etas(duration_of, current_remaining)
+
+    def simulate(self, options: MixingOptions, has_glass: bool = True) -> Timeline:
+        """Predict the timeline of a drink with the learned flow rates.
+        :param options: Mixing options
+        :param has_glass: Whether the glas is already placed when the drink starts
+        """
+        simulator = TimelineSimulator(self._config, self._ports, self._flow_model,
+                                      self._empty_ports, self._inventory.levels)
+        return simulator.simulate(options, has_glass)
+
+    @property
+    def timeline_accuracy(self) -> TimelineAccuracyReport:
+        """Get how exact the predicted durations of the last drinks were,
+        None if no drink was mixed yet"""
+        return self._timeline_accuracy.report
+
+    def bottles_changed(self, ports: List[int] = None):
+        """Tell the barbot that bottles were replaced, so their ports are used again.
+        The fill levels of the ports are reset to a full bottle by the state machine,
+        on_inventory_changed is called afterwards.
+        :param ports: The ports with new bottles, None for all ports"""
+        if ports is None:
+            ports = list(range(PORT_COUNT))
+        self._post(EventType.BOTTLES_CHANGED, list(ports))
+
+    def missing_ingredients(self, recipe: Recipe) -> List[Ingredient]:
+        """Get the ingredients of a recipe that are expected to run dry while mixing it"""
+        program = compile_mixing(recipe.items, self._ports, self._config,
+                                 empty_ports=self._empty_ports,
+                                 port_levels=self._inventory.levels)
+        return self._inventory.missing_ingredients(program, self._ports, self._empty_ports)
 
     def start_single_ingredient(self, recipe_item: RecipeItem):
         """Start adding a single ingredient to your glas.
         :param recipe_item: The item to be added"""
-        self._abort_mixing = False
-        self._current_recipe_item = recipe_item
-        self._set_state(BarBotState.SINGLE_INGREDIENT)
+        def prepare():
+            self._current_recipe_item = recipe_item
+        self._start(BarBotState.SINGLE_INGREDIENT, prepare)
 
     def start_crushing(self):
         """Add ice to the glas"""
-        self._abort_mixing = False
-        self._set_state(BarBotState.CRUSHING)
+        self._start(BarBotState.CRUSHING)
 
     def start_cleaning(self, port):
         """Start cleaning a single pump.
         :param port: The port to clean"""
-        self._abort_mixing = False
-        self._pumps_to_clean = [port]
-        self._set_state(BarBotState.CLEANING_CYCLE)
+        self.start_cleaning_cycle([port])
 
     def start_cleaning_cycle(self, pumps_to_clean:List[int]):
         """Start a cleaning cycle.
         :param pumps_to_clean: List of ports to clean successively"""
-        self._abort_mixing = False
-        self._pumps_to_clean = pumps_to_clean
-        self._set_state(BarBotState.CLEANING_CYCLE)
+        def prepare():
+            self._pumps_to_clean = pumps_to_clean
+        self._start(BarBotState.CLEANING_CYCLE, prepare)
 
     def start_straw(self):
         """Add a straw to the glas"""
-        self._set_state(BarBotState.STRAW)
+        self._start(BarBotState.STRAW)
 
     def get_weight(self, callback:Callable[[float],None]):
         """Get the weight when the state machine is idle again.
@@ -735,7 +1319,7 @@ class BarBot():
                 if res.was_successfull and len(res.return_parameters) > 0 \
                 else None
             callback(self._weight)
-        self._idle_tasks.append(
+        self._add_idle_task(
             _IdleTask(_IdleTaskType.GET, internal_callback, "GetWeight")
         )
 
@@ -764,6 +1348,6 @@ class BarBot():
         def internal_callback(result):
             self._connected_boards = self._parse_connected_boards(result.return_parameters[0])
             callback(self._connected_boards)
-        self._idle_tasks.append(
+        self._add_idle_task(
             _IdleTask(_IdleTaskType.GET, internal_callback, "GetConnectedBoards")
         )
@@ -0,0 +1,152 @@
+"""Exposes a connection to the mainboard on a TCP port, so the barbot can run on another host
+than the one the mainboard is connected to. Connect to it with MainboardConnectionTCP.
+
+Run it with 'python -m barbot.bridge --serial /dev/ttyUSB0' or '--bluetooth <mac address>'.
+"""
+import argparse
+import logging
+import socket
+import threading
+from .communication import MainboardConnection, MainboardConnectionBluetooth
+from .communication import MainboardConnectionSerial, BRIDGE_PORT, SERIAL_BAUD_RATE
+
+class MainboardBridge:
+    """Forwards lines between a mainboard connection and one TCP client at a time.
+    The connection is read all the time, lines are dropped while no client is connected.
+    If the connection is lost, it is connected again.
+    :param connection: Connection to the mainboard
+    :param identifier: Passed to connect() of the connection
+    :param host: Host to listen on, only the local host by default
+    :param port: Port to listen on, 0 for any free port
+    """
+    def __init__(self, connection: MainboardConnection, identifier: str,
+                 host: str = "127.0.0.1", port: int = BRIDGE_PORT):
+        self._connection = connection
+        self._identifier = identifier
+        self._server = socket.create_server((host, port))
+        self._client: socket.socket = None
+        self._client_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def port(self) -> int:
+        """Get the port the bridge listens on"""
+        return self._server.getsockname()[1]
+
+    @property
+    def has_client(self) -> bool:
+        """Get whether a client is connected"""
+        return self._client is not None
+
+    def start(self):
+        """Start forwarding in background threads"""
+        self._threads = [
+            threading.Thread(target=self._forward_from_mainboard, name="BridgeMainboard",
+                             daemon=True),
+            threading.Thread(target=self._serve, name="BridgeClient", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop forwarding, close the client and the mainboard connection"""
+        self._stop.set()
+        self._set_client(None)
+        for thread in self._threads:
+            thread.join(2)
+        self._server.close()
+        self._connection.disconnect()
+
+    def _set_client(self, client: socket.socket):
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = client
+
+    def _forward_from_mainboard(self):
+        while not self._stop.is_set():
+            if not self._connection.is_connected:
+                if not self._connection.connect(self._identifier):
+                    self._stop.wait(1)
+                continue
+            line = self._connection.read_line()
+            if line is None:
+                continue
+            with self._client_lock:
+                if self._client is None:
+                    continue
+                try:
+                    self._client.sendall(f"{line}\r\n".encode())
+                except OSError:
+                    logging.warning("Bridge: Sending to the client failed")
+                    self._client.close()
+                    self._client = None
+
+    def _serve(self):
+        self._server.settimeout(0.1)
+        while not self._stop.is_set():
+            try:
+                client, address = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            logging.info("Bridge: Client connected: %s", address)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.settimeout(0.1)
+            self._set_client(client)
+            self._forward_from_client(client)
+            with self._client_lock:
+                if self._client is client:
+                    self._client.close()
+                    self._client = None
+            logging.info("Bridge: Client disconnected: %s", address)
+
+    def _forward_from_client(self, client: socket.socket):
+        buffer = b""
+        while not self._stop.is_set():
+            try:
+                data = client.recv(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if len(data) == 0:
+                return
+            # the mainboard only accepts lines that end with '\r'
+            buffer += data.replace(b"\n", b"")
+            *lines, buffer = buffer.split(b"\r")
+            for line in lines:
+                if not self._connection.is_connected:
+                    continue
+                try:
+                    self._connection.send(line.decode("utf-8", "replace"))
+                except OSError:
+                    logging.warning("Bridge: Sending to the mainboard failed")
+
+def _main():
+    parser = argparse.ArgumentParser(description="Expose the mainboard on a TCP port")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--serial", metavar="DEVICE", help="mainboard is connected to the device")
+    group.add_argument("--bluetooth", metavar="MAC", help="mainboard has the mac address")
+    parser.add_argument("--baud-rate", type=int, default=SERIAL_BAUD_RATE)
+    parser.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 for other hosts")
+    parser.add_argument("--port", type=int, default=BRIDGE_PORT)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.serial is not None:
+        bridge = MainboardBridge(MainboardConnectionSerial(args.baud_rate), args.serial,
+                                 args.host, args.port)
+    else:
+        bridge = MainboardBridge(MainboardConnectionBluetooth(), args.bluetooth,
+                                 args.host, args.port)
+    bridge.start()
+    logging.info("Bridge serves on port %i", bridge.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        bridge.stop()
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,136 @@
+"""Checkpoint of a drink, so mixing can be resumed after the connection was lost"""
+from dataclasses import dataclass
+from io import TextIOWrapper
+from typing import Optional, Tuple
+import logging
+import os
+import yaml
+from .config import data_directory
+from .program import MixingProgram
+from .recipes import Recipe, load_recipe_from_yaml
+
+# a step that is missing less than this weight in g is skipped when resuming
+MIN_RESUME_WEIGHT = 1
+# weight in g the finished steps may be missing, otherwise the glass is not the interrupted drink
+RESUME_WEIGHT_TOLERANCE = 5
+
+@dataclass
+class MixingCheckpoint:
+    """Point of an interrupted drink the mixing can be resumed from"""
+    recipe: Recipe
+    add_ice: bool
+    add_straw: bool
+    # index of the program step that was interrupted, all steps before it are done
+    step_index: int
+    # weight in g that is missing of the interrupted step, None if the whole step is missing
+    remaining: int = None
+    # weight on the balance when the drink was started, None if unknown
+    start_weight: float = None
+
+    def matches(self, program: MixingProgram, weight: Optional[float]) -> bool:
+        """Check whether the drink can be resumed with the program and the glass on the balance.
+        :param program: The program of the drink
+        :param weight: The current weight on the balance, None if unknown
+        :returns: False if the program has less steps or the finished steps are not in the glass
+        """
+        if self.step_index > len(program):
+            return False
+        if weight is None or self.start_weight is None:
+            return True
+        expected_weight = self.start_weight + program.weight_before(self.step_index)
+        return weight >= expected_weight - RESUME_WEIGHT_TOLERANCE
+
+    def resume_point(self, program: MixingProgram, weight: Optional[float]) -> Tuple[int, int]:
+        """Get the step and its amount the program continues with.
+        The mainboard finishes a running step even if the connection is lost,
+        so if the weights are known, what was added in the meantime is subtracted.
+        :param program: The program of the drink
+        :param weight: The current weight on the balance, None if unknown
+        :returns: Index of the step and its amount, the amount is None for the whole step
+        """
+        if self.step_index >= len(program):
+            return len(program), None
+        step = program.steps[self.step_index]
+        if weight is None or self.start_weight is None or not step.is_weighed:
+            return self.step_index, self.remaining
+        expected_weight = self.start_weight + program.weight_before(self.step_index) + step.amount
+        missing = int(expected_weight - weight)
+        if missing < MIN_RESUME_WEIGHT:
+            return self.step_index + 1, None
+        return self.step_index, min(missing, step.amount)
+
+    def to_yaml(self) -> str:
+        """Get the yaml representation of this checkpoint"""
+        data = {
+            "recipe_name": self.recipe.name,
+            "recipe": self.recipe.to_yaml(),
+            "add_ice": self.add_ice,
+            "add_straw": self.add_straw,
+            "step_index": self.step_index,
+            "remaining": self.remaining,
+            "start_weight": self.start_weight,
+        }
+        return yaml.dump(data, None)
+
+def load_checkpoint_from_yaml(yaml_string: str) -> Optional[MixingCheckpoint]:
+    """Load a checkpoint from its yaml representation.
+    :returns: The checkpoint, None if an ingredient of the recipe is unknown
+    """
+    data = yaml.safe_load(yaml_string)
+    recipe = load_recipe_from_yaml(data["recipe"], data["recipe_name"])
+    if recipe is None:
+        return None
+    return MixingCheckpoint(
+        recipe,
+        data["add_ice"],
+        data["add_straw"],
+        data["step_index"],
+        data["remaining"],
+        data["start_weight"]
+    )
+
+class CheckpointStore:
+    """Keeps the checkpoint of the current drink on the drive,
+    so it is still there after the barbot was restarted"""
+    def __init__(self, filepath: str = os.path.join(data_directory, "checkpoint.yaml")):
+        self._filepath = filepath
+
+    def save(self, checkpoint: MixingCheckpoint, output_stream: TextIOWrapper = None) -> bool:
+        """Save the checkpoint, replacing the previous one.
+        :return: True if saving was successfull, False otherwise
+        """
+        data = checkpoint.to_yaml()
+        try:
+            if output_stream is not None:
+                output_stream.write(data)
+            else:
+                # write to a temporary file first, so a crash never leaves half a checkpoint
+                temporary_path = self._filepath + ".tmp"
+                with open(temporary_path, 'w', encoding="utf-8") as file:
+                    file.write(data)
+                os.replace(temporary_path, self._filepath)
+        except OSError as ex:
+            logging.warning("Error in checkpoint save: %s", ex)
+            return False
+        return True
+
+    def load(self) -> Optional[MixingCheckpoint]:
+        """Load the saved checkpoint.
+        :return: The checkpoint, None if there is none or it is invalid
+        """
+        if not os.path.exists(self._filepath):
+            return None
+        try:
+            with open(self._filepath, 'r', encoding="utf-8") as file:
+                return load_checkpoint_from_yaml(file.read())
+        except (OSError, yaml.YAMLError, KeyError, TypeError) as ex:
+            logging.warning("Error in checkpoint load: %s", ex)
+            return None
+
+    def clear(self):
+        """Forget the saved checkpoint"""
+        if os.path.exists(self._filepath):
+            try:
+                os.remove(self._filepath)
+            except OSError as ex:
+                logging.warning("Error in checkpoint clear: %s", ex)
@@ -0,0 +1,65 @@
+"""Source of time for the barbot, so simulations can run faster than real time"""
+import threading
+import time
+
+class Clock:
+    """Real time, used by default"""
+    @property
+    def is_virtual(self) -> bool:
+        """Whether the time is simulated"""
+        return False
+
+    def time(self) -> float:
+        """Get the current time in seconds, only differences are meaningful"""
+        return time.monotonic()
+
+    def sleep(self, duration: float):
+        """Block for the given duration in seconds"""
+        if duration > 0:
+            time.sleep(duration)
+
+    def wait_event(self, event: threading.Event, timeout: float) -> bool:
+        """Wait until the event is set or the timeout in seconds passed.
+        :returns: True if the event is set
+        """
+        return event.wait(timeout)
+
+    def wait_condition(self, condition: threading.Condition, timeout: float) -> bool:
+        """Wait until the condition is notified or the timeout in seconds passed.
+        The lock of the condition must be held.
+        :returns: False if the timeout passed
+        """
+        return condition.wait(timeout)
+
+class VirtualClock(Clock):
+    """Simulated time that only advances when the simulation waits.
+    Instead of blocking, waiting moves the time forward immediately.
+    So only the thread running the simulation should wait,
+    other threads may read the time or set events.
+    :param start_time: Time in seconds the clock starts at
+    """
+    def __init__(self, start_time: float = 0):
+        self._time = start_time
+        self._lock = threading.Lock()
+
+    @property
+    def is_virtual(self) -> bool:
+        return True
+
+    def time(self) -> float:
+        return self._time
+
+    def sleep(self, duration: float):
+        if duration > 0:
+            with self._lock:
+                self._time += duration
+
+    def wait_event(self, event: threading.Event, timeout: float) -> bool:
+        if not event.is_set():
+            self.sleep(timeout)
+        return event.is_set()
+
+    def wait_condition(self, condition: threading.Condition, timeout: float) -> bool:
+        # nothing happens in the simulation while waiting, so it cannot be notified
+        self.sleep(timeout)
+        return False
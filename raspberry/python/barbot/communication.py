@@ -1,14 +1,39 @@
 """This module handles the communication between the barbot and the mainboard"""
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import NamedTuple, List
+from typing import Callable, Deque, Dict, Generator, List, NamedTuple, Optional, Tuple, Union
 from enum import Enum, auto
 from functools import total_ordering
+from collections import deque
+import asyncio
+import bisect
+import glob
+import itertools
 import logging
+import math
+import os
+import select
+import socket
+import sys
+import threading
 import bluetooth
+from .clock import Clock
 
 CONNECTION_TIMEOUT = 1
 MAX_RETRIES = 3
+# time to wait for a response when the reader thread is used
+RESPONSE_TIMEOUT = 2 * CONNECTION_TIMEOUT
+# the mainboard uses the same baud rate for its serial port
+SERIAL_BAUD_RATE = 115200
+# devices the mainboard might be connected to, in the order they are searched
+SERIAL_DEVICE_PATTERNS = ["/dev/ttyUSB*", "/dev/ttyACM*", "/dev/serial0"]
+# port a bridge serves the mainboard on by default
+BRIDGE_PORT = 5555
+# a silent connection is probed after this time in seconds, a lost one is detected within 2 s more
+TCP_KEEPALIVE_IDLE = 1
+TCP_KEEPALIVE_INTERVAL = 1
+TCP_KEEPALIVE_COUNT = 2
+STATUS_QUEUE_LENGTH = 1
 
 class ErrorType(Enum):
     """Errors that may occur during operations"""
@@ -105,17 +130,165 @@ class CommunicationResult():
     def __init__(self, error: ErrorType = ErrorType.NONE, return_parameters: List[str] = None):
         self.error: ErrorType = error
         self.return_parameters: List[str] = [] if return_parameters is None else return_parameters
+        # time from the acknowledgement until a DO command was done or failed in seconds,
+        # None for other commands
+        self.done_latency: Optional[float] = None
 
     @property
     def was_successfull(self):
         """Get whether an error code was set"""
         return self.error == ErrorType.NONE
 
-class RawResponse(NamedTuple):
-    """A raw message received from the mainboard"""
-    message_type: ResponseTypes
-    command: str
-    parameters: List[str] = []
+class RawResponse():
+    """A raw message received from the mainboard.
+    Responses to recurring lines are shared, so they must not be changed."""
+    __slots__ = ("message_type", "command", "parameters")
+
+    def __init__(self, message_type: ResponseTypes, command: str, parameters: Tuple[str, ...] = ()):
+        self.message_type = message_type
+        self.command = command
+        self.parameters = parameters
+
+    def __eq__(self, other):
+        if not isinstance(other, RawResponse):
+            return NotImplemented
+        return self.message_type == other.message_type \
+            and self.command == other.command \
+            and self.parameters == other.parameters
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"RawResponse({self.message_type.name}, {self.command!r}, {self.parameters!r})"
+
+class ResponseParser():
+    """Parses the lines received from the mainboard.
+    The message type is found by a dict lookup and command names are interned.
+    Lines without parameters and the idle lines that are received all the time
+    are parsed once, afterwards the same response object is returned.
+    """
+    _MESSAGE_TYPES = {message_type.name: message_type for message_type in ResponseTypes}
+    # lines with parameters that are received over and over again
+    _RECURRING_LINES = ["ACK IsIdle 1", "ACK IsIdle 0", "ACK HasGlas 1", "ACK HasGlas 0"]
+    # limit the cache in case of garbage on the line
+    _MAX_CACHED_LINES = 256
+
+    def __init__(self):
+        self._read_failed = RawResponse(ResponseTypes.COMM_ERROR, "read failed")
+        self._empty_line = RawResponse(ResponseTypes.COMM_ERROR, "empty line read")
+        self._unknown_type = RawResponse(ResponseTypes.COMM_ERROR, "unknown type")
+        self._wrong_format = RawResponse(ResponseTypes.COMM_ERROR, "wrong format")
+        self._cache: Dict[str, RawResponse] = {}
+        for line in self._RECURRING_LINES:
+            self._cache[line] = self._parse_tokens(line.split())
+        self._status_idle = self.parse("STATUS IDLE")
+        self._is_idle = self._cache["ACK IsIdle 1"]
+
+    def parse(self, line: str) -> RawResponse:
+        """Parse a line received from the mainboard.
+        :param line: The line without line ending, None if reading failed
+        :returns: Response object containing information about the response or errors
+        """
+        response = self._cache.get(line)
+        if response is not None:
+            return response
+        if line is None:
+            return self._read_failed
+        if line == "":
+            return self._empty_line
+        # expected format: <Type> <Command> [Parameter1] [Parameter2] ...
+        tokens = line.split()
+        response = self._parse_tokens(tokens)
+        if len(tokens) == 2 and len(self._cache) < self._MAX_CACHED_LINES:
+            self._cache[line] = response
+        return response
+
+    def _parse_tokens(self, tokens: List[str]) -> RawResponse:
+        message_type = self._MESSAGE_TYPES.get(tokens[0]) if len(tokens) > 0 else None
+        if message_type is None:
+            return self._unknown_type
+        if len(tokens) < 2:
+            return self._wrong_format
+        return RawResponse(message_type, sys.intern(tokens[1]), tuple(tokens[2:]))
+
+    def is_idle_message(self, response: RawResponse) -> bool:
+        """Get whether the response only shows that the mainboard is idle"""
+        return response is self._status_idle or response is self._is_idle
+
+class LineReader():
+    """Splits a received byte stream into lines.
+    Data is received directly into a preallocated buffer, so it is not copied
+    before it is decoded. Partial lines are kept until they are completed
+    and all complete lines are returned one after another.
+    Can be used by any MainboardConnection that reads from a stream.
+    :param recv_into: Receives bytes into the given buffer and returns how many were received,
+        like socket.recv_into(). Returning 0 means the connection was closed.
+    :param buffer_size: Initial size of the buffer, it grows if a line does not fit.
+    """
+    def __init__(self, recv_into: Callable[[memoryview], int], buffer_size: int = 4096):
+        self._recv_into = recv_into
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        # start of the first incomplete line
+        self._start = 0
+        # end of the received data
+        self._end = 0
+        # complete lines that were received but not read yet
+        self._lines: Deque[str] = deque()
+
+    @property
+    def lines_available(self) -> int:
+        """Number of complete lines that can be read without receiving"""
+        return len(self._lines)
+
+    def clear(self):
+        """Forget all received data, e.g. after reconnecting"""
+        self._start = 0
+        self._end = 0
+        self._lines.clear()
+
+    def read_line(self) -> str:
+        """Get the next complete line without line ending.
+        Receives data until a line is complete, exceptions of recv_into are passed through.
+        :raises ConnectionError: If the connection was closed.
+        """
+        while len(self._lines) == 0:
+            self._receive()
+        return self._lines.popleft()
+
+    def _receive(self):
+        if self._end == len(self._buffer):
+            self._make_room()
+        received = self._recv_into(self._view[self._end:])
+        if received == 0:
+            raise ConnectionError("Connection closed")
+        # only the new data has to be searched for line endings
+        last_line_end = self._buffer.rfind(b'\n', self._end, self._end + received)
+        self._end += received
+        if last_line_end >= 0:
+            # decode all complete lines at once
+            # a corrupt byte must not stop the communication
+            text = str(self._view[self._start:last_line_end], 'utf-8', 'replace')
+            self._lines.extend(text.replace('\r', '').split('\n'))
+            self._start = last_line_end + 1
+        if self._start == self._end:
+            # everything was read, so the whole buffer is free again
+            self._start = 0
+            self._end = 0
+
+    def _make_room(self):
+        partial_length = self._end - self._start
+        if self._start > 0:
+            # move the incomplete line to the front
+            self._buffer[:partial_length] = self._buffer[self._start:self._end]
+        else:
+            # a single line does not fit, so the buffer has to grow
+            logging.warning("LineReader: Line longer than %i bytes", len(self._buffer))
+            self._view.release()
+            self._buffer.extend(bytes(len(self._buffer)))
+            self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = partial_length
 
 class MainboardConnection(ABC):
     """Abstract representation of a serial connection to the mainboard"""
@@ -155,6 +328,7 @@ class MainboardConnectionBluetooth(MainboardConnection):
     def __init__(self):
         self._conn : bluetooth.BluetoothSocket = None
         self._is_connected = False
+        self._line_reader = LineReader(self._recv_into)
 
     @staticmethod
     def find_bar_bot() -> str:
@@ -171,27 +345,13 @@ class MainboardConnectionBluetooth(MainboardConnection):
             pass
         return None
 
-    def _read_line_unsave(self):
-        data = b''
-        # make sure to read everything there is
-        while True:
-            # read up to 1024 bytes
-            received = self._conn.recv(1024)
-            data += received
-            # we actually received 1024 bytes
-            if len(received) == 1024:
-                logging.warning("read_line: More than 1024 bytes read!")
-                # make shure to all bytes in the pipeline
-                continue
-            # we received a new line character
-            if data[-1:] == b'\n':
-                break
-        decoded_data:str = data.decode('utf-8')
-        # only take the last part of the message
-        lines = decoded_data.replace('\r','').split('\n')
-        if len(lines) > 2:
-            logging.warning("read_line: More than one line in buffer! Received: '%s'", repr(decoded_data))
-        return lines[-2]
+    def _recv_into(self, buffer: memoryview) -> int:
+        # not every version of pybluez exposes recv_into of the socket
+        if hasattr(self._conn, "recv_into"):
+            return self._conn.recv_into(buffer)
+        received = self._conn.recv(len(buffer))
+        buffer[:len(received)] = received
+        return len(received)
 
     def read_line(self) -> str:
         """Read the last line that was received on the manboard connection.
@@ -201,11 +361,11 @@ class MainboardConnectionBluetooth(MainboardConnection):
             self._is_connected = False
             return None
         try:
-            line = self._read_line_unsave()
-        except bluetooth.btcommon.BluetoothError as e:
+            line = self._line_reader.read_line()
+        except (bluetooth.btcommon.BluetoothError, ConnectionError) as e:
             self._is_connected = False
             logging.error("Read failed with BluetoothError:%s", e.args)
-            return RawResponse(ResponseTypes.COMM_ERROR, e)
+            return None
 
         return line
 
@@ -218,6 +378,7 @@ class MainboardConnectionBluetooth(MainboardConnection):
         mac_address = identifier
         if self._conn is not None:
             self._conn.close()
+        self._line_reader.clear()
         try:
             self._conn = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
             self._conn.connect((mac_address, 1))
@@ -240,14 +401,667 @@ class MainboardConnectionBluetooth(MainboardConnection):
     def is_connected(self) -> bool:
         return self._is_connected
 
+class MainboardConnectionSerial(MainboardConnection):
+    """Implementation of the MainboardConnection using a serial port, e.g. an UART or USB cable.
+    The port is read without blocking, so a lost connection is detected by the timeout.
+    :param baud_rate: Baud rate of the serial port, must be supported by termios
+    """
+    def __init__(self, baud_rate: int = SERIAL_BAUD_RATE):
+        # termios only exists on posix systems, so it is not imported with the module
+        import termios # pylint: disable=import-outside-toplevel
+        if not hasattr(termios, f"B{baud_rate}"):
+            raise ValueError(f"Unsupported baud rate: {baud_rate}")
+        self._baud_rate = baud_rate
+        self._file_descriptor: int = None
+        self._is_connected = False
+        self._line_reader = LineReader(self._recv_into)
+
+    @staticmethod
+    def find_bar_bot() -> str:
+        """Find serial devices the mainboard might be connected to.
+        :returns: The path of the first found device.
+        """
+        for pattern in SERIAL_DEVICE_PATTERNS:
+            devices = sorted(glob.glob(pattern))
+            if len(devices) > 0:
+                return devices[0]
+        return None
+
+    def _recv_into(self, buffer: memoryview) -> int:
+        # the mainboard sends a status message at least every 300 ms
+        readable, _, _ = select.select([self._file_descriptor], [], [], CONNECTION_TIMEOUT)
+        if len(readable) == 0:
+            raise TimeoutError("Nothing received from the serial port")
+        return os.readv(self._file_descriptor, [buffer])
+
+    def read_line(self) -> str:
+        """Read the last line that was received on the serial port.
+        This command is blocking!
+        :returns: The last line received. None, if the mainboard is not connected."""
+        if self._file_descriptor is None:
+            self._is_connected = False
+            return None
+        try:
+            return self._line_reader.read_line()
+        except OSError as e:
+            # includes timeouts and the closed connection
+            self._is_connected = False
+            logging.error("Read failed with OSError:%s", e.args)
+            return None
+
+    def send(self, line: str):
+        data = memoryview(f"{line}\r".encode())
+        while len(data) > 0:
+            # the port is non blocking, so wait until the output buffer has room
+            _, writable, _ = select.select([], [self._file_descriptor], [], CONNECTION_TIMEOUT)
+            if len(writable) == 0:
+                # nothing is transmitted anymore, e.g. the flow control stopped it
+                self._is_connected = False
+                raise TimeoutError("Nothing could be sent to the serial port")
+            try:
+                data = data[os.write(self._file_descriptor, data):]
+            except BlockingIOError:
+                pass
+
+    def connect(self, identifier: str = ""):
+        """Open the serial port with the given path and configure it.
+        :param identifier: The path of the serial device, e.g. '/dev/ttyUSB0'"""
+        self.disconnect()
+        self._line_reader.clear()
+        try:
+            self._file_descriptor = os.open(identifier, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            self._configure()
+            # read one line to make sure the mainboard has started
+            self._is_connected = True
+            if self.read_line() is None:
+                self.disconnect()
+                return False
+            logging.info("Connection successfull")
+        except OSError as e:
+            logging.warning("Connection failed %s", e)
+            self.disconnect()
+            return False
+        return True
+
+    def _configure(self):
+        """Set the baud rate and disable all processing of the transmitted data"""
+        import termios # pylint: disable=import-outside-toplevel
+        import tty # pylint: disable=import-outside-toplevel
+        tty.setraw(self._file_descriptor)
+        attributes = termios.tcgetattr(self._file_descriptor)
+        speed = getattr(termios, f"B{self._baud_rate}")
+        # input and output speed
+        attributes[4] = speed
+        attributes[5] = speed
+        # ignore modem control lines and enable the receiver
+        attributes[2] |= termios.CLOCAL | termios.CREAD
+        termios.tcsetattr(self._file_descriptor, termios.TCSANOW, attributes)
+        termios.tcflush(self._file_descriptor, termios.TCIOFLUSH)
+
+    def disconnect(self):
+        """Disconnect from the mainboard by closing the serial port"""
+        self._is_connected = False
+        if self._file_descriptor is not None:
+            os.close(self._file_descriptor)
+            self._file_descriptor = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._is_connected
+
+class MainboardConnectionTCP(MainboardConnection):
+    """Implementation of the MainboardConnection using TCP, e.g. to a bridge running on the
+    host that is connected to the mainboard. Lines are framed like on the other connections.
+    """
+    def __init__(self):
+        self._socket: socket.socket = None
+        self._is_connected = False
+        self._line_reader = LineReader(self._recv_into)
+
+    @staticmethod
+    def find_bar_bot() -> str:
+        """The mainboard can not be searched, so assume a bridge on the local host.
+        :returns: The address of the bridge as 'host:port'
+        """
+        return f"127.0.0.1:{BRIDGE_PORT}"
+
+    def _recv_into(self, buffer: memoryview) -> int:
+        return self._socket.recv_into(buffer)
+
+    def read_line(self) -> str:
+        """Read the last line that was received on the socket.
+        This command is blocking!
+        :returns: The last line received. None, if the mainboard is not connected."""
+        if self._socket is None:
+            self._is_connected = False
+            return None
+        try:
+            return self._line_reader.read_line()
+        except OSError as e:
+            # includes timeouts and the closed connection
+            self._is_connected = False
+            logging.error("Read failed with OSError:%s", e.args)
+            return None
+
+    def send(self, line: str):
+        self._socket.sendall(f"{line}\r".encode())
+
+    def connect(self, identifier: str = ""):
+        """Connect to the given address.
+        :param identifier: Address as 'host:port'"""
+        self.disconnect()
+        self._line_reader.clear()
+        host, _, port = identifier.rpartition(":")
+        try:
+            self._socket = socket.create_connection((host, int(port)), CONNECTION_TIMEOUT)
+            # lines are short and have to be sent immediately
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # the keepalive timing is not available on every platform
+            for option, value in [("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE),
+                    ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL), ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT)]:
+                if hasattr(socket, option):
+                    self._socket.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+            self._socket.settimeout(CONNECTION_TIMEOUT)
+            # read one line to make sure the mainboard has started
+            self._is_connected = True
+            if self.read_line() is None:
+                self.disconnect()
+                return False
+            logging.info("Connection successfull")
+        except (OSError, ValueError) as e:
+            logging.warning("Connection failed %s", e)
+            self.disconnect()
+            return False
+        return True
+
+    def disconnect(self):
+        """Disconnect from the mainboard by closing the socket"""
+        self._is_connected = False
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._is_connected
+
+class MainboardReader:
+    """Reads all lines from the mainboard connection in a background thread.
+    The parsed messages are sorted by their type, so callers can block
+    until a message of the type they are waiting for arrives.
+    :param on_message: Called from the reader thread with each message that was added
+    """
+    def __init__(self, connection: MainboardConnection, parse_line: Callable[[str], RawResponse],
+                 on_message: Callable[[RawResponse], None] = None):
+        self._connection = connection
+        self._parse_line = parse_line
+        self._on_message = on_message
+        self._condition = threading.Condition()
+        # messages are stored together with a sequence number to keep their order
+        self._queues: Dict[ResponseTypes, Deque[Tuple[int, RawResponse]]] = {
+            message_type: deque() for message_type in ResponseTypes
+        }
+        # status messages are sent periodically, only the latest ones are of interest
+        self._queues[ResponseTypes.STATUS] = deque(maxlen=STATUS_QUEUE_LENGTH)
+        self._sequence = itertools.count()
+        # events of coroutines waiting for a message and the loop they are running in
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._connection_lost = False
+        self._stop = False
+        self._thread: threading.Thread = None
+
+    @property
+    def is_running(self):
+        """Get whether the reader thread is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def connection_lost(self):
+        """Get whether reading from the connection failed"""
+        return self._connection_lost
+
+    def start(self):
+        """Start reading in a background thread"""
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="MainboardReader", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = CONNECTION_TIMEOUT):
+        """Stop the reader thread.
+        :param timeout: Time to wait for the thread to finish"""
+        self._stop = True
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                line = self._connection.read_line()
+                if self._stop:
+                    return
+                if line is None or not self._connection.is_connected:
+                    logging.warning("Reader stopped, connection lost")
+                    break
+                self.put(self._parse_line(line))
+        except Exception: # pylint: disable=broad-except
+            # the callers must not wait forever for a reader that is not running anymore
+            logging.exception("Reader stopped by an unexpected error")
+        with self._condition:
+            self._connection_lost = True
+            self._notify_waiters()
+
+    def put(self, message: RawResponse):
+        """Add a message to the queue of its type and wake up the waiting callers"""
+        with self._condition:
+            self._queues[message.message_type].append((next(self._sequence), message))
+            self._notify_waiters()
+        if self._on_message is not None:
+            self._on_message(message)
+
+    def _notify_waiters(self):
+        self._condition.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _take(self, message_types: List[ResponseTypes]) -> RawResponse:
+        """Remove the oldest message of the given types from its queue.
+        Must be called while holding the lock.
+        :returns: The message, a COMM_ERROR response if the connection is lost or None"""
+        if message_types is None:
+            message_types = list(ResponseTypes)
+        queues = [
+            self._queues[message_type]
+            for message_type in message_types
+            if len(self._queues[message_type]) > 0
+        ]
+        if len(queues) > 0:
+            return min(queues, key=lambda queue: queue[0][0]).popleft()[1]
+        if self._connection_lost:
+            return RawResponse(ResponseTypes.COMM_ERROR, "connection lost")
+        return None
+
+    def get(self, message_types: List[ResponseTypes] = None, timeout: float = None) -> RawResponse:
+        """Get the oldest message of one of the given types.
+        Blocks until such a message arrives, the connection is lost or the timeout passed.
+        :param message_types: Types of the messages to wait for, None for any type
+        :param timeout: Maximum time to wait in seconds, None to wait forever
+        :returns: The message, a COMM_ERROR or TIMEOUT response if there is none
+        """
+        with self._condition:
+            message = None
+            def has_message():
+                nonlocal message
+                message = self._take(message_types)
+                return message is not None
+            if not self._condition.wait_for(has_message, timeout):
+                return RawResponse(ResponseTypes.TIMEOUT, "no message received")
+            return message
+
+    async def get_async(self, message_types: List[ResponseTypes] = None,
+                        timeout: float = None) -> RawResponse:
+        """Awaitable version of get(), the event loop is not blocked while waiting.
+        :param message_types: Types of the messages to wait for, None for any type
+        :param timeout: Maximum time to wait in seconds, None to wait forever
+        :returns: The message, a COMM_ERROR or TIMEOUT response if there is none
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            event = asyncio.Event()
+            waiter = (loop, event)
+            with self._condition:
+                message = self._take(message_types)
+                if message is not None:
+                    return message
+                self._async_waiters.append(waiter)
+            try:
+                remaining = None if deadline is None else max(0, deadline - loop.time())
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return RawResponse(ResponseTypes.TIMEOUT, "no message received")
+            finally:
+                with self._condition:
+                    self._async_waiters.remove(waiter)
+
+    def clear(self):
+        """Remove all messages that were not read yet"""
+        with self._condition:
+            for queue in self._queues.values():
+                queue.clear()
+
+def _check_response(command, message: RawResponse) -> CommunicationResult:
+    """Check whether a message is a valid response to the given command.
+
+    :param command: Command name the response is expected for
+    :param message: The received message
+    :returns: CommunicationResult
+    """
+    result = CommunicationResult()
+    # check if the result is for the command we sent and it is an ACK
+    if result.was_successfull and message.command != command:
+        result.error = ErrorType.ANSWER_FOR_WRONG_COMMAND
+    if result.was_successfull and message.message_type == ResponseTypes.NAK:
+        result.error = ErrorType.NACK_RECEIVED
+    if result.was_successfull and message.message_type != ResponseTypes.ACK:
+        result.error = ErrorType.WRONG_ANSWER
+    if result.was_successfull and message.message_type == ResponseTypes.COMM_ERROR:
+        result.error = ErrorType.COMM_ERROR
+    if result.was_successfull and message.message_type == ResponseTypes.ERROR:
+        # first parameter is the error type
+        result.error = ErrorType[message.parameters[0]]
+        result.return_parameters = list(message.parameters[1:])
+    if result.was_successfull and message.message_type == ResponseTypes.ACK:
+        # an ack can include more info
+        result.return_parameters = list(message.parameters)
+    return result
+
+class _SendCommand(NamedTuple):
+    """Step of a command procedure: send a command and read its response"""
+    command: str
+    parameters: Tuple
+
+# step of a command procedure: read the next message
+_READ_MESSAGE = None
+
+# A command procedure is a generator that yields the steps it needs to be executed
+# and receives the CommunicationResult of a _SendCommand or the RawResponse of a _READ_MESSAGE.
+# Its return value is the result of the command.
+# This way the same procedure can be executed blocking and in an event loop.
+CommandProcedure = Generator[_SendCommand, Union[CommunicationResult, RawResponse], CommunicationResult]
+
+def _do_procedure(command, parameters: Tuple,
+                  on_status: Callable[[Tuple[str, ...]], None] = None) -> CommandProcedure:
+    """Send a DO command and wait for it to finish.
+    :param on_status: Called with the parameters of status messages of the command
+    """
+    retries_left = MAX_RETRIES
+    # make sure to always run the loop once
+    while retries_left > 0:
+        result = yield _SendCommand(command, parameters)
+
+        # ACK was received for the command, so wait until it finished
+        while result.was_successfull:
+            message = yield _READ_MESSAGE
+            # status messages show that the connection is still alive and may report progress
+            if message.message_type == ResponseTypes.STATUS:
+                if on_status is not None and message.command == command:
+                    on_status(message.parameters)
+                continue
+            if message.command != command:
+                result.error = ErrorType.ANSWER_FOR_WRONG_COMMAND
+            elif message.message_type == ResponseTypes.ERROR:
+                result.error = ErrorType(int(message.parameters[0]))
+                result.return_parameters = list(message.parameters[1:])
+            elif message.message_type == ResponseTypes.DONE:
+                break
+            else:
+                result.error = ErrorType.WRONG_ANSWER
+        if result.was_successfull or is_mainboard_error(result.error):
+            # at success, exit the loop
+            break
+        logging.warning("try_do with '%s', failed attempt: %s", command, result.error.name)
+        retries_left -= 1
+
+    # at success or when no retries are left
+    # if it failed, the last error is still in the result variable
+    return result
+
+def _set_procedure(command, parameters: Tuple) -> CommandProcedure:
+    """Send a SET command"""
+    retries_left = MAX_RETRIES
+    # make sure to always run the loop once
+    while retries_left > 0:
+        result = yield _SendCommand(command, parameters)
+        if result.was_successfull:
+            # at success, exit the loop
+            break
+        logging.warning("try_set with '%s', failed attempt: %s", command, result.error.name)
+        retries_left -= 1
+
+    # at success or when no retries are left
+    # if it failed, the last error is still in the result variable
+    return result
+
+def _get_procedure(command, parameters: Tuple) -> CommandProcedure:
+    """Send a GET command and check that it returned a value"""
+    retries_left = MAX_RETRIES
+    # make sure to always run the loop once
+    while retries_left > 0:
+        result = yield _SendCommand(command, parameters)
+        if result.was_successfull:
+            # at success, first check if we actually received a value
+            if len(result.return_parameters) == 0:
+                result.error = ErrorType.NO_RESULT_SENT
+            else:
+                break
+        logging.warning("try_get with '%s', failed attempt: %s", command, result.error.name)
+        retries_left -= 1
+
+    # at success or when no retries are left
+    # if it failed, the last error is still in the result variable
+    return result
+
+class SetCommandCache:
+    """Shadow of the values the mainboard acknowledged for its SET commands.
+    A SET command does not need to be sent again if the mainboard already has the value.
+    The values are only valid as long as the connection is kept,
+    a reset of the mainboard always drops the connection.
+    """
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, ...]] = {}
+        self._saved_round_trips = 0
+
+    @property
+    def saved_round_trips(self) -> int:
+        """Number of SET commands that were not sent, because the value was known"""
+        return self._saved_round_trips
+
+    def is_known(self, command: str, parameters: Tuple) -> bool:
+        """Check whether the mainboard already has the given value, count it as saved if so"""
+        if self._values.get(command) != tuple(str(p) for p in parameters):
+            return False
+        self._saved_round_trips += 1
+        return True
+
+    def update(self, command: str, parameters: Tuple, result: CommunicationResult):
+        """Remember the value if it was acknowledged, otherwise it is unknown"""
+        if result.was_successfull:
+            self._values[command] = tuple(str(p) for p in parameters)
+        else:
+            self._values.pop(command, None)
+
+    def invalidate(self):
+        """Forget all values, e.g. after reconnecting"""
+        self._values.clear()
+
+# upper bounds of the latency histogram buckets in seconds, the last one catches everything
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 60, float("inf"))
+
+@dataclass(frozen=True)
+class LatencySummary:
+    """Summary of the latencies of a command in seconds"""
+    count: int = 0
+    mean: float = 0
+    p50: float = 0
+    p95: float = 0
+    p99: float = 0
+    max: float = 0
+
+class LatencyHistogram:
+    """Counts latencies in the fixed LATENCY_BUCKETS.
+    Percentiles are estimated by the upper bound of the bucket they fall into."""
+    def __init__(self):
+        self._counts = [0] * len(LATENCY_BUCKETS)
+        self._count = 0
+        self._total = 0
+        self._max = 0
+
+    @property
+    def counts(self) -> Tuple[int, ...]:
+        """Number of latencies per bucket"""
+        return tuple(self._counts)
+
+    def add(self, latency: float):
+        """Add a latency in seconds"""
+        self._counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self._count += 1
+        self._total += latency
+        self._max = max(self._max, latency)
+
+    def percentile(self, fraction: float) -> float:
+        """Get the latency that the given fraction of the latencies do not exceed.
+        :param fraction: Fraction between 0 and 1, e.g. 0.95 for the 95th percentile
+        """
+        if self._count == 0:
+            return 0
+        rank = max(1, math.ceil(fraction * self._count))
+        for upper_bound, count in zip(LATENCY_BUCKETS, itertools.accumulate(self._counts)):
+            if count >= rank:
+                # the maximum is a better estimate than the bound of the bucket
+                return min(upper_bound, self._max)
+        return self._max
+
+    def summary(self) -> LatencySummary:
+        """Get a summary of the latencies"""
+        if self._count == 0:
+            return LatencySummary()
+        return LatencySummary(self._count, self._total / self._count,
+            self.percentile(0.5), self.percentile(0.95), self.percentile(0.99), self._max)
+
+@dataclass(frozen=True)
+class CommandStatistics:
+    """Snapshot of the statistics of a single command"""
+    command: str
+    calls: int
+    # attempts that had to be repeated
+    retries: int
+    # status messages received while a DO command was executed
+    status_messages: int
+    # number of failed calls per error
+    errors: Dict[ErrorType, int]
+    # time from sending the command until it was acknowledged or answered
+    ack_latency: LatencySummary
+    # time from the acknowledgement until a DO command was done or failed
+    done_latency: LatencySummary
+
+    @property
+    def failed_calls(self) -> int:
+        """Number of calls that did not succeed"""
+        return sum(self.errors.values())
+
+class _CommandRecord:
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.status_messages = 0
+        self.errors: Dict[ErrorType, int] = {}
+        self.ack_latency = LatencyHistogram()
+        self.done_latency = LatencyHistogram()
+
+class CommandInstrumentation:
+    """Collects latencies, retries and errors of the commands sent to the mainboard.
+    It can be read from a different thread than the one sending the commands."""
+    def __init__(self):
+        self._records: Dict[str, _CommandRecord] = {}
+        self._lock = threading.Lock()
+
+    def record(self, command: str, result: CommunicationResult, ack_latencies: List[float],
+               done_latency: float = None, retries: int = 0, status_messages: int = 0):
+        """Record a finished call of a command.
+        :param result: Final result of the call
+        :param ack_latencies: Latency of each acknowledged attempt
+        :param done_latency: Time from the last acknowledgement until a DO command finished
+        :param retries: Number of attempts that were repeated
+        :param status_messages: Number of status messages received while executing
+        """
+        with self._lock:
+            record = self._records.setdefault(command, _CommandRecord())
+            record.calls += 1
+            record.retries += retries
+            record.status_messages += status_messages
+            if not result.was_successfull:
+                record.errors[result.error] = record.errors.get(result.error, 0) + 1
+            for latency in ack_latencies:
+                record.ack_latency.add(latency)
+            if done_latency is not None:
+                record.done_latency.add(done_latency)
+
+    def snapshot(self) -> Dict[str, CommandStatistics]:
+        """Get the statistics of all commands that were sent so far"""
+        with self._lock:
+            return {
+                command: CommandStatistics(command, record.calls, record.retries,
+                    record.status_messages, dict(record.errors),
+                    record.ack_latency.summary(), record.done_latency.summary())
+                for command, record in self._records.items()
+            }
+
+    def reset(self):
+        """Forget all statistics"""
+        with self._lock:
+            self._records.clear()
+
+class _ProcedureTrace:
+    """Measures the steps of a command procedure while it is executed"""
+    def __init__(self, clock: Clock):
+        self._clock = clock
+        self._step_start_time = 0
+        self._ack_time = None
+        # whether messages were read after the acknowledgement, which only DO commands do
+        self._waited_after_ack = False
+        self.command: str = None
+        self.attempts = 0
+        self.status_messages = 0
+        self.ack_latencies: List[float] = []
+
+    def step_started(self, step: Union[_SendCommand, None]):
+        """Call before executing a step"""
+        self._step_start_time = self._clock.time()
+        if step is not _READ_MESSAGE:
+            self.command = step.command
+            self.attempts += 1
+            self._ack_time = None
+            self._waited_after_ack = False
+
+    def step_finished(self, step: Union[_SendCommand, None], answer):
+        """Call with the answer after executing a step"""
+        if step is _READ_MESSAGE:
+            self._waited_after_ack = True
+            if answer.message_type == ResponseTypes.STATUS:
+                self.status_messages += 1
+        elif answer.was_successfull:
+            self._ack_time = self._clock.time()
+            self.ack_latencies.append(self._ack_time - self._step_start_time)
+
+    def record(self, instrumentation: CommandInstrumentation, result: CommunicationResult):
+        """Record the finished procedure and add its done latency to the result"""
+        done_latency = self._clock.time() - self._ack_time \
+            if self._ack_time is not None and self._waited_after_ack else None
+        result.done_latency = done_latency
+        instrumentation.record(self.command, result, self.ack_latencies, done_latency,
+            max(0, self.attempts - 1), self.status_messages)
+
 class Mainboard:
-    """Class representing the mainboard of the barbot, it is used to handle the communication"""
-    def __init__(self, connection: MainboardConnection):
+    """Class representing the mainboard of the barbot, it is used to handle the communication
+    :param connection: Connection to the mainboard
+    :param clock: Clock for the time of the last message.
+    The reader thread waits in real time, so with a virtual clock the lines are read directly.
+    """
+    def __init__(self, connection: MainboardConnection, clock: Clock = None):
         self._connection = connection
+        self._clock = clock if clock is not None else Clock()
         self._error = None
         self._buffer: str = ""
         self._last_message_was_status_idle = False
+        self._parser = ResponseParser()
+        self._last_message_time = self._clock.time()
         self._firmware_version: FirmwareVersion = FirmwareVersion(0, 0, 0)
+        self._reader: MainboardReader = None
+        self._set_cache = SetCommandCache()
+        self._instrumentation = CommandInstrumentation()
+        # called from the reader thread when a message was received
+        self.on_message_received: Callable[[RawResponse], None] = None
 
     @property
     def is_connected(self):
@@ -265,9 +1079,46 @@ class Mainboard:
         return self.firmware_version is not None \
                 and self.firmware_version >= FirmwareVersion(4, 4, 0)
 
+    @property
+    def set_cache(self) -> SetCommandCache:
+        """Get the values that were acknowledged for the SET commands"""
+        return self._set_cache
+
+    @property
+    def instrumentation(self) -> CommandInstrumentation:
+        """Get the latencies, retries and errors of the commands sent so far"""
+        return self._instrumentation
+
+    @property
+    def clock(self) -> Clock:
+        """Get the clock used to measure the time"""
+        return self._clock
+
+    @property
+    def last_message_time(self) -> float:
+        """Get the timestamp of the clock when the last valid message was received"""
+        return self._last_message_time
+
+    @property
+    def reader(self) -> MainboardReader:
+        """Get the background reader, None if the mainboard is not connected"""
+        return self._reader
+
+    @property
+    def uses_reader(self):
+        """Get whether the messages are read by the background reader thread"""
+        return self._reader is not None
+
     def read_non_status_message(self) -> RawResponse:
         """Read a response message.
         If a status message is read instead, discard it and continue listening"""
+        if self.uses_reader:
+            # status messages are sorted out by the reader
+            return self._reader.get(
+                [message_type for message_type in ResponseTypes
+                    if message_type != ResponseTypes.STATUS],
+                RESPONSE_TIMEOUT
+            )
         message = self.read_message()
         # if a status message is recived, just ignore it, but only once!
         # it might have been in the buffer already
@@ -276,11 +1127,37 @@ class Mainboard:
             message = self.read_message()
         return message
 
+    def discard_pending_messages(self) -> int:
+        """Discard the messages the reader received while no command was waiting for them.
+        Otherwise they would be read as the answer to the next command.
+        :returns: Number of discarded messages
+        """
+        if not self.uses_reader:
+            return 0
+        message_types = [message_type for message_type in ResponseTypes
+                         if message_type != ResponseTypes.STATUS]
+        count = 0
+        while True:
+            message = self._reader.get(message_types, timeout=0)
+            if message.message_type in [ResponseTypes.TIMEOUT, ResponseTypes.COMM_ERROR]:
+                return count
+            logging.debug("Discard message '%s'", message.command)
+            count += 1
+
     def connect(self, identifier: str):
         """Connect to the mainboard"""
+        self._stop_reader()
+        self._set_cache.invalidate()
         self._connection.connect(identifier)
         if not self._connection.is_connected:
             return False
+        if not self._clock.is_virtual:
+            # from now on, all lines are read by the background thread
+            self._reader = MainboardReader(self._connection, self._parse_line,
+                                           self._message_received)
+            self._reader.start()
+        # commands are ignored while a command from before the connection was lost is running
+        self._wait_until_idle()
         # read firmware version
         response = self.get("GetFirmwareVersion")
         if response.was_successfull and len(response.return_parameters) > 0:
@@ -291,9 +1168,31 @@ class Mainboard:
             logging.warning("Could not read firmware version, probably legacy")
         return self._connection.is_connected
 
+    def _message_received(self, message: RawResponse):
+        if self.on_message_received is not None:
+            self.on_message_received(message)
+
+    def _wait_until_idle(self):
+        """Wait as long as the status messages show that the mainboard executes a command"""
+        while self._connection.is_connected:
+            message = self.read_message()
+            if message.message_type != ResponseTypes.STATUS or self._parser.is_idle_message(message):
+                return
+            logging.info("Mainboard is busy with '%s'", message.command)
+
     def disconnect(self):
         """Disconnect from the mainboard"""
+        if self._reader is not None:
+            # set the stop flag first, so the reader ignores the failing read
+            self._reader.stop(timeout=0)
         self._connection.disconnect()
+        self._stop_reader()
+        self._set_cache.invalidate()
+
+    def _stop_reader(self):
+        if self._reader is not None:
+            self._reader.stop()
+            self._reader = None
 
     def find_bar_bot(self):
         """Find available mainboards, get the first one """
@@ -310,82 +1209,34 @@ class Mainboard:
             return CommunicationResult(error=ErrorType.SEND_FAILED)
         # wait for the response
         message = self.read_non_status_message()
+        return _check_response(command, message)
 
-        result = CommunicationResult()
-        # check if the result is for the command we sent and it is an ACK
-        if result.was_successfull and message.command != command:
-            result.error = ErrorType.ANSWER_FOR_WRONG_COMMAND
-        if result.was_successfull and message.message_type == ResponseTypes.NAK:
-            result.error = ErrorType.NACK_RECEIVED
-        if result.was_successfull and message.message_type != ResponseTypes.ACK:
-            result.error = ErrorType.WRONG_ANSWER
-        if result.was_successfull and message.message_type == ResponseTypes.COMM_ERROR:
-            result.error = ErrorType.COMM_ERROR
-        if result.was_successfull and message.message_type == ResponseTypes.ERROR:
-            # first parameter is the error type
-            result.error = ErrorType[message.parameters[0]]
-            result.return_parameters = message.parameters[1:]
-        if result.was_successfull and message.message_type == ResponseTypes.ACK:
-            # an ack can include more info
-            result.return_parameters = message.parameters
-        return result
-
-    def do(self, command, *parameters:str) -> CommunicationResult:
+    def do(self, command, *parameters:str,
+           on_status: Callable[[Tuple[str, ...]], None] = None) -> CommunicationResult:
         """
         Send a DO command to the controller and wait for it to finish
         
         :param command: Command name
         :param parameters: Parameter for the controller command
+        :param on_status: Called with the parameters of status messages of the command
         :returns: CommunicationResult
         """
-        retries_left = MAX_RETRIES
-        # make sure to always run the loop once
-        while retries_left > 0:
-            result = self.send_command_and_read_response(command, *parameters)
-
-            # ACK was received for the command, so wait until it finished
-            while result.was_successfull:
-                message = self.read_message()
-                if result.was_successfull and message.command != command:
-                    result.error = ErrorType.ANSWER_FOR_WRONG_COMMAND
-                if result.was_successfull and message.message_type == ResponseTypes.ERROR:
-                    result.error = ErrorType(int(message.parameters[0]))
-                    result.return_parameters = message.parameters[1:]
-                if result.was_successfull:
-                    if message.message_type == ResponseTypes.DONE:
-                        break
-                    if message.message_type != ResponseTypes.STATUS:
-                        result.error = ErrorType.WRONG_ANSWER
-            if result.was_successfull or is_mainboard_error(result.error):
-                # at success, exit the loop
-                break
-            logging.warning("try_do with '%s', failed attempt: %s", command, result.error.name)
-            retries_left -= 1
-
-        # at success or when no retries are left
-        # if it failed, the last error is still in the result variable
-        return result
+        return self._execute(_do_procedure(command, parameters, on_status))
 
-    def set(self, command, *parameters:str) -> CommunicationResult:
+    def set(self, command, *parameters:str, force: bool = False) -> CommunicationResult:
         """
-        Send a SET command to the controller
+        Send a SET command to the controller.
+        It is skipped if the mainboard already acknowledged the same value.
         
         :param command: Command name
         :param parameters: Parameter for the controller command
+        :param force: Send the command even if the mainboard should have the value
         :returns: Whether the command executed successfully
         """
-        retries_left = MAX_RETRIES
-        # make sure to always run the loop once
-        while retries_left > 0:
-            result = self.send_command_and_read_response(command, *parameters)
-            if result.was_successfull:
-                # at success, exit the loop
-                break
-            logging.warning("try_set with '%s', failed attempt: %s", command, result.error.name)
-            retries_left -= 1
-
-        # at success or when no retries are left
-        # if it failed, the last error is still in the result variable
+        if not force and self._set_cache.is_known(command, parameters):
+            return CommunicationResult()
+        result = self._execute(_set_procedure(command, parameters))
+        self._set_cache.update(command, parameters, result)
         return result
 
     def get(self, command, *parameters:str) -> CommunicationResult:
@@ -396,22 +1247,108 @@ class Mainboard:
         :param parameters: Parameter for the controller command
         :returns: CommunicationResult containing the returned value on success
         """
+        return self._execute(_get_procedure(command, parameters))
+
+    def _execute(self, procedure: CommandProcedure) -> CommunicationResult:
+        """Execute the steps of a command procedure, blocking until it finished"""
+        trace = _ProcedureTrace(self._clock)
+        try:
+            step = next(procedure)
+            while True:
+                trace.step_started(step)
+                if step is _READ_MESSAGE:
+                    answer = self.read_message()
+                else:
+                    answer = self.send_command_and_read_response(step.command, *step.parameters)
+                trace.step_finished(step, answer)
+                step = procedure.send(answer)
+        except StopIteration as stop:
+            trace.record(self._instrumentation, stop.value)
+            return stop.value
+
+    def set_pipelined(self, *commands: Tuple, force: bool = False) -> List[CommunicationResult]:
+        """
+        Send multiple SET commands at once and read all the responses afterwards.
+        This saves waiting for the round trip of every command but the first one.
+        The mainboard ignores commands while a DO command is running,
+        so only use this in between DO commands.
+        Commands are skipped if the mainboard already acknowledged the same value.
+
+        :param commands: Tuples of command name and parameters, e.g. ("SetSpeed", 200)
+        :param force: Send the commands even if the mainboard should have the values
+        :returns: CommunicationResult for each command, in the order of the commands
+        """
+        results = [CommunicationResult() for _ in commands]
+        to_send = [
+            index for index, (command, *parameters) in enumerate(commands)
+            if force or not self._set_cache.is_known(command, parameters)
+        ]
+        sent_results = self._send_pipelined([commands[index] for index in to_send], is_getter=False)
+        for index, result in zip(to_send, sent_results):
+            command, *parameters = commands[index]
+            self._set_cache.update(command, parameters, result)
+            results[index] = result
+        return results
+
+    def get_pipelined(self, *commands: Tuple) -> List[CommunicationResult]:
+        """
+        Send multiple GET commands at once and read all the responses afterwards.
+        See set_pipelined() for details.
+
+        :param commands: Tuples of command name and parameters, e.g. ("HasGlas",)
+        :returns: CommunicationResult containing the returned value for each command
+        """
+        return self._send_pipelined(commands, is_getter=True)
+
+    def _send_pipelined(self, commands: List[Tuple], is_getter: bool) -> List[CommunicationResult]:
+        """Send the commands without waiting in between and match the responses by command name.
+        Failed commands are sent again as a new batch until no retries are left."""
+        results: List[CommunicationResult] = [None] * len(commands)
+        ack_latencies: List[List[float]] = [[] for _ in commands]
+        attempts = [0] * len(commands)
+        pending = list(range(len(commands)))
         retries_left = MAX_RETRIES
-        # make sure to always run the loop once
-        while retries_left > 0:
-            result = self.send_command_and_read_response(command, *parameters)
-            if result.was_successfull:
-                # at success, first check if we actually received a value
-                if len(result.return_parameters) == 0:
-                    result.error = ErrorType.NO_RESULT_SENT
+        while retries_left > 0 and len(pending) > 0:
+            sent = []
+            send_time = self._clock.time()
+            for index in pending:
+                attempts[index] += 1
+                command, *parameters = commands[index]
+                if self.send_command(command, *parameters):
+                    sent.append(index)
                 else:
+                    results[index] = CommunicationResult(error=ErrorType.SEND_FAILED)
+            # the mainboard answers in order, but only match by name to be safe
+            unanswered = list(sent)
+            # answers for unexpected commands do not count, so read until all are answered
+            while len(unanswered) > 0:
+                message = self.read_non_status_message()
+                if message.message_type in [ResponseTypes.COMM_ERROR, ResponseTypes.TIMEOUT]:
                     break
-            logging.warning("try_get with '%s', failed attempt: %s", command, result.error.name)
+                index = next((i for i in unanswered if commands[i][0] == message.command), None)
+                if index is None:
+                    logging.warning("Answer for unexpected command: '%s'", message.command)
+                    continue
+                unanswered.remove(index)
+                result = _check_response(message.command, message)
+                if is_getter and result.was_successfull and len(result.return_parameters) == 0:
+                    result.error = ErrorType.NO_RESULT_SENT
+                if result.was_successfull:
+                    ack_latencies[index].append(self._clock.time() - send_time)
+                results[index] = result
+            for index in unanswered:
+                results[index] = CommunicationResult(error=ErrorType.COMM_ERROR)
+            pending = [index for index in pending if not results[index].was_successfull]
+            for index in pending:
+                logging.warning("try_%s with '%s', failed attempt: %s",
+                    "get" if is_getter else "set", commands[index][0], results[index].error.name)
             retries_left -= 1
 
-        # at success or when no retries are left
-        # if it failed, the last error is still in the result variable
-        return result
+        for index, (command, *_) in enumerate(commands):
+            self._instrumentation.record(command, results[index], ack_latencies[index],
+                retries=attempts[index] - 1)
+        # if a command failed, its last error is still in the result
+        return results
 
     def send_abort(self):
         """Send a command to abort the currently running command"""
@@ -429,7 +1366,7 @@ class Mainboard:
             try:
                 self._connection.send(line)
                 return True
-            except bluetooth.BluetoothError:
+            except (bluetooth.BluetoothError, OSError):
                 logging.exception("Send command failed")
         return False
 
@@ -438,30 +1375,133 @@ class Mainboard:
         :returns: Response object containing information about the response or errors """
         if not self.is_connected:
             return RawResponse(ResponseTypes.COMM_ERROR, "port not open")
-        line = self._connection.read_line()
-        if line == "":
-            return RawResponse(ResponseTypes.COMM_ERROR, "empty line read")
-        tokens = line.split()
+        if self.uses_reader:
+            return self._reader.get(timeout=RESPONSE_TIMEOUT)
+        return self._parse_line(self._connection.read_line())
+
+    def _parse_line(self, line: str) -> RawResponse:
+        """Parse a line received from the mainboard.
+        :returns: Response object containing information about the response or errors """
+        message = self._parser.parse(line)
         # Do not repeat status messages over and over again
-        is_idle_message = self._is_status_message(tokens) or self._is_is_idle_message(tokens)
-        do_logging = not is_idle_message or not self._last_message_was_status_idle
-        if do_logging:
+        is_idle_message = self._parser.is_idle_message(message)
+        if line and (not is_idle_message or not self._last_message_was_status_idle):
             logging.debug("<- '%s'", line)
         self._last_message_was_status_idle = is_idle_message
+        if message.message_type != ResponseTypes.COMM_ERROR:
+            self._last_message_time = self._clock.time()
+        return message
 
-        # expected format: <Type> <Command> [Parameter1] [Parameter2] ...
-        # find message type
-        if len(tokens) > 0:
-            for msg_type in ResponseTypes:
-                if msg_type.name != tokens[0]:
-                    continue
-                if len(tokens) < 2:
-                    return RawResponse(ResponseTypes.COMM_ERROR, "wrong format")
-                return RawResponse(ResponseTypes[tokens[0]], tokens[1], tokens[2:])
-        return RawResponse(ResponseTypes.COMM_ERROR, "unknown type")
+class AsyncMainboard:
+    """Awaitable interface to the mainboard.
+    The commands are sent by the given mainboard and the responses are awaited
+    using its reader thread, so several coroutines can share one event loop.
+    The commands are executed by the same procedures as the blocking methods of the mainboard.
+    """
+    def __init__(self, mainboard: Mainboard):
+        self._mainboard = mainboard
+
+    @property
+    def mainboard(self) -> Mainboard:
+        """Get the blocking mainboard that is used for sending"""
+        return self._mainboard
+
+    @property
+    def is_connected(self):
+        """Get wether the mainboard is connected and ready"""
+        return self._mainboard.is_connected
+
+    async def connect(self, identifier: str) -> bool:
+        """Connect to the mainboard, this is done in a worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._mainboard.connect, identifier)
+
+    async def disconnect(self):
+        """Disconnect from the mainboard, this is done in a worker thread"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._mainboard.disconnect)
+
+    async def read_message(self, message_types: List[ResponseTypes] = None) -> RawResponse:
+        """Wait for the next message of the given types.
+        :param message_types: Types of the messages to wait for, None for any type
+        :returns: Response object containing information about the response or errors """
+        if not self.is_connected:
+            return RawResponse(ResponseTypes.COMM_ERROR, "port not open")
+        if not self._mainboard.uses_reader:
+            # there is no reader, so the connection has to be read directly
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._mainboard.read_message)
+        return await self._mainboard.reader.get_async(message_types, RESPONSE_TIMEOUT)
+
+    async def send_command_and_read_response(self, command, *parameters:str) -> CommunicationResult:
+        """Send a command and await its response from the mainboard.
+
+        :param command: Command name
+        :param parameters: Parameter for the controller command
+        :returns: CommunicationResult
+        """
+        if not self._mainboard.send_command(command, *parameters):
+            return CommunicationResult(error=ErrorType.SEND_FAILED)
+        message = await self.read_message(
+            [message_type for message_type in ResponseTypes
+                if message_type != ResponseTypes.STATUS]
+        )
+        return _check_response(command, message)
+
+    async def do(self, command, *parameters:str,
+                 on_status: Callable[[Tuple[str, ...]], None] = None) -> CommunicationResult:
+        """
+        Send a DO command to the controller and await it to finish
+
+        :param command: Command name
+        :param parameters: Parameter for the controller command
+        :param on_status: Called with the parameters of status messages of the command
+        :returns: CommunicationResult
+        """
+        return await self._execute(_do_procedure(command, parameters, on_status))
 
-    def _is_status_message(self, tokens):
-        return tokens == ["STATUS", "IDLE"]
+    async def set(self, command, *parameters:str, force: bool = False) -> CommunicationResult:
+        """
+        Send a SET command to the controller.
+        It is skipped if the mainboard already acknowledged the same value.
 
-    def _is_is_idle_message(self, tokens):
-        return tokens == ["ACK", "IsIdle", "1"]
+        :param command: Command name
+        :param parameters: Parameter for the controller command
+        :param force: Send the command even if the mainboard should have the value
+        :returns: Whether the command executed successfully
+        """
+        set_cache = self._mainboard.set_cache
+        if not force and set_cache.is_known(command, parameters):
+            return CommunicationResult()
+        result = await self._execute(_set_procedure(command, parameters))
+        set_cache.update(command, parameters, result)
+        return result
+
+    async def get(self, command, *parameters:str) -> CommunicationResult:
+        """
+        Send a GET command to the controller
+
+        :param command: Command name
+        :param parameters: Parameter for the controller command
+        :returns: CommunicationResult containing the returned value on success
+        """
+        return await self._execute(_get_procedure(command, parameters))
+
+    async def _execute(self, procedure: CommandProcedure) -> CommunicationResult:
+        """Execute the steps of a command procedure without blocking the event loop"""
+        trace = _ProcedureTrace(self._mainboard.clock)
+        try:
+            step = next(procedure)
+            while True:
+                trace.step_started(step)
+                if step is _READ_MESSAGE:
+                    answer = await self.read_message()
+                else:
+                    answer = await self.send_command_and_read_response(
+                        step.command, *step.parameters
+                    )
+                trace.step_finished(step, answer)
+                step = procedure.send(answer)
+        except StopIteration as stop:
+            trace.record(self._mainboard.instrumentation, stop.value)
+            return stop.value
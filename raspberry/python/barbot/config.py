@@ -11,7 +11,10 @@ import yaml
 data_directory = os.path.expanduser('~/.barbot/')
 __version_file = os.path.join(os.path.dirname(os.path.realpath(__file__)),"../../version.txt")
 PORT_COUNT = 12
-
+# time in seconds the user gets to take the hands off the glas before the drink starts
+HANDS_OFF_DELAY = 1
+# time in seconds the finished drink is shown before the barbot goes back to idle
+GLASS_REMOVAL_DELAY = 4
 
 # density relative to that of water
 DENSITY_WATER = 1
@@ -96,8 +99,8 @@ def get_ingredient_by_identifier(identifier: str):
 
 class PortConfiguration:
     """Manages the relation between the ports and the connected ingredients"""
-    def __init__(self, load_on_init : bool = True):
-        self._filepath = os.path.join(data_directory, 'ports.yaml')
+    def __init__(self, load_on_init : bool = True, directory: str = data_directory):
+        self._filepath = os.path.join(directory, 'ports.yaml')
         self._list: dict[int, Ingredient]= {i: None for i in range(PORT_COUNT)}
         # if loading failed save the default value to file
         if load_on_init and not self.load():
@@ -125,6 +128,15 @@ class PortConfiguration:
                 return port
         return None
 
+    def ports_of_ingredient(self, ingredient: Ingredient) -> List[int]:
+        """Get all ports the given ingredient is connected to,
+        several bottles of the same ingredient can be connected
+        :param ingredient: The ingredient to look for
+        :return: The ports in ascending order, empty if it was not found
+        """
+        return sorted(port for port, list_ingredient in self._list.items()
+                      if list_ingredient == ingredient)
+
     def save(self, output_stream : TextIOWrapper = None):
         """ Save the current port configuration
         :return: True if saving was successfull, False otherwise
@@ -183,7 +195,9 @@ class PortConfiguration:
 class BarBotConfig:
     """Configuration for the barbot"""
     # fields
+    # mac address of the bluetooth mainboard, path of its serial port or address of a bridge
     mac_address:str = ""
+    serial_baud_rate:int = 115200
     max_speed:int = 200
     max_accel:int = 300
     max_cocktail_size:int = 30
@@ -200,9 +214,20 @@ class BarBotConfig:
     straw_dispenser_connected:bool = False
     sugar_dispenser_connected:bool = False
     sugar_per_unit:int = 4
-
-    def __init__(self, load_on_init : bool = True):
-        self._filename = os.path.join(data_directory, "config.yaml")
+    idle_poll_min_interval:float = 0.1
+    idle_poll_max_interval:float = 5.0
+    disconnect_detection_time:float = 2.0
+    # the firmware executes a whole mixing program uploaded with a single command
+    upload_mixing_program:bool = False
+    # reorder the pumped ingredients of a drink, so the platform travels less
+    minimize_travel:bool = False
+    # content of a new bottle in g, the fill level of a port is reset to it
+    bottle_size:int = 700
+    # draft less by the overshoot that is learned for each port
+    compensate_overshoot:bool = False
+
+    def __init__(self, load_on_init : bool = True, directory: str = data_directory):
+        self._filename = os.path.join(directory, "config.yaml")
         cls_annotations = BarBotConfig.__dict__.get('__annotations__', {})
         self._fields = [field for field, type in cls_annotations.items()]
         if load_on_init is True and not self.load():
@@ -259,9 +284,15 @@ class BarBotConfig:
 
     @property
     def is_mac_address_valid(self):
-        """Get whether the mac address has the correct structure"""
+        """Get whether the mac address has the correct structure,
+        or is the path of a device or an address as 'host:port'"""
         if self.mac_address is None:
             return False
+        if self.mac_address.startswith("/dev/"):
+            return True
+        host, _, port = self.mac_address.rpartition(":")
+        if len(host) > 0 and port.isdigit():
+            return True
         return len(self.mac_address.strip()) == 17
 
     def load(self, input_stream : TextIOWrapper = None):
@@ -0,0 +1,635 @@
+"""Emulator of the mainboard firmware with a physical model of the barbot.
+It speaks the same line protocol as 'firmware/mainboard/src/main.cpp' and can be used
+in-process, over a pty or over a TCP socket using the bridge.
+
+Run it standalone with 'python -m barbot.emulator --tcp 5555' or '--pty'.
+"""
+from collections import deque
+from enum import Enum, auto
+from typing import Callable, Deque, Dict, Generator, List, Optional, Set, Tuple
+import argparse
+import logging
+import os
+import select
+import threading
+from .bridge import MainboardBridge
+from .clock import Clock
+from .communication import BoardType, ErrorType, MainboardConnection, CONNECTION_TIMEOUT
+from .planner import MIXING_POSITION, CRUSHER_POSITION, SUGAR_POSITION, port_position
+
+# must match 'Configuration.h' of the mainboard
+DRAFT_PORTS_COUNT = 12
+GLASS_WEIGHT_MIN = 300
+# an ingredient is empty if the weight grows by less than the given weight in the given time
+DRAFT_TIMEOUT = (3, 20)
+ICE_TIMEOUT = (5, 10)
+SUGAR_TIMEOUT = (3, 5)
+# must match 'Protocol.h', a status message is sent if nothing was sent for this time
+LINK_TIME = 0.3
+# must match 'Version.h'
+FIRMWARE_VERSION = 999999
+
+class Fault(Enum):
+    """Faults that can be injected into the emulator, they stay active until they are cleared"""
+    # the balance does not answer on the I2C bus
+    BALANCE_I2C = auto()
+    # the balance does not send new data
+    BALANCE_TIMEOUT = auto()
+    CRUSHER_COVER_OPEN = auto()
+    CRUSHER_TIMEOUT = auto()
+    SUGAR_DISPENSER_TIMEOUT = auto()
+    MIXING_FAILED = auto()
+
+# result of an action, None on success, else the error and the parameter sent with it
+ActionResult = Optional[Tuple[ErrorType, int]]
+# actions yield once per tick of the emulator
+Action = Generator[None, None, ActionResult]
+
+class _CommandType(Enum):
+    GET = auto()
+    SET = auto()
+    DO = auto()
+
+class MainboardEmulator:
+    """Emulates the protocol and the hardware of the mainboard.
+    The platform moves with a trapezoidal velocity profile, the pumps have a flow rate
+    per port and the bottles, the ice, the sugar and the straws run out.
+    Time only passes in update(), which is called when reading a line.
+    :param clock: Clock used for the time, a virtual clock runs the emulation faster
+    """
+    def __init__(self, clock: Clock = None):
+        self._clock = clock if clock is not None else Clock()
+        # the lines are sent and read from different threads
+        self._lock = threading.RLock()
+        self._input: Deque[str] = deque()
+        self._output: Deque[str] = deque()
+        self._time = self._clock.time()
+        self._last_send_time = self._time
+        self._running_command: str = None
+        self._action: Action = None
+        self._abort = False
+        # length of a simulation step in seconds
+        self.tick = 0.01
+        self.faults: Set[Fault] = set()
+        self.connected_boards: List[BoardType] = list(BoardType)
+        # platform, like the firmware after startup
+        self.position = 0.0
+        self._velocity = 0.0
+        self.max_speed = 100.0
+        self.max_accel = 20.0
+        # pumps, the flow rate is reached at full power
+        self.pump_power = 80
+        self.flow_rates: List[float] = [12.0] * DRAFT_PORTS_COUNT
+        self.bottles: List[float] = [1000.0] * DRAFT_PORTS_COUNT
+        # weight in g that still runs out of the hose after the pump stopped
+        self.hose_overshoot: List[float] = [0.0] * DRAFT_PORTS_COUNT
+        # other dispensers in g per second and the amount left in g
+        self.ice_rate = 20.0
+        self.ice_left = 2000.0
+        self.sugar_rate = 2.0
+        self.sugar_left = 500.0
+        self.straws_left = 50
+        self.straw_duration = 1.0
+        # balance
+        self.glass_weight = 350.0
+        self.glass_present = True
+        self.content_weight = 0.0
+        self.balance_calibration = -1040
+        self.balance_offset = -123865
+        self._commands: Dict[str, Tuple[_CommandType, Callable]] = {
+            "Delay": (_CommandType.DO, self._start_delay),
+            "Draft": (_CommandType.DO, self._start_draft),
+            "Crush": (_CommandType.DO, self._start_crush),
+            "Sugar": (_CommandType.DO, self._start_sugar),
+            "Mix": (_CommandType.DO, self._start_mix),
+            "Clean": (_CommandType.DO, self._start_clean),
+            "Straw": (_CommandType.DO, self._start_straw),
+            "Home": (_CommandType.DO, self._start_home),
+            "Move": (_CommandType.DO, self._start_move),
+            "PlatformLED": (_CommandType.SET, self._set_platform_led),
+            "SetSpeed": (_CommandType.SET, self._set_speed),
+            "SetAccel": (_CommandType.SET, self._set_accel),
+            "SetBalanceCalibration": (_CommandType.SET, self._set_balance_calibration),
+            "SetBalanceOffset": (_CommandType.SET, self._set_balance_offset),
+            "SetPumpPower": (_CommandType.SET, self._set_pump_power),
+            "SetLED": (_CommandType.SET, self._set_led),
+            "IsIdle": (_CommandType.GET, lambda: int(self._running_command is None)),
+            "GetFirmwareVersion": (_CommandType.GET, lambda: FIRMWARE_VERSION),
+            "GetWeight": (_CommandType.GET, lambda: int(self.weight)),
+            "HasGlas": (_CommandType.GET, lambda: int(self.weight > GLASS_WEIGHT_MIN)),
+            "GetConnectedBoards": (_CommandType.GET, self._get_connected_boards),
+        }
+        self._send_status()
+
+    @property
+    def weight(self) -> float:
+        """Weight on the balance in g"""
+        return self.glass_weight + self.content_weight if self.glass_present else 0
+
+    @property
+    def running_command(self) -> Optional[str]:
+        """Name of the DO command that is executed, None if idle"""
+        return self._running_command
+
+    def place_glass(self):
+        """Place an empty glass on the platform"""
+        self.glass_present = True
+        self.content_weight = 0
+
+    def remove_glass(self):
+        """Remove the glass, whatever is added afterwards is spilled"""
+        self.glass_present = False
+        self.content_weight = 0
+
+    # protocol
+
+    def receive_line(self, line: str):
+        """Receive a line sent to the mainboard, it is processed on the next update"""
+        with self._lock:
+            self._input.append(line)
+
+    def read_line(self, timeout: float = CONNECTION_TIMEOUT) -> Optional[str]:
+        """Run the emulation until the mainboard sends a line.
+        :param timeout: Time in seconds to wait for a line
+        :returns: The line without line ending, None if nothing was sent in time
+        """
+        start_time = self._clock.time()
+        while True:
+            with self._lock:
+                self.update()
+                if len(self._output) > 0:
+                    return self._output.popleft()
+            if self._clock.time() - start_time >= timeout:
+                return None
+            self._clock.sleep(self.tick)
+
+    def discard_output(self):
+        """Forget the lines that were not read yet, like the firmware does without a connection"""
+        with self._lock:
+            self.update()
+            self._output.clear()
+
+    def update(self):
+        """Run the emulation up to the current time of the clock and process received lines"""
+        with self._lock:
+            now = self._clock.time()
+            while self._time + self.tick <= now:
+                self._time += self.tick
+                self._update_running_command()
+            while len(self._input) > 0:
+                self._process(self._input.popleft())
+            if self._time - self._last_send_time >= LINK_TIME:
+                self._send_status()
+
+    def _send(self, line: str):
+        self._output.append(line)
+        self._last_send_time = self._time
+
+    def _send_status(self):
+        self._send(f"STATUS {self._running_command or 'IDLE'}")
+
+    def _process(self, line: str):
+        words = line.split()
+        if len(words) == 0:
+            # e.g. the '\n' of a client that ends its lines with '\r\n'
+            return
+        command, *parameters = words
+        if self._running_command is not None:
+            # only an abort is accepted while a command is running
+            if command == "ABORT":
+                self._abort = True
+            return
+        if command not in self._commands:
+            self._send(f"NAK {command}")
+            return
+        command_type, start = self._commands[command]
+        try:
+            result = start(*[int(parameter) for parameter in parameters])
+        except (TypeError, ValueError):
+            result = None
+        if result is None or result is False:
+            self._send(f"NAK {command}")
+        elif command_type == _CommandType.GET:
+            self._send(f"ACK {command} {result}")
+        elif command_type == _CommandType.SET:
+            self._send(f"ACK {command}")
+        else:
+            self._send(f"ACK {command}")
+            self._running_command = command
+            self._action = result
+            self._abort = False
+
+    def _update_running_command(self):
+        if self._action is None:
+            return
+        try:
+            next(self._action)
+        except StopIteration as stop:
+            if stop.value is None:
+                self._send(f"DONE {self._running_command}")
+            else:
+                error, parameter = stop.value
+                self._send(f"ERROR {self._running_command} {error.value} {int(parameter)}")
+            self._running_command = None
+            self._action = None
+            self._abort = False
+
+    # SET and GET commands, they return None if the parameters are invalid
+
+    def _set_platform_led(self, mode: int):
+        return 0 <= mode < 10 and Fault.BALANCE_I2C not in self.faults
+
+    def _set_speed(self, speed: int):
+        if 0 < speed < 5000:
+            self.max_speed = speed
+            return True
+        return None
+
+    def _set_accel(self, accel: int):
+        if 0 < accel < 5000:
+            self.max_accel = accel
+            return True
+        return None
+
+    def _set_balance_calibration(self, calibration: int):
+        if calibration != 0:
+            self.balance_calibration = calibration
+            return True
+        return None
+
+    def _set_balance_offset(self, offset: int):
+        self.balance_offset = offset
+        return True
+
+    def _set_pump_power(self, power: int):
+        if 0 < power <= 100:
+            self.pump_power = power
+            return True
+        return None
+
+    def _set_led(self, mode: int):
+        return 0 <= mode < 10
+
+    def _get_connected_boards(self):
+        return sum(1 << board.value for board in self.connected_boards)
+
+    # DO commands, they return the action to execute or None if the parameters are invalid
+
+    def _start_delay(self, milliseconds: int):
+        if 0 < milliseconds < 5000:
+            return self._wait(milliseconds / 1000)
+        return None
+
+    def _start_draft(self, port: int, weight: int):
+        if 0 <= port < DRAFT_PORTS_COUNT and 0 < weight < 400:
+            return self._draft(port, weight)
+        return None
+
+    def _start_crush(self, weight: int):
+        if 0 < weight < 400:
+            return self._crush(weight)
+        return None
+
+    def _start_sugar(self, weight: int):
+        if 0 < weight < 400:
+            return self._dispense_sugar(weight)
+        return None
+
+    def _start_mix(self, seconds: int):
+        if seconds > 0:
+            return self._mix(min(seconds, 255))
+        return None
+
+    def _start_clean(self, port: int, milliseconds: int):
+        if 0 <= port < DRAFT_PORTS_COUNT and 100 < milliseconds <= 10000:
+            return self._clean(port, milliseconds / 1000)
+        return None
+
+    def _start_straw(self):
+        return self._dispense_straw()
+
+    def _start_home(self):
+        return self._move_to(0)
+
+    def _start_move(self, position: int):
+        if 0 <= position < 5000:
+            return self._move_to(position)
+        return None
+
+    # actions
+
+    def _wait(self, duration: float) -> Action:
+        end_time = self._time + duration
+        while self._time < end_time:
+            if self._abort:
+                return ErrorType.COMMAND_ABORTED, 0
+            yield
+        return None
+
+    def _move_to(self, target: float) -> Action:
+        """Move the platform with a trapezoidal velocity profile"""
+        target = min(target, CRUSHER_POSITION)
+        while True:
+            if self._abort:
+                # decelerate until the platform stopped
+                while abs(self._velocity) > 0:
+                    self._accelerate_to(0)
+                    yield
+                return ErrorType.COMMAND_ABORTED, 0
+            distance = target - self.position
+            if abs(distance) < 1e-6 and abs(self._velocity) < 1e-6:
+                self.position = target
+                self._velocity = 0
+                return None
+            # brake as late as possible
+            braking_distance = self._velocity ** 2 / (2 * self.max_accel)
+            direction = 1 if distance > 0 else -1
+            if abs(distance) <= braking_distance + abs(self._velocity) * self.tick \
+                    or self._velocity * direction < 0:
+                speed = 0
+            else:
+                speed = direction * self.max_speed
+            self._accelerate_to(speed)
+            step = self._velocity * self.tick
+            if abs(step) >= abs(distance) and step * direction >= 0:
+                # the target is reached within this tick
+                self.position = target
+                self._velocity = 0
+            else:
+                self.position += step
+            yield
+
+    def _accelerate_to(self, speed: float):
+        change = self.max_accel * self.tick
+        if self._velocity < speed:
+            self._velocity = min(speed, self._velocity + change)
+        else:
+            self._velocity = max(speed, self._velocity - change)
+        # avoid creeping towards the target when braking
+        if speed == 0 and abs(self._velocity) < change:
+            self._velocity = change if self._velocity > 0 else -change if self._velocity < 0 else 0
+
+    def _check_balance(self) -> ActionResult:
+        if Fault.BALANCE_I2C in self.faults:
+            return ErrorType.I2C, 0
+        if Fault.BALANCE_TIMEOUT in self.faults:
+            return ErrorType.BALANCE_COMMUNICATION, 0
+        return None
+
+    def _check_glass(self) -> ActionResult:
+        error = self._check_balance()
+        if error is None and self.weight <= GLASS_WEIGHT_MIN:
+            return ErrorType.GLAS_REMOVED, 0
+        return error
+
+    def _fill(self, target_weight: float, timeout: Tuple[float, float],
+              flow: Callable[[float], float], check: Callable[[], ActionResult] = None) -> Action:
+        """Add to the glass until the target weight is reached.
+        :param flow: Called with the length of the tick, returns the weight that was dispensed
+        :param check: Called on every tick, returns an error to stop dispensing
+        """
+        timeout_duration, timeout_weight = timeout
+        last_check_time, last_check_weight = self._time, self.weight
+        while True:
+            if self._abort:
+                return ErrorType.COMMAND_ABORTED, 0
+            error = self._check_balance() or (check() if check is not None else None)
+            if error is not None:
+                return error[0], target_weight - self.weight
+            if self.weight > target_weight:
+                return None
+            if self._time > last_check_time + timeout_duration:
+                if self.weight < last_check_weight + timeout_weight:
+                    return ErrorType.INGREDIENT_EMPTY, target_weight - self.weight
+                last_check_time, last_check_weight = self._time, self.weight
+            added = flow(self.tick)
+            if self.glass_present:
+                self.content_weight += added
+            yield
+
+    def _draft(self, port: int, weight: float) -> Action:
+        target_weight = self.weight + weight
+        error = yield from self._move_to(port_position(port))
+        error = error or self._check_glass()
+        if error is not None:
+            return error[0], target_weight - self.weight
+        def pump(duration):
+            added = min(self.bottles[port], self.flow_rates[port] * self.pump_power / 100 * duration)
+            self.bottles[port] -= added
+            return added
+        error = yield from self._fill(target_weight, DRAFT_TIMEOUT, pump)
+        if error is None:
+            overshoot = min(self.bottles[port], self.hose_overshoot[port])
+            self.bottles[port] -= overshoot
+            if self.glass_present:
+                self.content_weight += overshoot
+        return error
+
+    def _crush(self, weight: float) -> Action:
+        target_weight = self.weight + weight
+        error = yield from self._move_to(CRUSHER_POSITION)
+        error = error or self._check_glass()
+        if error is None and BoardType.CRUSHER not in self.connected_boards:
+            error = ErrorType.I2C, 0
+        if error is not None:
+            return error[0], target_weight - self.weight
+        def crush(duration):
+            added = min(self.ice_left, self.ice_rate * duration)
+            self.ice_left -= added
+            return added
+        def check():
+            if Fault.CRUSHER_COVER_OPEN in self.faults:
+                return ErrorType.CRUSHER_COVER_OPEN, 0
+            if Fault.CRUSHER_TIMEOUT in self.faults:
+                return ErrorType.CRUSHER_TIMEOUT, 0
+            return None
+        return (yield from self._fill(target_weight, ICE_TIMEOUT, crush, check))
+
+    def _dispense_sugar(self, weight: float) -> Action:
+        target_weight = self.weight + weight
+        error = yield from self._move_to(SUGAR_POSITION)
+        error = error or self._check_glass()
+        if error is None and BoardType.SUGAR not in self.connected_boards:
+            error = ErrorType.I2C, 0
+        if error is not None:
+            return error[0], target_weight - self.weight
+        def dispense(duration):
+            added = min(self.sugar_left, self.sugar_rate * duration)
+            self.sugar_left -= added
+            return added
+        def check():
+            if Fault.SUGAR_DISPENSER_TIMEOUT in self.faults:
+                return ErrorType.SUGAR_DISPENSER_TIMEOUT, 0
+            return None
+        return (yield from self._fill(target_weight, SUGAR_TIMEOUT, dispense, check))
+
+    def _mix(self, seconds: int) -> Action:
+        error = yield from self._move_to(MIXING_POSITION)
+        if error is None and BoardType.MIXER not in self.connected_boards:
+            error = ErrorType.I2C, 0
+        error = error or (yield from self._wait(seconds))
+        if error is None and Fault.MIXING_FAILED in self.faults:
+            error = ErrorType.MIXING_FAILED, 0
+        return error
+
+    def _clean(self, port: int, duration: float) -> Action:
+        error = yield from self._move_to(port_position(port))
+        end_time = self._time + duration
+        while error is None and self._time < end_time:
+            if self._abort:
+                return ErrorType.COMMAND_ABORTED, 0
+            added = min(self.bottles[port],
+                        self.flow_rates[port] * self.pump_power / 100 * self.tick)
+            self.bottles[port] -= added
+            if self.glass_present:
+                self.content_weight += added
+            yield
+        return error
+
+    def _dispense_straw(self) -> Action:
+        if BoardType.STRAW not in self.connected_boards:
+            return ErrorType.I2C, 0
+        # the straw board cannot be aborted
+        end_time = self._time + self.straw_duration
+        while self._time < end_time:
+            yield
+        if self.straws_left <= 0:
+            return ErrorType.STRAWS_EMPTY, 0
+        self.straws_left -= 1
+        return None
+
+class MainboardConnectionEmulator(MainboardConnection):
+    """Connection to an emulator running in the same process"""
+    def __init__(self, emulator: MainboardEmulator):
+        self._emulator = emulator
+        self._is_connected = False
+
+    @property
+    def emulator(self) -> MainboardEmulator:
+        """Get the emulated mainboard"""
+        return self._emulator
+
+    @staticmethod
+    def find_bar_bot() -> str:
+        return "emulator"
+
+    def connect(self, identifier: str = "") -> bool:
+        self._emulator.discard_output()
+        self._is_connected = True
+        return True
+
+    def disconnect(self):
+        self._is_connected = False
+
+    def read_line(self) -> str:
+        if not self._is_connected:
+            return None
+        return self._emulator.read_line()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._is_connected
+
+    def send(self, line: str):
+        self._emulator.receive_line(line)
+
+class EmulatorStreamServer:
+    """Serves an emulator over a file descriptor, e.g. a pty or a socket.
+    Lines are received with '\\r' and sent with '\\r\\n' like by the firmware.
+    :param emulator: The emulator, its clock has to be real time
+    :param fileno: File descriptor to read and write
+    """
+    def __init__(self, emulator: MainboardEmulator, fileno: int):
+        self._emulator = emulator
+        self._fileno = fileno
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the lines are still served"""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Start serving in background threads"""
+        self._threads = [
+            threading.Thread(target=self._receive, name="EmulatorReceive", daemon=True),
+            threading.Thread(target=self._send, name="EmulatorSend", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 1):
+        """Stop serving, the file descriptor is not closed"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _receive(self):
+        buffer = b""
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fileno], [], [], 0.1)
+            if len(readable) == 0:
+                continue
+            try:
+                data = os.read(self._fileno, 1024)
+            except OSError:
+                data = b""
+            if len(data) == 0:
+                # the other side closed the stream
+                self._stop.set()
+                return
+            buffer += data.replace(b"\n", b"")
+            *lines, buffer = buffer.split(b"\r")
+            for line in lines:
+                self._emulator.receive_line(line.decode("utf-8", "replace"))
+
+    def _send(self):
+        while not self._stop.is_set():
+            line = self._emulator.read_line(timeout=0.1)
+            if line is None:
+                continue
+            try:
+                os.write(self._fileno, f"{line}\r\n".encode())
+            except OSError:
+                self._stop.set()
+                return
+
+def serve_pty(emulator: MainboardEmulator) -> Tuple[EmulatorStreamServer, str]:
+    """Serve the emulator on a new pseudo terminal.
+    :returns: The server and the path of the terminal to connect to
+    """
+    controller, terminal = os.openpty()
+    # the line discipline must not change the line endings
+    try:
+        import tty # pylint: disable=import-outside-toplevel
+        tty.setraw(terminal)
+    except ImportError:
+        pass
+    server = EmulatorStreamServer(emulator, controller)
+    server.start()
+    return server, os.ttyname(terminal)
+
+def _main():
+    parser = argparse.ArgumentParser(description="Emulate the mainboard of the barbot")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--tcp", type=int, metavar="PORT", help="serve on a local TCP port")
+    group.add_argument("--pty", action="store_true", help="serve on a pseudo terminal")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    emulator = MainboardEmulator()
+    if args.pty:
+        server, path = serve_pty(emulator)
+        logging.info("Emulator serves on %s", path)
+    else:
+        server = MainboardBridge(MainboardConnectionEmulator(emulator), "emulator", port=args.tcp)
+        server.start()
+        logging.info("Emulator serves on port %i", server.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,127 @@
+"""Events that drive the state machine of the barbot and the trace of its transitions"""
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Any, Deque, List, Optional
+import threading
+from .clock import Clock
+
+# number of transitions that are kept in the trace
+TRANSITION_HISTORY_LENGTH = 200
+
+class EventType(Enum):
+    """Enumeration of the events the state machine reacts to"""
+    # the user answered a message
+    USER_INPUT = auto()
+    # the user interacted with the gui, the mainboard is polled more frequently
+    USER_ACTIVITY = auto()
+    # mixing or the whole state machine was aborted
+    ABORT = auto()
+    # a drink was added to the order queue
+    ORDER = auto()
+    # the user started an action like mixing or cleaning
+    START = auto()
+    # a command should be sent to the mainboard while idle
+    IDLE_TASK = auto()
+    # bottles were replaced, the value are their ports
+    BOTTLES_CHANGED = auto()
+    # the reader received a message from the mainboard
+    MESSAGE_RECEIVED = auto()
+    # the time to wait for an event passed
+    TIMER = auto()
+
+# events that only wake up the state machine, several of them are merged into one
+_COALESCED_TYPES = [EventType.USER_ACTIVITY, EventType.MESSAGE_RECEIVED]
+
+@dataclass(frozen=True)
+class Event:
+    """Event for the state machine"""
+    type: EventType
+    # time of the clock when the event happened in seconds
+    time: float
+    value: Any = None
+
+class EventQueue:
+    """Thread-safe queue of the events for the state machine.
+    Events can be put by any thread, only the state machine should get them.
+    :param clock: Clock for the time of the events and the timeouts
+    """
+    def __init__(self, clock: Clock = None):
+        self._clock = clock if clock is not None else Clock()
+        self._condition = threading.Condition()
+        self._events: Deque[Event] = deque()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._events)
+
+    def put(self, event_type: EventType, value: Any = None) -> Event:
+        """Add an event and wake up the state machine if it is waiting.
+        Events that only wake up the state machine are not added if one is pending already.
+        :returns: The event
+        """
+        with self._condition:
+            event = Event(event_type, self._clock.time(), value)
+            if event_type not in _COALESCED_TYPES \
+                    or all(pending.type != event_type for pending in self._events):
+                self._events.append(event)
+            self._condition.notify_all()
+        return event
+
+    def get(self, timeout: float = 0) -> Event:
+        """Get the oldest event. Blocks until there is one or the timeout passed.
+        :param timeout: Maximum time to wait in seconds
+        :returns: The event, a TIMER event if the timeout passed
+        """
+        with self._condition:
+            deadline = self._clock.time() + timeout
+            while len(self._events) == 0:
+                remaining = deadline - self._clock.time()
+                if remaining <= 0:
+                    return Event(EventType.TIMER, self._clock.time())
+                self._clock.wait_condition(self._condition, remaining)
+            return self._events.popleft()
+
+    def clear(self):
+        """Remove all pending events"""
+        with self._condition:
+            self._events.clear()
+
+@dataclass(frozen=True)
+class StateTransition:
+    """Change of the state of the state machine"""
+    # time of the clock when the state changed in seconds
+    time: float
+    source: Enum
+    target: Enum
+    # event that caused the transition, None if the state function changed the state itself
+    event: Optional[Event] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Time between the event and the transition in seconds, None without event"""
+        return self.time - self.event.time if self.event is not None else None
+
+class TransitionTrace:
+    """Keeps the last transitions of the state machine"""
+    def __init__(self, length: int = TRANSITION_HISTORY_LENGTH):
+        self._transitions: Deque[StateTransition] = deque(maxlen=length)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """Number of transitions since the state machine was created"""
+        return self._count
+
+    @property
+    def transitions(self) -> List[StateTransition]:
+        """Get the last transitions, the oldest first"""
+        with self._lock:
+            return list(self._transitions)
+
+    def add(self, transition: StateTransition):
+        """Add a transition to the trace"""
+        with self._lock:
+            self._transitions.append(transition)
+            self._count += 1
@@ -0,0 +1,123 @@
+"""Flow rate of the pumps, learned from the duration of the drafts"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import logging
+import statistics
+from .config import IngredientType, data_directory
+from .persistence import YamlModel
+
+# number of drafts the flow rate of a port is averaged over
+FLOW_HISTORY_LENGTH = 20
+# drafts needed before outliers are detected
+MIN_FLOW_SAMPLES = 3
+# a draft is an outlier if it deviates more than this many standard deviations,
+# estimated robustly from the median absolute deviation
+OUTLIER_DEVIATIONS = 3.5
+# the deviation is at least this fraction of the usual rate, so a very steady pump does not alert
+MIN_RELATIVE_DEVIATION = 0.05
+# an outlier is slow if its flow rate is below this fraction of the usual rate
+SLOW_FLOW_RATIO = 0.7
+# number of slow drafts in a row that raise an alert
+SLOW_DRAFTS_FOR_ALERT = 2
+
+@dataclass
+class FlowAlert:
+    """The flow of a port dropped, usually the hose is clogged or kinked"""
+    port: int
+    ingredient_type: IngredientType
+    # flow rates in g/s
+    usual_rate: float
+    current_rate: float
+
+class FlowRateModel(YamlModel):
+    """Rolling model of the flow rate of each port and ingredient type in g/s.
+    Outliers are not added to the model, slow outliers in a row raise an alert.
+    The model is saved, so it is not learned again after a restart.
+    :param load_on_init: Load the saved model
+    :param directory: Directory the model is saved in
+    """
+    def __init__(self, load_on_init: bool = True, directory: str = data_directory):
+        super().__init__(directory, 'flow.yaml')
+        self._history: Dict[Tuple[int, IngredientType], List[float]] = {}
+        self._slow_drafts: Dict[Tuple[int, IngredientType], int] = {}
+        self._alerts: Dict[Tuple[int, IngredientType], FlowAlert] = {}
+        if load_on_init:
+            self.load()
+
+    def rate(self, port: int, ingredient_type: IngredientType) -> Optional[float]:
+        """Get the usual flow rate of a port in g/s, None if nothing was drafted yet"""
+        with self._lock:
+            history = self._history.get((port, ingredient_type))
+            return statistics.median(history) if history else None
+
+    def draft_duration(self, port: int, ingredient_type: IngredientType,
+                       weight: float) -> Optional[float]:
+        """Estimate how long the pump runs to draft the weight in s, None if the rate is unknown"""
+        rate = self.rate(port, ingredient_type)
+        return weight / rate if rate else None
+
+    @property
+    def alerts(self) -> List[FlowAlert]:
+        """Get the ports whose flow dropped and that were not checked yet"""
+        with self._lock:
+            return list(self._alerts.values())
+
+    def add_draft(self, port: int, ingredient_type: IngredientType,
+                  weight: float, duration: float) -> Optional[FlowAlert]:
+        """Add a finished draft to the model.
+        :param weight: Weight that was drafted in g
+        :param duration: Time the pump was running in s
+        :returns: An alert if the flow of the port dropped, None otherwise
+        """
+        if weight <= 0 or duration <= 0:
+            return None
+        rate = weight / duration
+        key = (port, ingredient_type)
+        with self._lock:
+            history = self._history.setdefault(key, [])
+            if len(history) >= MIN_FLOW_SAMPLES and _is_outlier(history, rate):
+                usual_rate = statistics.median(history)
+                if rate >= usual_rate * SLOW_FLOW_RATIO:
+                    return None
+                self._slow_drafts[key] = self._slow_drafts.get(key, 0) + 1
+                if self._slow_drafts[key] < SLOW_DRAFTS_FOR_ALERT or key in self._alerts:
+                    return None
+                alert = FlowAlert(port, ingredient_type, usual_rate, rate)
+                self._alerts[key] = alert
+                logging.warning("Flow of port %i dropped from %.1f g/s to %.1f g/s",
+                                port, usual_rate, rate)
+                return alert
+            self._slow_drafts[key] = 0
+            self._history[key] = (history + [rate])[-FLOW_HISTORY_LENGTH:]
+        return None
+
+    def clear_alert(self, port: int):
+        """The port was checked, its flow rate is learned again"""
+        with self._lock:
+            for key in [key for key in self._history if key[0] == port]:
+                del self._history[key]
+            for key in [key for key in self._alerts if key[0] == port]:
+                del self._alerts[key]
+            self._slow_drafts = {
+                key: count for key, count in self._slow_drafts.items() if key[0] != port
+            }
+
+    def _to_data(self):
+        data = {}
+        for (port, ingredient_type), history in self._history.items():
+            data.setdefault(port, {})[ingredient_type.value] = list(history)
+        return data
+
+    def _from_data(self, data):
+        self._history = {
+            (int(port), IngredientType(type_value)): [float(rate) for rate in rates]
+            for port, types in (data or {}).items()
+            for type_value, rates in types.items()
+        }
+
+def _is_outlier(history: List[float], rate: float) -> bool:
+    median = statistics.median(history)
+    deviation = statistics.median(abs(value - median) for value in history)
+    # scale the median absolute deviation to the standard deviation of a normal distribution
+    scale = max(1.4826 * deviation, MIN_RELATIVE_DEVIATION * median)
+    return abs(rate - median) > OUTLIER_DEVIATIONS * scale
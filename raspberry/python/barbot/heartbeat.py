@@ -0,0 +1,139 @@
+"""Adaptive keep-alive of the barbot while it is idle"""
+from dataclasses import dataclass
+from typing import List, Tuple
+import asyncio
+import threading
+from .clock import Clock
+
+# bytes of one 'IsIdle' request and its answer, used to estimate the radio traffic
+POLL_BYTES = len("IsIdle\r") + len("ACK IsIdle 1\r\n")
+
+@dataclass
+class IdleMetrics:
+    """Snapshot of the metrics of the idle heartbeat"""
+    # total time spent in the idle state in seconds
+    idle_time: float = 0
+    # cpu time used by the state machine while idle in seconds
+    idle_cpu_time: float = 0
+    # number of 'IsIdle' requests sent
+    polls: int = 0
+    # current interval between two polls in seconds
+    poll_interval: float = 0
+    # time between the last message received and detecting a disconnect, None if not detected yet
+    last_detection_latency: float = None
+
+    @property
+    def idle_cpu_load(self) -> float:
+        """Fraction of the idle time the cpu was used by the state machine"""
+        return self.idle_cpu_time / self.idle_time if self.idle_time > 0 else 0
+
+    @property
+    def polls_per_hour(self) -> float:
+        """Number of polls per hour of idle time"""
+        return self.polls * 3600 / self.idle_time if self.idle_time > 0 else 0
+
+    @property
+    def bytes_per_hour(self) -> float:
+        """Estimated radio traffic caused by the polls per hour of idle time"""
+        return self.polls_per_hour * POLL_BYTES
+
+class IdleHeartbeat:
+    """Decides when the mainboard is polled while the barbot is idle.
+    After any activity the mainboard is polled with the minimum interval.
+    While nothing happens the interval grows until it reaches the maximum interval.
+    Waiting for the next poll is interrupted as soon as there is activity.
+    :param min_interval: Interval in seconds between polls after activity
+    :param max_interval: Longest interval in seconds between polls
+    :param backoff_factor: Factor the interval grows by with each poll
+    :param clock: Clock used for the intervals
+    """
+    def __init__(self, min_interval: float, max_interval: float, backoff_factor: float = 2,
+                 clock: Clock = None):
+        self._clock = clock if clock is not None else Clock()
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._backoff_factor = backoff_factor
+        self._interval = min_interval
+        self._next_poll_time = self._clock.time()
+        self._wake_event = threading.Event()
+        # events of coroutines waiting for the next poll and the loop they are running in
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._lock = threading.Lock()
+        self._metrics = IdleMetrics(poll_interval=min_interval)
+
+    @property
+    def interval(self) -> float:
+        """Current interval between two polls in seconds"""
+        return self._interval
+
+    @property
+    def is_poll_due(self) -> bool:
+        """Whether the mainboard should be polled now"""
+        return self._clock.time() >= self._next_poll_time
+
+    @property
+    def time_until_poll(self) -> float:
+        """Time in seconds until the mainboard should be polled, 0 if it is due"""
+        return max(0, self._next_poll_time - self._clock.time())
+
+    @property
+    def metrics(self) -> IdleMetrics:
+        """Get a snapshot of the current metrics"""
+        return IdleMetrics(**vars(self._metrics))
+
+    def notify_activity(self):
+        """Poll with the minimum interval again and stop waiting"""
+        self._interval = self._min_interval
+        self._metrics.poll_interval = self._interval
+        self._next_poll_time = min(self._next_poll_time, self._clock.time() + self._min_interval)
+        self.wake()
+
+    def wake(self):
+        """Stop waiting without changing the interval, e.g. to leave the idle state"""
+        self._wake_event.set()
+        with self._lock:
+            for loop, event in self._async_waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    def wait(self, max_duration: float):
+        """Wait until the next poll is due, wake() or notify_activity() was called
+        :param max_duration: Maximum time to wait in seconds
+        """
+        duration = min(max_duration, self._next_poll_time - self._clock.time())
+        if duration > 0:
+            self._clock.wait_event(self._wake_event, duration)
+        self._wake_event.clear()
+
+    async def wait_async(self, max_duration: float):
+        """Awaitable version of wait(), the event loop is not blocked while waiting.
+        The event loop waits in real time, even if the clock is virtual.
+        :param max_duration: Maximum time to wait in seconds
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._async_waiters.append(waiter)
+        try:
+            duration = min(max_duration, self._next_poll_time - self._clock.time())
+            if duration > 0:
+                await asyncio.wait_for(waiter[1].wait(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._async_waiters.remove(waiter)
+
+    def poll_done(self):
+        """Schedule the next poll and increase the interval"""
+        self._metrics.polls += 1
+        self._next_poll_time = self._clock.time() + self._interval
+        self._interval = min(self._interval * self._backoff_factor, self._max_interval)
+        self._metrics.poll_interval = self._interval
+
+    def add_idle_time(self, duration: float, cpu_time: float):
+        """Add time spent in the idle state to the metrics"""
+        self._metrics.idle_time += duration
+        self._metrics.idle_cpu_time += cpu_time
+
+    def disconnect_detected(self, latency: float):
+        """Add the time it took to detect a disconnect to the metrics"""
+        self._metrics.last_detection_latency = latency
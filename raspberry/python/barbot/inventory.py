@@ -0,0 +1,88 @@
+"""Fill levels of the bottles connected to the ports"""
+from typing import Collection, Dict, List, Optional
+from .config import Ingredient, PortConfiguration, data_directory
+from .persistence import YamlModel
+from .program import MixingProgram, StepType
+
+class PortInventory(YamlModel):
+    """Tracks how much is left in the bottle at each port in g.
+    The levels are saved next to the port configuration.
+    The level of a port is unknown until a bottle was registered for it.
+    :param load_on_init: Load the saved levels
+    :param directory: Directory the levels are saved in
+    """
+    def __init__(self, load_on_init: bool = True, directory: str = data_directory):
+        super().__init__(directory, 'inventory.yaml')
+        self._levels: Dict[int, float] = {}
+        if load_on_init:
+            self.load()
+
+    @property
+    def levels(self) -> Dict[int, float]:
+        """Get a copy of the known fill levels of the ports in g"""
+        return dict(self._levels)
+
+    def level(self, port: int) -> Optional[float]:
+        """Get the fill level of a port in g, None if it is unknown"""
+        return self._levels.get(port)
+
+    def set_level(self, port: int, level: Optional[float]):
+        """Set the fill level of a port, e.g. after a new bottle was connected.
+        :param level: The level in g, None if it is unknown
+        """
+        if level is None:
+            self._levels.pop(port, None)
+        else:
+            self._levels[port] = max(0, level)
+
+    def drafted(self, port: int, weight: float):
+        """Subtract what was drafted from a port, unknown levels stay unknown"""
+        if port in self._levels:
+            self._levels[port] = max(0, self._levels[port] - weight)
+
+    def available(self, ingredient: Ingredient, ports: PortConfiguration,
+                  empty_ports: Collection[int] = ()) -> Optional[float]:
+        """Get how much of an ingredient is left in all its bottles.
+        :param empty_ports: Ports that are known to be empty
+        :returns: The weight in g, None if the level of a port is unknown
+        """
+        total = 0
+        for port in ports.ports_of_ingredient(ingredient):
+            if port in empty_ports:
+                continue
+            if port not in self._levels:
+                return None
+            total += self._levels[port]
+        return total
+
+    def missing_ingredients(self, program: MixingProgram, ports: PortConfiguration,
+                            empty_ports: Collection[int] = ()) -> List[Ingredient]:
+        """Get the ingredients that would run dry while the program is executed.
+        Ingredients with unknown levels are assumed to be sufficient.
+        :param program: The program of the drink
+        :param ports: The port configuration, an ingredient may be connected to several ports
+        :param empty_ports: Ports that are known to be empty
+        """
+        needed: Dict[str, float] = {}
+        ingredients: Dict[str, Ingredient] = {}
+        for step in program.steps:
+            if step.type != StepType.DRAFT or step.item is None:
+                continue
+            identifier = step.item.ingredient.identifier
+            needed[identifier] = needed.get(identifier, 0) + step.amount
+            ingredients[identifier] = step.item.ingredient
+        missing = []
+        for identifier, weight in needed.items():
+            available = self.available(ingredients[identifier], ports, empty_ports)
+            if available is not None and available < weight:
+                missing.append(ingredients[identifier])
+        return missing
+
+    def _to_data(self):
+        return dict(self._levels)
+
+    def _from_data(self, data):
+        self._levels = {
+            int(port): float(level) for port, level in (data or {}).items()
+            if level is not None
+        }
@@ -0,0 +1,171 @@
+"""Propose which bottle is connected to which port, based on what was ordered"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import itertools
+from .config import BarBotConfig, Ingredient, IngredientType, PortConfiguration, PORT_COUNT
+from .config import get_ingredient_by_identifier
+from .planner import MotionModel, plan_items, travel_time
+from .recipes import Party, RecipeItem
+
+# local search stops after this many rounds of swapping ports, even if it still improves
+MAX_SWAP_ROUNDS = 20
+
+@dataclass
+class LayoutProposal:
+    """Assignment of the ingredients to the ports and its expected travel time"""
+    ports: Dict[int, Ingredient]
+    # expected travel of the platform per drink in seconds
+    current_time: float
+    proposed_time: float
+
+    @property
+    def saved_time(self) -> float:
+        """Expected seconds of travel saved per drink"""
+        return self.current_time - self.proposed_time
+
+    @property
+    def is_improvement(self) -> bool:
+        """Whether the proposed layout is faster than the current one"""
+        return self.saved_time > 1e-9
+
+def ordered_drinks(parties: Iterable[Party]) -> List[Tuple[List[RecipeItem], int]]:
+    """Get the distinct drinks of all orders and how often each was ordered.
+    Drinks with unknown ingredients are ignored.
+    :returns: The items of each drink with the number of orders
+    """
+    counts: Dict[tuple, int] = {}
+    for party in parties:
+        for order in party.orders:
+            key = tuple((item.ingredient, item.amount) for item in order.items
+                        if item.ingredient is not None)
+            counts[key] = counts.get(key, 0) + 1
+    drinks = []
+    for key, count in counts.items():
+        items = [RecipeItem(get_ingredient_by_identifier(identifier), amount)
+                 for identifier, amount in key]
+        if len(items) == 0 or any(item.ingredient is None for item in items):
+            continue
+        drinks.append((items, count))
+    return drinks
+
+def co_occurrence(drinks: List[Tuple[List[RecipeItem], int]]) -> Dict[Tuple[str, str], int]:
+    """Count how often two pumped ingredients are part of the same drink,
+    weighted by the number of orders of the drink.
+    :returns: The count for each pair of identifiers, both orders of the pair are included
+    """
+    counts: Dict[Tuple[str, str], int] = {}
+    for items, count in drinks:
+        identifiers = {item.ingredient.identifier for item in items if _is_pumped(item)}
+        for pair in itertools.permutations(sorted(identifiers), 2):
+            counts[pair] = counts.get(pair, 0) + count
+    return counts
+
+class LayoutOptimizer:
+    """Searches an assignment of the connected ingredients to the ports,
+    that minimizes the expected travel of the platform per drink.
+    Drinks are weighted by how often they were ordered, so popular drinks count more.
+    :param drinks: The ordered drinks with their number of orders, see ordered_drinks()
+    :param config: Config with the speed and acceleration of the platform
+    :param port_count: Number of ports that can be assigned
+    """
+    def __init__(self, drinks: List[Tuple[List[RecipeItem], int]], config: BarBotConfig,
+                 port_count: int = PORT_COUNT):
+        self._drinks = drinks
+        self._config = config
+        self._motion = MotionModel.from_config(config)
+        self._port_count = port_count
+
+    def expected_time(self, ports: PortConfiguration) -> float:
+        """Get the travel time per drink in seconds, averaged over the orders"""
+        total_count = sum(count for _, count in self._drinks)
+        if total_count == 0:
+            return 0
+        total = 0
+        for items, count in self._drinks:
+            if self._config.minimize_travel:
+                items = plan_items(items, ports, self._config)
+            total += count * travel_time(items, ports, self._motion)
+        return total / total_count
+
+    def propose(self, ports: PortConfiguration) -> LayoutProposal:
+        """Propose where the ingredients that are connected now should be connected.
+        :param ports: The current port configuration
+        """
+        current = {port: ports.ingredient_at_port(port) for port in range(self._port_count)}
+        best, best_time = current, self._time_of(current)
+        # start from the current layout and from one built from the co-occurrences
+        for start in [current, self._initial_assignment(current)]:
+            assignment, time = self._improve_by_swapping(start)
+            if time < best_time - 1e-9:
+                best, best_time = assignment, time
+        # the search uses the order of the recipes, the preview also includes the planner
+        proposed_ports = PortConfiguration(load_on_init=False)
+        proposed_ports.update(best)
+        proposal = LayoutProposal(best, self.expected_time(ports),
+                                  self.expected_time(proposed_ports))
+        if not proposal.is_improvement:
+            return LayoutProposal(current, proposal.current_time, proposal.current_time)
+        return proposal
+
+    def _time_of(self, assignment: Dict[int, Optional[Ingredient]]) -> float:
+        """Fast version of expected_time() for the search, the items keep their order"""
+        total_count = sum(count for _, count in self._drinks)
+        if total_count == 0:
+            return 0
+        ports = PortConfiguration(load_on_init=False)
+        ports.update(assignment)
+        total = 0
+        for items, count in self._drinks:
+            total += count * travel_time(items, ports, self._motion)
+        return total / total_count
+
+    def _initial_assignment(self, current: Dict[int, Optional[Ingredient]]
+                            ) -> Dict[int, Optional[Ingredient]]:
+        """Chain the ingredients so the ones used together are neighbours,
+        beginning with the most popular one at the port next to the start position"""
+        ingredients = [ingredient for ingredient in current.values() if ingredient is not None]
+        pairs = co_occurrence(self._drinks)
+        popularity = {ingredient.identifier: 0 for ingredient in ingredients}
+        for items, count in self._drinks:
+            for identifier in {item.ingredient.identifier for item in items}:
+                if identifier in popularity:
+                    popularity[identifier] += count
+        remaining = sorted(ingredients, key=lambda i: -popularity[i.identifier])
+        chain = []
+        while len(remaining) > 0:
+            if len(chain) == 0:
+                following = remaining[0]
+            else:
+                last = chain[-1].identifier
+                following = max(remaining, key=lambda i: (
+                    pairs.get((last, i.identifier), 0), popularity[i.identifier]
+                ))
+            chain.append(following)
+            remaining.remove(following)
+        assignment = {port: None for port in current}
+        assignment.update(enumerate(chain))
+        return assignment
+
+    def _improve_by_swapping(self, assignment: Dict[int, Optional[Ingredient]]
+                             ) -> Tuple[Dict[int, Optional[Ingredient]], float]:
+        """Swap the ingredients of two ports as long as it makes the drinks faster"""
+        assignment = dict(assignment)
+        time = self._time_of(assignment)
+        for _ in range(MAX_SWAP_ROUNDS):
+            improved = False
+            for first, second in itertools.combinations(assignment.keys(), 2):
+                if assignment[first] is None and assignment[second] is None:
+                    continue
+                assignment[first], assignment[second] = assignment[second], assignment[first]
+                swapped_time = self._time_of(assignment)
+                if swapped_time < time - 1e-9:
+                    time = swapped_time
+                    improved = True
+                else:
+                    assignment[first], assignment[second] = assignment[second], assignment[first]
+            if not improved:
+                break
+        return assignment, time
+
+def _is_pumped(item: RecipeItem) -> bool:
+    return item.ingredient.type not in [IngredientType.STIRR, IngredientType.SUGAR]
@@ -1,23 +1,44 @@
 """Mockups for testing and demo"""
-import time
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+from barbot.clock import Clock
 from barbot.communication import MainboardConnection
 
 class MaiboardConnectionMockup(MainboardConnection):
     """Mockup class for MainboardConnection.
     It executes delays instead of actual communication.
-    The result of a GET command can be set.
+    Commands sent without waiting for the answer are answered one after another.
+    It can be read from a different thread than the one sending the commands.
+    The result of a GET command can be set and DO commands can be made to fail.
+    A 'Program' DO command executes the steps of an uploaded mixing program.
+    :param clock: Clock used for the delays, a virtual clock skips them
     """
-    def __init__(self):
+    def __init__(self, clock: Clock = None):
+        self._clock = clock if clock is not None else Clock()
         self._last_line_sent = None
         self._current_command = None
         self._last_received_time = None
         self._current_command_type = None
         self._command_history = []
         self._was_ack_sent = False
+        # commands that were sent while the current one was not answered yet
+        self._pending_commands: Deque[Tuple[str, List[str], float]] = deque()
+        # commands can be sent and read from different threads
+        self._condition = threading.Condition()
         self._getter_results = {}
+        # errors that the next execution of a DO command should fail with
+        self._errors: Dict[str, Tuple[int, Tuple]] = {}
+        # commands of the steps of the current DO command and the index of the current step
+        self._steps: List[str] = []
+        self._step_index = 0
         self.duration_DO = 0.5
         self.duration_SET = 0.1
         self.duration_GET = 0.1
+        # interval of the status messages while idle or executing a DO command
+        self.status_interval = 0.3
+        # time it takes a line to travel from the barbot to the mainboard and back
+        self.latency = 0
         self.time_since_last_command_sent = 0
         self.commands = {
             "Delay": ["DO", 1],
@@ -44,6 +65,10 @@ class MaiboardConnectionMockup(MainboardConnection):
             "HasGlas": ["GET", 0],
             "GetConnectedBoards": ["GET", 0],
         }
+        # commands with a variable number of parameters, e.g. the steps of a program
+        self.variable_commands = {
+            "Program": "DO",
+        }
 
     @property
     def command_history(self):
@@ -58,6 +83,10 @@ class MaiboardConnectionMockup(MainboardConnection):
         """Set the result that the next call of a get command should return"""
         self._getter_results[getter_command] = int(value)
 
+    def set_error_for_command(self, command: str, error: int, *parameters):
+        """Let the next execution of a DO command fail with the given error code,
+        this includes the steps of a program"""
+        self._errors[command] = (int(error), parameters)
 
     @staticmethod
     def find_bar_bot() -> str:
@@ -72,33 +101,60 @@ class MaiboardConnectionMockup(MainboardConnection):
         pass
 
     def read_line(self) -> str:
-        if self._current_command is None:
-            return "STATUS IDLE"
-        self.time_since_last_command_sent = time.time() - self._last_received_time
-        if self._current_command_type == "DO":
-            return self._handle_DO_command()
-        elif self._current_command_type == "GET":
-            return self._handle_GET_command()
-        else:
-            return self._handle_SET_command()
+        with self._condition:
+            if self._current_command is None and len(self._pending_commands) == 0:
+                # like the mainboard, send a status message if there is nothing else to send
+                self._clock.wait_condition(self._condition, self.status_interval)
+            if self._current_command is None and len(self._pending_commands) > 0:
+                self._start_command(*self._pending_commands.popleft())
+            if self._current_command is None:
+                return "STATUS IDLE"
+            self.time_since_last_command_sent = self._clock.time() - self._last_received_time
+            if self._current_command_type == "DO":
+                return self._handle_DO_command()
+            elif self._current_command_type == "GET":
+                return self._handle_GET_command()
+            else:
+                return self._handle_SET_command()
 
     def _handle_DO_command(self):
-        time_left_for_command = self.duration_DO - self.time_since_last_command_sent
-        time_left_for_command = max(0, time_left_for_command)
+        is_program = self._current_command == "Program"
         if not self._was_ack_sent:
+            if self.time_since_last_command_sent < self.latency:
+                self._clock.sleep(self.latency - self.time_since_last_command_sent)
             self._was_ack_sent = True
             return f"ACK {self._current_command}"
-        if time_left_for_command > 0.3:
-            time.sleep(0.3)
+        # every step takes the duration of a DO command
+        time_left_for_step = self.duration_DO * (self._step_index + 1) + self.latency \
+            - self.time_since_last_command_sent
+        time_left_for_step = max(0, time_left_for_step)
+        if time_left_for_step > self.status_interval:
+            self._clock.sleep(self.status_interval)
+            if is_program:
+                return f"STATUS {self._current_command} {self._step_index}"
             return f"STATUS {self._current_command}"
-        time.sleep(time_left_for_command)
+        self._clock.sleep(time_left_for_step)
+        step_command = self._steps[self._step_index]
+        if step_command in self._errors:
+            error, parameters = self._errors.pop(step_command)
+            if is_program:
+                # the remaining amount is always sent before the step
+                remaining = parameters[0] if len(parameters) > 0 else 0
+                parameters = (remaining, self._step_index)
+            result = " ".join(str(item) for item in
+                              ("ERROR", self._current_command, error, *parameters))
+            self._current_command = None
+            return result
+        self._step_index += 1
+        if self._step_index < len(self._steps):
+            return f"STATUS {self._current_command} {self._step_index}"
         result = f"DONE {self._current_command}"
         self._current_command = None
         return result
 
     def _handle_GET_command(self):
-        if self.time_since_last_command_sent < self.duration_GET:
-            time.sleep(self.duration_GET - self.time_since_last_command_sent)
+        if self.time_since_last_command_sent < self.duration_GET + self.latency:
+            self._clock.sleep(self.duration_GET + self.latency - self.time_since_last_command_sent)
         result = self._getter_results[self._current_command] \
                     if self._current_command in self._getter_results \
                     else 0
@@ -107,8 +163,8 @@ class MaiboardConnectionMockup(MainboardConnection):
         return result
 
     def _handle_SET_command(self):
-        if self.time_since_last_command_sent < self.duration_SET:
-            time.sleep(self.duration_SET - self.time_since_last_command_sent)
+        if self.time_since_last_command_sent < self.duration_SET + self.latency:
+            self._clock.sleep(self.duration_SET + self.latency - self.time_since_last_command_sent)
         result = f"ACK {self._current_command}"
         self._current_command = None
         return result
@@ -120,10 +176,40 @@ class MaiboardConnectionMockup(MainboardConnection):
     def send(self, line:str):
         self._last_line_sent = line
         line_items = line.split(" ")
-        self._current_command = line_items[0]
-        self._last_received_time = time.time()
-        assert self._current_command in self.commands
-        self._command_history.append(self._current_command)
-        self._current_command_type, expected_parameter_count = self.commands[self._current_command]
-        assert len(line_items) == expected_parameter_count + 1
+        command = line_items[0]
+        assert command in self.commands or command in self.variable_commands
+        self._command_history.append(command)
+        if command in self.commands:
+            _, expected_parameter_count = self.commands[command]
+            assert len(line_items) == expected_parameter_count + 1
+        # the answer is delayed relative to the time the command was sent
+        with self._condition:
+            if self._current_command is None:
+                self._start_command(command, line_items[1:], self._clock.time())
+            else:
+                self._pending_commands.append((command, line_items[1:], self._clock.time()))
+            self._condition.notify_all()
+
+    def _start_command(self, command: str, parameters: List[str], received_time: float):
+        self._current_command = command
+        self._last_received_time = received_time
+        if command in self.variable_commands:
+            self._current_command_type = self.variable_commands[command]
+        else:
+            self._current_command_type, _ = self.commands[command]
         self._was_ack_sent = False
+        self._step_index = 0
+        if command == "Program":
+            self._steps = [_PROGRAM_STEP_COMMANDS[token[0]] for token in parameters]
+        else:
+            self._steps = [command]
+
+# commands that are executed for the steps of a program, see barbot.program.StepType
+_PROGRAM_STEP_COMMANDS = {
+    "D": "Draft",
+    "S": "Sugar",
+    "M": "Mix",
+    "C": "Crush",
+    "P": "Move",
+    "T": "Straw",
+}
@@ -0,0 +1,255 @@
+"""Queue of the drinks that were ordered, so guests can order while the barbot is busy"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+import logging
+import os
+import threading
+import yaml
+from .clock import Clock
+from .config import data_directory
+from .recipes import Recipe, load_recipe_from_yaml
+
+# estimated duration of a drink in seconds, until the first drink was mixed
+DEFAULT_DRINK_DURATION = 90
+# number of mixed drinks the estimated duration is averaged over
+DURATION_HISTORY_LENGTH = 10
+# time span in seconds the drinks per hour are measured over
+RATE_WINDOW = 3600
+
+@dataclass
+class Order:
+    """A drink that waits to be mixed"""
+    recipe: Recipe
+    add_straw: bool = False
+    add_ice: bool = False
+    # unique within the queue, used to cancel or move the order
+    order_id: int = 0
+    # time the order was placed in seconds of the clock of the queue
+    order_time: float = 0
+
+    def to_dict(self) -> dict:
+        """Get the data that is saved for this order"""
+        return {
+            "order_id": self.order_id,
+            "recipe_name": self.recipe.name,
+            "recipe": self.recipe.to_yaml(),
+            "add_straw": self.add_straw,
+            "add_ice": self.add_ice,
+        }
+
+@dataclass
+class OrderMetrics:
+    """Snapshot of the metrics of the order queue"""
+    # number of orders waiting in the queue
+    queued: int = 0
+    # number of drinks that were mixed completely
+    drinks_mixed: int = 0
+    # drinks mixed within the last hour, extrapolated if the first drink is less than an hour ago
+    drinks_per_hour: float = 0
+    # average time from starting to finishing the last drinks in seconds, None if none was mixed yet
+    average_drink_duration: float = None
+    # average time an order waited in the queue in seconds, None if none was started yet
+    average_waiting_time: float = None
+
+class OrderQueue:
+    """First in first out queue of the ordered drinks.
+    The queue is saved on every change, so the orders are still there after a restart.
+    It also measures how long drinks take, to estimate when an order will be ready.
+    :param filepath: File the queue is saved to
+    :param clock: Clock used to measure the drinks
+    """
+    def __init__(self, filepath: str = os.path.join(data_directory, "queue.yaml"),
+                 clock: Clock = None):
+        self._filepath = filepath
+        self._clock = clock if clock is not None else Clock()
+        self._orders: List[Order] = []
+        self._next_id = 1
+        # the queue is changed by the gui and read by the state machine
+        self._lock = threading.RLock()
+        self._drink_start_time: float = None
+        self._first_drink_start_time: float = None
+        self._durations: List[float] = []
+        self._finish_times: List[float] = []
+        self._drinks_mixed = 0
+        self._waiting_time_sum = 0
+        self._orders_started = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    @property
+    def orders(self) -> List[Order]:
+        """Get a copy of the orders, the next one first"""
+        with self._lock:
+            return list(self._orders)
+
+    def enqueue(self, recipe: Recipe, add_straw: bool = False, add_ice: bool = False) -> Order:
+        """Add an order to the end of the queue.
+        :returns: The new order
+        """
+        with self._lock:
+            order = Order(recipe, add_straw, add_ice, self._next_id, self._clock.time())
+            self._next_id += 1
+            self._orders.append(order)
+            self.save()
+        logging.info("Order %i queued: %s", order.order_id, recipe.name)
+        return order
+
+    def cancel(self, order_id: int) -> bool:
+        """Remove an order from the queue.
+        :returns: False if the order is not in the queue (anymore)
+        """
+        with self._lock:
+            index = self._index_of(order_id)
+            if index is None:
+                return False
+            self._orders.pop(index)
+            self.save()
+        logging.info("Order %i canceled", order_id)
+        return True
+
+    def move(self, order_id: int, position: int) -> bool:
+        """Move an order to another position in the queue.
+        :param position: New index of the order, it is limited to the length of the queue
+        :returns: False if the order is not in the queue (anymore)
+        """
+        with self._lock:
+            index = self._index_of(order_id)
+            if index is None:
+                return False
+            position = max(0, min(position, len(self._orders) - 1))
+            self._orders.insert(position, self._orders.pop(index))
+            self.save()
+        return True
+
+    def pop(self) -> Optional[Order]:
+        """Remove the next order from the queue.
+        :returns: The order, None if the queue is empty
+        """
+        with self._lock:
+            if len(self._orders) == 0:
+                return None
+            order = self._orders.pop(0)
+            self._orders_started += 1
+            self._waiting_time_sum += self._clock.time() - order.order_time
+            self.save()
+        return order
+
+    def clear(self):
+        """Remove all orders"""
+        with self._lock:
+            self._orders = []
+            self.save()
+
+    def _index_of(self, order_id: int) -> Optional[int]:
+        for index, order in enumerate(self._orders):
+            if order.order_id == order_id:
+                return index
+        return None
+
+    def save(self) -> bool:
+        """Save the queue.
+        :return: True if saving was successfull, False otherwise
+        """
+        data = yaml.dump([order.to_dict() for order in self._orders], None)
+        try:
+            # write to a temporary file first, so a crash never leaves half a queue
+            temporary_path = self._filepath + ".tmp"
+            with open(temporary_path, 'w', encoding="utf-8") as file:
+                file.write(data)
+            os.replace(temporary_path, self._filepath)
+        except OSError as ex:
+            logging.warning("Error in order queue save: %s", ex)
+            return False
+        return True
+
+    def load(self):
+        """Load the saved queue, orders with unknown ingredients are dropped"""
+        if not os.path.exists(self._filepath):
+            return
+        try:
+            with open(self._filepath, 'r', encoding="utf-8") as file:
+                data = yaml.safe_load(file.read()) or []
+            orders = []
+            for item in data:
+                recipe = load_recipe_from_yaml(item["recipe"], item["recipe_name"])
+                if recipe is None:
+                    logging.warning("Dropped order of unknown recipe '%s'", item["recipe_name"])
+                    continue
+                orders.append(Order(recipe, item["add_straw"], item["add_ice"],
+                                    item["order_id"], self._clock.time()))
+        except (OSError, yaml.YAMLError, KeyError, TypeError) as ex:
+            logging.warning("Error in order queue load: %s", ex)
+            return
+        with self._lock:
+            self._orders = orders
+            self._next_id = max([self._next_id] + [order.order_id + 1 for order in orders])
+
+    def drink_started(self):
+        """Start measuring a drink, a drink that is resumed keeps its start time"""
+        if self._drink_start_time is None:
+            self._drink_start_time = self._clock.time()
+            if self._first_drink_start_time is None:
+                self._first_drink_start_time = self._drink_start_time
+
+    def drink_finished(self, was_mixed: bool):
+        """Stop measuring the current drink.
+        :param was_mixed: Whether the drink was mixed completely, only those are measured
+        """
+        if self._drink_start_time is None:
+            return
+        now = self._clock.time()
+        if was_mixed:
+            self._drinks_mixed += 1
+            self._durations = self._durations[-(DURATION_HISTORY_LENGTH - 1):] \
+                + [now - self._drink_start_time]
+            self._finish_times.append(now)
+        self._drink_start_time = None
+
+    @property
+    def estimated_drink_duration(self) -> float:
+        """Average duration of the last drinks in seconds"""
+        if len(self._durations) == 0:
+            return DEFAULT_DRINK_DURATION
+        return sum(self._durations) / len(self._durations)
+
+    def etas(self, duration_of: Callable[[Order], float] = None,
+             current_remaining: float = None) -> List[Tuple[Order, float]]:
+        """Estimate when the queued orders will be ready.
+        :param duration_of: Predicts the duration of an order in seconds,
+        None to use the average duration of the last drinks
+        :param current_remaining: Predicted seconds until the current drink is ready,
+        None to estimate it from the average duration
+        :returns: The orders with the time in seconds until they are ready
+        """
+        duration = self.estimated_drink_duration
+        eta = 0
+        if current_remaining is not None:
+            eta = current_remaining
+        elif self._drink_start_time is not None:
+            eta = max(0, duration - (self._clock.time() - self._drink_start_time))
+        result = []
+        for order in self.orders:
+            eta += duration_of(order) if duration_of is not None else duration
+            result.append((order, eta))
+        return result
+
+    @property
+    def metrics(self) -> OrderMetrics:
+        """Get a snapshot of the current metrics"""
+        now = self._clock.time()
+        self._finish_times = [t for t in self._finish_times if now - t <= RATE_WINDOW]
+        drinks_per_hour = 0
+        if self._first_drink_start_time is not None:
+            span = min(RATE_WINDOW, now - self._first_drink_start_time)
+            if span > 0:
+                drinks_per_hour = len(self._finish_times) * 3600 / span
+        return OrderMetrics(
+            queued=len(self._orders),
+            drinks_mixed=self._drinks_mixed,
+            drinks_per_hour=drinks_per_hour,
+            average_drink_duration=sum(self._durations) / len(self._durations)
+                if len(self._durations) > 0 else None,
+            average_waiting_time=self._waiting_time_sum / self._orders_started
+                if self._orders_started > 0 else None
+        )
@@ -0,0 +1,95 @@
+"""Overshoot of the drafts, the liquid in the hose still runs into the glas after the pump stopped"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import statistics
+from .config import data_directory
+from .persistence import YamlModel
+
+# number of drafts the overshoot of a port is averaged over
+OVERSHOOT_HISTORY_LENGTH = 10
+# number of drafts the accuracy of a port is measured over
+ACCURACY_HISTORY_LENGTH = 50
+# drafts that overshoot more than this fraction of their weight are not learned,
+# e.g. because someone touched the glas
+MAX_OVERSHOOT_RATIO = 0.5
+
+@dataclass
+class DraftAccuracy:
+    """How exact the drafts of a port are"""
+    drafts: int
+    # learned overshoot that is subtracted from the target weight in g
+    overshoot: float
+    # average of the drafted weight minus the weight of the recipe in g
+    mean_error: float
+    mean_absolute_error: float
+
+class OvershootModel(YamlModel):
+    """Learns the typical overshoot of each port from the weight after the drafts,
+    so the target weight can be reduced by it.
+    :param load_on_init: Load the saved model
+    :param directory: Directory the model is saved in
+    """
+    def __init__(self, load_on_init: bool = True, directory: str = data_directory):
+        super().__init__(directory, 'overshoot.yaml')
+        self._overshoots: Dict[int, List[float]] = {}
+        self._errors: Dict[int, List[float]] = {}
+        if load_on_init:
+            self.load()
+
+    def overshoot(self, port: int) -> float:
+        """Get the typical overshoot of a port in g, 0 if nothing was drafted yet"""
+        with self._lock:
+            overshoots = self._overshoots.get(port)
+            return max(0, statistics.median(overshoots)) if overshoots else 0
+
+    def target_weight(self, port: int, weight: int) -> int:
+        """Get the weight the mainboard should draft, so the glas gets the given weight"""
+        if weight <= 0:
+            return weight
+        return max(1, round(weight - self.overshoot(port)))
+
+    def add_draft(self, port: int, weight: float, target_weight: float, drafted: float):
+        """Add a finished draft to the model.
+        :param weight: Weight that should be drafted in g
+        :param target_weight: Weight that was sent to the mainboard, see target_weight()
+        :param drafted: Weight that was measured after the draft
+        """
+        overshoot = drafted - target_weight
+        if abs(overshoot) > MAX_OVERSHOOT_RATIO * max(weight, 1):
+            return
+        with self._lock:
+            self._overshoots[port] = \
+                (self._overshoots.get(port, []) + [overshoot])[-OVERSHOOT_HISTORY_LENGTH:]
+            self._errors[port] = \
+                (self._errors.get(port, []) + [drafted - weight])[-ACCURACY_HISTORY_LENGTH:]
+
+    def accuracy(self, port: int) -> Optional[DraftAccuracy]:
+        """Get the accuracy of the last drafts of a port, None if nothing was drafted yet"""
+        with self._lock:
+            errors = self._errors.get(port)
+            if not errors:
+                return None
+        return DraftAccuracy(
+            drafts=len(errors),
+            overshoot=self.overshoot(port),
+            mean_error=statistics.mean(errors),
+            mean_absolute_error=statistics.mean(abs(error) for error in errors)
+        )
+
+    @property
+    def ports(self) -> List[int]:
+        """Get the ports that were measured"""
+        with self._lock:
+            return sorted(self._errors.keys())
+
+    def _to_data(self):
+        return {"overshoots": dict(self._overshoots), "errors": dict(self._errors)}
+
+    def _from_data(self, data):
+        data = data or {}
+        overshoots = {int(port): [float(value) for value in values]
+                      for port, values in data.get("overshoots", {}).items()}
+        errors = {int(port): [float(value) for value in values]
+                  for port, values in data.get("errors", {}).items()}
+        self._overshoots = overshoots
+        self._errors = errors
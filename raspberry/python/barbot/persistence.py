@@ -0,0 +1,61 @@
+"""Models the barbot learns while it is used, they are saved as yaml files in the data directory"""
+from abc import ABC, abstractmethod
+from io import TextIOWrapper
+from typing import Any
+import os
+import threading
+import yaml
+
+class YamlModel(ABC):
+    """Base class of the models that are saved as a whole in a yaml file.
+    The state machine changes the models while the gui reads them,
+    so the subclasses guard their data with the lock.
+    :param directory: Directory of the file
+    :param filename: Name of the file
+    """
+    def __init__(self, directory: str, filename: str):
+        self._filepath = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _to_data(self) -> Any:
+        """Get the data that is saved, called with the lock held"""
+
+    @abstractmethod
+    def _from_data(self, data: Any):
+        """Restore the model from the loaded data, called with the lock held.
+        :param data: The loaded data, None if the file is empty
+        :raises ValueError, TypeError, AttributeError: If the data is invalid
+        """
+
+    def save(self, output_stream: TextIOWrapper = None) -> bool:
+        """Save the model to its file or the given stream
+        :return: True if saving was successfull, False otherwise
+        """
+        with self._lock:
+            yaml_data = yaml.dump(self._to_data(), None, default_flow_style=False)
+        try:
+            if output_stream is not None:
+                output_stream.write(yaml_data)
+            else:
+                with open(self._filepath, 'w', encoding="utf-8") as file:
+                    file.write(yaml_data)
+        except OSError:
+            return False
+        return True
+
+    def load(self, input_stream: TextIOWrapper = None) -> bool:
+        """Load the model from its file or the given stream
+        :return: True if loading was successfull, False otherwise
+        """
+        try:
+            if input_stream is not None:
+                data = yaml.safe_load(input_stream)
+            else:
+                with open(self._filepath, 'r', encoding="utf-8") as file:
+                    data = yaml.safe_load(file)
+            with self._lock:
+                self._from_data(data)
+        except (OSError, yaml.YAMLError, ValueError, AttributeError, TypeError):
+            return False
+        return True
@@ -0,0 +1,184 @@
+"""Plan the order the ingredients of a drink are drafted in,
+so the platform travels as little as possible"""
+from typing import Collection, Dict, List, Optional, Sequence
+import math
+from .config import BarBotConfig, Ingredient, IngredientType, PortConfiguration
+from .recipes import RecipeItem
+
+# must match 'Configuration.h' of the mainboard, positions are in mm
+PUMP_DISTANCE = 50
+FIRST_PUMP_POSITION = 68
+MIXING_POSITION = 683
+CRUSHER_POSITION = 803
+SUGAR_POSITION = -97
+# the platform starts at and returns to this position
+HOME_POSITION = 0
+# the number of orders grows with the factorial of the items, so longer sections keep their order
+MAX_PLANNED_ITEMS = 10
+
+def port_position(port: int) -> float:
+    """Get the position of the platform in mm to draft from the given port"""
+    return FIRST_PUMP_POSITION + PUMP_DISTANCE * port
+
+class MotionModel:
+    """Time the platform needs to move, it accelerates with the maximum acceleration
+    up to the maximum speed and brakes the same way, like the stepper of the mainboard.
+    :param max_speed: Maximum speed in mm/s
+    :param max_accel: Maximum acceleration in mm/s^2
+    """
+    def __init__(self, max_speed: float, max_accel: float):
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+
+    @classmethod
+    def from_config(cls, config: BarBotConfig) -> "MotionModel":
+        """Get the model for the speed and acceleration set in the config"""
+        return cls(config.max_speed, config.max_accel)
+
+    def move_time(self, start: float, target: float) -> float:
+        """Get the time in seconds to move from start to target"""
+        distance = abs(target - start)
+        # distance needed to accelerate to the maximum speed and brake again
+        ramp_distance = self.max_speed ** 2 / self.max_accel
+        if distance < ramp_distance:
+            # the maximum speed is never reached
+            return 2 * math.sqrt(distance / self.max_accel)
+        return distance / self.max_speed + self.max_speed / self.max_accel
+
+def choose_port(ports: PortConfiguration, ingredient: Ingredient, position: float,
+                empty_ports: Collection[int] = (),
+                port_levels: Dict[int, float] = None) -> Optional[int]:
+    """Choose the port to draft an ingredient from, if it is connected to several ports.
+    Ports that are known to be empty are avoided. If the fill levels are known,
+    the fullest port is used to balance the bottles, otherwise the one nearest to the platform.
+    :param position: Position of the platform before the draft in mm
+    :returns: The port, None if the ingredient is not connected
+    """
+    candidates = ports.ports_of_ingredient(ingredient)
+    if len(candidates) == 0:
+        return None
+    candidates = [port for port in candidates if port not in empty_ports] or candidates
+    def distance(port: int) -> float:
+        return abs(port_position(port) - position)
+    if port_levels is not None and all(port in port_levels for port in candidates):
+        return max(candidates, key=lambda port: (port_levels.get(port, 0), -distance(port)))
+    return min(candidates, key=distance)
+
+def item_position(item: RecipeItem, ports: PortConfiguration,
+                  position: float = HOME_POSITION) -> Optional[float]:
+    """Get the position the platform moves to for the item.
+    The port of an ingredient that is connected to several ports is chosen by choose_port().
+    :param position: Position of the platform before the item in mm
+    :returns: The position in mm, None if the ingredient is not connected
+    """
+    if item.ingredient.type == IngredientType.STIRR:
+        return MIXING_POSITION
+    if item.ingredient.type == IngredientType.SUGAR:
+        return SUGAR_POSITION
+    port = choose_port(ports, item.ingredient, position)
+    return port_position(port) if port is not None else None
+
+def _is_barrier(item: RecipeItem) -> bool:
+    """Whether the item must stay in place, only pumped ingredients can be reordered"""
+    return item.ingredient.type in [IngredientType.STIRR, IngredientType.SUGAR]
+
+def travel_time(items: Sequence[RecipeItem], ports: PortConfiguration, motion: MotionModel,
+                add_ice: bool = False) -> float:
+    """Get the time in seconds the platform moves while the items are added,
+    including adding ice and moving back to the start.
+    """
+    total = 0
+    current = HOME_POSITION
+    for item in items:
+        position = item_position(item, ports, current)
+        if position is None:
+            continue
+        total += motion.move_time(current, position)
+        current = position
+    if add_ice:
+        total += motion.move_time(current, CRUSHER_POSITION)
+        current = CRUSHER_POSITION
+    return total + motion.move_time(current, HOME_POSITION)
+
+def plan_items(items: Sequence[RecipeItem], ports: PortConfiguration, config: BarBotConfig,
+               add_ice: bool = False) -> List[RecipeItem]:
+    """Reorder the pumped items between stirring and sugar, which stay in place,
+    so the platform travels the shortest time. The order is only changed if it is faster.
+    :param items: The recipe items in the order of the recipe
+    :param ports: Port configuration used to look up the positions of the ingredients
+    :param config: Config with the speed and acceleration of the platform
+    :param add_ice: Whether ice is added after all items
+    :returns: The items in the planned order
+    """
+    motion = MotionModel.from_config(config)
+    planned: List[RecipeItem] = []
+    section: List[RecipeItem] = []
+    current = HOME_POSITION
+    for item in list(items) + [None]:
+        if item is not None and not _is_barrier(item):
+            section.append(item)
+            continue
+        # the section ends where the platform has to go next
+        if item is not None:
+            target = item_position(item, ports, current)
+        else:
+            target = CRUSHER_POSITION if add_ice else HOME_POSITION
+        planned += _plan_section(section, ports, motion, current, target)
+        section = []
+        if item is not None:
+            planned.append(item)
+            current = target
+    return planned
+
+def _plan_section(section: List[RecipeItem], ports: PortConfiguration, motion: MotionModel,
+                  start: float, target: float) -> List[RecipeItem]:
+    """Find the fastest order of the items from start to target with dynamic programming
+    over the subsets of visited items (Held-Karp)"""
+    # the ports of an ingredient with several ports are chosen from the start of the section
+    positions = [item_position(item, ports, start) for item in section]
+    count = len(section)
+    if count < 2 or count > MAX_PLANNED_ITEMS or None in positions:
+        return section
+    # best[mask][last]: time to visit the items in mask, ending at last
+    best = [[math.inf] * count for _ in range(1 << count)]
+    previous = [[-1] * count for _ in range(1 << count)]
+    for index in range(count):
+        best[1 << index][index] = motion.move_time(start, positions[index])
+    for mask in range(1, 1 << count):
+        for last in range(count):
+            time = best[mask][last]
+            if time == math.inf:
+                continue
+            for following in range(count):
+                if mask & (1 << following):
+                    continue
+                next_mask = mask | (1 << following)
+                next_time = time + motion.move_time(positions[last], positions[following])
+                if next_time < best[next_mask][following]:
+                    best[next_mask][following] = next_time
+                    previous[next_mask][following] = last
+    full = (1 << count) - 1
+    last = min(range(count),
+               key=lambda index: best[full][index] + motion.move_time(positions[index], target))
+    planned_time = best[full][last] + motion.move_time(positions[last], target)
+    # walk back from the last item
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last)
+        last, mask = previous[mask][last], mask & ~(1 << last)
+    order.reverse()
+    # keep the order of the recipe unless planning is faster
+    original_time = _section_time(positions, motion, start, target)
+    if planned_time >= original_time - 1e-9:
+        return section
+    return [section[index] for index in order]
+
+def _section_time(positions: List[float], motion: MotionModel, start: float,
+                  target: float) -> float:
+    total = 0
+    current = start
+    for position in positions + [target]:
+        total += motion.move_time(current, position)
+        current = position
+    return total
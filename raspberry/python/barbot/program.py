@@ -0,0 +1,363 @@
+"""Compile the mixing options of a drink into a program for the mainboard and execute it"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+import logging
+from .communication import Mainboard, CommunicationResult, ErrorType
+from .config import BarBotConfig, IngredientType, PortConfiguration
+from .overshoot import OvershootModel
+from .planner import CRUSHER_POSITION, HOME_POSITION, MIXING_POSITION, SUGAR_POSITION
+from .planner import choose_port, port_position
+from .recipes import RecipeItem
+
+class StepType(Enum):
+    """Type of a program step, the value is the token used in the encoded program"""
+    DRAFT = "D"
+    SUGAR = "S"
+    STIR = "M"
+    CRUSH = "C"
+    MOVE = "P"
+    STRAW = "T"
+
+@dataclass(frozen=True)
+class ProgramStep:
+    """Single step of a mixing program"""
+    type: StepType
+    # weight in g for draft, sugar and crush, seconds for stir, position for move
+    amount: int = 0
+    port: int = None
+    pump_power: int = None
+    # recipe item the step was compiled from, None for ice, straw and moves
+    item: RecipeItem = None
+
+    @property
+    def counts_as_progress(self) -> bool:
+        """Whether finishing the step is shown as progress to the user"""
+        return self.type != StepType.MOVE
+
+    @property
+    def is_weighed(self) -> bool:
+        """Whether the amount is a weight that is added to the glas"""
+        return self.type in [StepType.DRAFT, StepType.SUGAR, StepType.CRUSH]
+
+    def encode(self) -> str:
+        """Get the compact token of the step, e.g. 'D3:40:255' for drafting 40 g at port 3"""
+        if self.type == StepType.DRAFT:
+            return f"{self.type.value}{self.port}:{self.amount}:{self.pump_power}"
+        if self.type == StepType.STRAW:
+            return self.type.value
+        return f"{self.type.value}{self.amount}"
+
+@dataclass
+class MixingProgram:
+    """Ordered list of steps that add everything to a drink"""
+    steps: List[ProgramStep]
+
+    def encode(self, start_step: int = 0, start_amount: int = None) -> Tuple[str, ...]:
+        """Get the tokens of the steps beginning at the given step.
+        :param start_step: Index of the first step to encode
+        :param start_amount: Amount of the first step, e.g. the remaining weight after an error
+        """
+        steps = self.steps[start_step:]
+        if start_amount is not None and len(steps) > 0:
+            steps = [replace(steps[0], amount=start_amount)] + steps[1:]
+        return tuple(step.encode() for step in steps)
+
+    def progress_before(self, step_index: int) -> int:
+        """Get the number of progress steps that are finished before the given step"""
+        return sum(1 for step in self.steps[:step_index] if step.counts_as_progress)
+
+    def with_step(self, step_index: int, step: ProgramStep) -> "MixingProgram":
+        """Get a copy of the program with the step at the given index replaced"""
+        steps = list(self.steps)
+        steps[step_index] = step
+        return MixingProgram(steps)
+
+    def drafted(self, start_step: int, start_amount: Optional[int],
+                result: "ProgramResult") -> List[Tuple[int, int]]:
+        """Get what was drafted from the ports by an execution of the program.
+        :param start_step: Index of the first step that was executed
+        :param start_amount: Amount of the first step, None for the whole step
+        :param result: The result of the execution
+        :returns: The port and the weight in g for each draft step
+        """
+        drafted = []
+        for step_index in range(start_step, min(result.step_index + 1, len(self.steps))):
+            step = self.steps[step_index]
+            if step.type != StepType.DRAFT:
+                continue
+            amount = start_amount if step_index == start_step and start_amount is not None \
+                else step.amount
+            if step_index == result.step_index:
+                if result.was_successfull or result.remaining is None:
+                    continue
+                amount -= result.remaining
+            if amount > 0:
+                drafted.append((step.port, amount))
+        return drafted
+
+    def position_before(self, step_index: int) -> float:
+        """Get the position of the platform in mm when the given step starts"""
+        position = HOME_POSITION
+        for step in self.steps[:step_index]:
+            position = _step_position(step, position)
+        return position
+
+    def weight_before(self, step_index: int) -> int:
+        """Get the weight in g that is added to the glas by the steps before the given step"""
+        return sum(step.amount for step in self.steps[:step_index] if step.is_weighed)
+
+    def __len__(self):
+        return len(self.steps)
+
+def compile_mixing(items: List[RecipeItem], ports: PortConfiguration, config: BarBotConfig,
+                   add_ice: bool = False, add_straw: bool = False,
+                   empty_ports: Collection[int] = (),
+                   port_levels: Dict[int, float] = None) -> MixingProgram:
+    """Compile the items of a recipe and the mixing options into a program.
+    If an ingredient is connected to several ports, see choose_port().
+    :param items: The recipe items in the order they are added
+    :param ports: Port configuration used to look up the ports of the ingredients
+    :param config: Config with the pump powers, stirring time, sugar and ice amount
+    :param add_ice: Add ice after all items
+    :param add_straw: Add a straw at the start position after everything else
+    :param empty_ports: Ports that are known to be empty, they are only used if there is no other
+    :param port_levels: Fill level of the ports in g, None if unknown
+    """
+    steps = []
+    position = HOME_POSITION
+    for item in items:
+        step = _compile_item(item, ports, config, position, empty_ports, port_levels)
+        steps.append(step)
+        position = _step_position(step, position)
+    if add_ice:
+        steps.append(ProgramStep(StepType.CRUSH, config.ice_amount))
+    # move to start
+    steps.append(ProgramStep(StepType.MOVE, 0))
+    if add_straw:
+        steps.append(ProgramStep(StepType.STRAW))
+    return MixingProgram(steps)
+
+def _step_position(step: ProgramStep, position: float) -> float:
+    """Get the position of the platform after the step"""
+    if step.type == StepType.DRAFT and step.port is not None:
+        return port_position(step.port)
+    return {
+        StepType.STIR: MIXING_POSITION,
+        StepType.SUGAR: SUGAR_POSITION,
+        StepType.CRUSH: CRUSHER_POSITION,
+    }.get(step.type, position)
+
+def _compile_item(item: RecipeItem, ports: PortConfiguration, config: BarBotConfig,
+                  position: float = HOME_POSITION, empty_ports: Collection[int] = (),
+                  port_levels: Dict[int, float] = None) -> ProgramStep:
+    if item.ingredient.type == IngredientType.STIRR:
+        return ProgramStep(StepType.STIR, int(config.stirring_time / 1000), item=item)
+    if item.ingredient.type == IngredientType.SUGAR:
+        # take sugar per unit from config
+        return ProgramStep(StepType.SUGAR, int(item.amount * config.sugar_per_unit), item=item)
+    # cl to g
+    weight = int(item.amount * item.ingredient.density * 10)
+    pump_power = config.pump_power_sirup \
+        if item.ingredient.type == IngredientType.SIRUP \
+        else config.pump_power
+    port = choose_port(ports, item.ingredient, position, empty_ports, port_levels)
+    return ProgramStep(StepType.DRAFT, weight, port, pump_power, item)
+
+class ProgramResult:
+    """Result of the execution of a mixing program"""
+    def __init__(self, error: ErrorType = ErrorType.NONE, step_index: int = 0,
+                 remaining: int = None):
+        self.error = error
+        # index of the step that failed, the length of the program if all steps finished
+        self.step_index = step_index
+        # amount that is still missing of the failed step, None if unknown
+        self.remaining = remaining
+
+    @property
+    def was_successfull(self):
+        """Get whether an error code was set"""
+        return self.error == ErrorType.NONE
+
+class ProgramExecutor(ABC):
+    """Executes mixing programs on the mainboard.
+    :param mainboard: The mainboard to send the commands to
+    :param on_step_started: Called with the index of each step when it starts
+    :param is_aborted: Called before each step, execution stops if it returns True
+    :param overshoot: Model used to reduce the target weights of the drafts, None to draft as is
+    :param on_step_finished: Called with the index of each step that was done and the time
+    in seconds the mainboard executed it, from its acknowledgement until it was done
+    """
+    def __init__(self, mainboard: Mainboard, on_step_started: Callable[[int], None] = None,
+                 is_aborted: Callable[[], bool] = None, overshoot: OvershootModel = None,
+                 on_step_finished: Callable[[int, float], None] = None):
+        self._mainboard = mainboard
+        self._on_step_started = on_step_started
+        self._is_aborted = is_aborted
+        self._overshoot = overshoot
+        self._on_step_finished = on_step_finished
+
+    @abstractmethod
+    def execute(self, program: MixingProgram, start_step: int = 0,
+                start_amount: int = None) -> ProgramResult:
+        """Execute the program beginning at the given step.
+        :param program: The program to execute
+        :param start_step: Index of the first step, used to resume after an error
+        :param start_amount: Amount of the first step, e.g. the remaining weight after an error
+        """
+
+    def _step_started(self, step_index: int):
+        if self._on_step_started is not None:
+            self._on_step_started(step_index)
+
+    def _step_finished(self, step_index: int, duration: Optional[float]):
+        if self._on_step_finished is not None and duration is not None:
+            self._on_step_finished(step_index, duration)
+
+    def _aborted(self) -> bool:
+        return self._is_aborted is not None and self._is_aborted()
+
+    @staticmethod
+    def _remaining_amount(parameters: List[str]):
+        if len(parameters) > 0:
+            return int(parameters[0])
+        logging.warning("No remaining amount received")
+        return 0
+
+    def _remaining_of_step(self, result: CommunicationResult, step: ProgramStep,
+                           target_weight: int) -> Optional[int]:
+        """Get what is left of a draft after its ingredient ran empty.
+        The mainboard reports what is missing of the target weight it was sent. That is less
+        than the step if the overshoot is compensated, so the compensation is added back.
+        :returns: The remaining weight of the step in g, None if the ingredient did not run empty
+        """
+        if result.error != ErrorType.INGREDIENT_EMPTY:
+            return None
+        remaining = self._remaining_amount(result.return_parameters)
+        # the target weight was reached, the step is complete
+        if remaining < 1:
+            return 0
+        return remaining + step.amount - target_weight
+
+class StepwiseProgramExecutor(ProgramExecutor):
+    """Executes the program with one DO command per step.
+    This works with every firmware version.
+    The overshoot of the drafts is learned from the weight before and after each draft.
+    """
+    def execute(self, program: MixingProgram, start_step: int = 0,
+                start_amount: int = None) -> ProgramResult:
+        # weight on the balance after the previous draft, None if it is unknown
+        weight = None
+        for step_index in range(start_step, len(program.steps)):
+            if self._aborted():
+                return ProgramResult(ErrorType.NONE, step_index)
+            step = program.steps[step_index]
+            if step_index == start_step and start_amount is not None:
+                step = replace(step, amount=start_amount)
+            self._step_started(step_index)
+            if step.type == StepType.DRAFT and self._overshoot is not None:
+                target_weight = self._overshoot.target_weight(step.port, step.amount)
+                result, weight = self._execute_compensated_draft(step, target_weight, weight)
+            else:
+                target_weight = step.amount
+                result, weight = self._execute_step(step), None
+            if not result.was_successfull:
+                remaining = self._remaining_of_step(result, step, target_weight)
+                return ProgramResult(result.error, step_index, remaining)
+            self._step_finished(step_index, result.done_latency)
+        return ProgramResult(ErrorType.NONE, len(program.steps))
+
+    def _execute_compensated_draft(self, step: ProgramStep, target_weight: int,
+                                   weight_before: Optional[float]
+                                   ) -> Tuple[CommunicationResult, Optional[float]]:
+        """Draft less than the step by the learned overshoot and learn from the result.
+        :param target_weight: Weight sent to the mainboard, reduced by the overshoot
+        :param weight_before: Weight on the balance before the draft, None if it is unknown
+        :returns: The result and the weight after the draft
+        """
+        if weight_before is None:
+            weight_before = self._get_weight()
+        result = self._execute_step(replace(step, amount=target_weight))
+        if not result.was_successfull:
+            return result, None
+        weight_after = self._get_weight()
+        if weight_before is not None and weight_after is not None:
+            self._overshoot.add_draft(step.port, step.amount, target_weight,
+                                      weight_after - weight_before)
+        return result, weight_after
+
+    def _get_weight(self) -> Optional[float]:
+        result = self._mainboard.get("GetWeight")
+        if not result.was_successfull or len(result.return_parameters) == 0:
+            return None
+        return float(result.return_parameters[0])
+
+    def _execute_step(self, step: ProgramStep) -> CommunicationResult:
+        if step.type == StepType.DRAFT:
+            result = self._mainboard.set("SetPumpPower", step.pump_power)
+            if not result.was_successfull:
+                return result
+            return self._mainboard.do("Draft", step.port, step.amount)
+        if step.type == StepType.SUGAR:
+            return self._mainboard.do("Sugar", step.amount)
+        if step.type == StepType.STIR:
+            return self._mainboard.do("Mix", step.amount)
+        if step.type == StepType.CRUSH:
+            return self._mainboard.do("Crush", step.amount)
+        if step.type == StepType.MOVE:
+            return self._mainboard.do("Move", step.amount)
+        return self._mainboard.do("Straw")
+
+class UploadProgramExecutor(ProgramExecutor):
+    """Uploads the whole program with a single 'Program' DO command.
+    The mainboard reports the index of the current step with 'STATUS Program <step>'
+    and fails with 'ERROR Program <code> <remaining> <step>'.
+    The drafts are compensated by the overshoot, but it can not be learned while the program runs.
+    """
+    def execute(self, program: MixingProgram, start_step: int = 0,
+                start_amount: int = None) -> ProgramResult:
+        if self._aborted() or start_step >= len(program.steps):
+            return ProgramResult(ErrorType.NONE, start_step)
+        compensated = self._compensate(program, start_step, start_amount)
+        clock = self._mainboard.clock
+        current_step, step_start_time = start_step, clock.time()
+        self._step_started(current_step)
+        def on_status(parameters: Tuple[str, ...]):
+            nonlocal current_step, step_start_time
+            if len(parameters) == 0:
+                return
+            step_index = start_step + int(parameters[0])
+            if step_index != current_step:
+                # the mainboard runs the steps one after the other without waiting in between
+                self._step_finished(current_step, clock.time() - step_start_time)
+                current_step, step_start_time = step_index, clock.time()
+                self._step_started(current_step)
+        result = self._mainboard.do(
+            "Program", *compensated.encode(start_step), on_status=on_status
+        )
+        if result.was_successfull:
+            self._step_finished(current_step, clock.time() - step_start_time)
+            return ProgramResult(ErrorType.NONE, len(program.steps))
+        # the step is sent after the remaining amount
+        if len(result.return_parameters) > 1:
+            current_step = start_step + int(result.return_parameters[1])
+        step = program.steps[current_step]
+        if current_step == start_step and start_amount is not None:
+            step = replace(step, amount=start_amount)
+        remaining = self._remaining_of_step(result, step, compensated.steps[current_step].amount)
+        return ProgramResult(result.error, current_step, remaining)
+
+    def _compensate(self, program: MixingProgram, start_step: int, start_amount: Optional[int]
+                    ) -> MixingProgram:
+        """Get the program that is sent to the mainboard, beginning with the start amount.
+        The target weights of the drafts are reduced by the learned overshoot."""
+        steps = list(program.steps)
+        for step_index in range(start_step, len(steps)):
+            step = steps[step_index]
+            if step_index == start_step and start_amount is not None:
+                step = replace(step, amount=start_amount)
+            if step.type == StepType.DRAFT and self._overshoot is not None:
+                step = replace(step, amount=self._overshoot.target_weight(step.port, step.amount))
+            steps[step_index] = step
+        return MixingProgram(steps)
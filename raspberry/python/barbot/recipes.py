@@ -48,6 +48,8 @@ class Recipe:
         self.pre_instruction = ""
         self.post_instruction = ""
         self.is_fixed = False
+        # the items are added in the given order, e.g. for layered drinks
+        self.keep_order = False
 
     def save(self, folder: str = recipes_directory):
         """Save the recipe to the drive"""
@@ -72,6 +74,8 @@ class Recipe:
         data["created"] = self.created
         data["pre_instruction"] = self.pre_instruction
         data["post_instruction"] = self.post_instruction
+        if self.keep_order:
+            data["keep_order"] = True
         data["items"] = []
         for item in self.items:
             if item.ingredient is None:
@@ -90,7 +94,7 @@ class Recipe:
             :result: True if the two recipes are equal, False otherwise
         """
         # check string attributes
-        for attribute in ["name", "pre_instruction", "post_instruction"]:
+        for attribute in ["name", "pre_instruction", "post_instruction", "keep_order"]:
             if getattr(recipe, attribute) != getattr(self, attribute):
                 return False
         if len(recipe.items) != len(self.items):
@@ -128,6 +132,7 @@ class Recipe:
         recipe.name = self.name
         recipe.pre_instruction = self.pre_instruction
         recipe.post_instruction = self.post_instruction
+        recipe.keep_order = self.keep_order
         recipe.name = self.name
         for item in self.items:
             item_copy = RecipeItem(item.ingredient, item.amount)
@@ -147,6 +152,8 @@ def load_recipe_from_yaml(yaml_string : str, name : str) -> Recipe:
         r.pre_instruction = data["pre_instruction"]
     if "post_instruction" in data.keys():
         r.post_instruction = data["post_instruction"]
+    if "keep_order" in data.keys():
+        r.keep_order = data["keep_order"]
     r.items = []
     for item_data in data["items"]:
         # all errors are handled by the try catch
@@ -0,0 +1,149 @@
+"""Reconnecting to the mainboard after the connection was lost"""
+from dataclasses import dataclass
+from typing import Callable, Optional
+import logging
+import random
+import threading
+from .clock import Clock
+
+@dataclass
+class ReconnectMetrics:
+    """Snapshot of the metrics of the reconnect manager"""
+    # connection attempts that failed since the barbot was started
+    failed_attempts: int = 0
+    # number of times the connection was established again after it was lost
+    reconnects: int = 0
+    # number of discoveries that were started
+    discoveries: int = 0
+    # time between losing and reestablishing the connection in seconds, None if not reconnected yet
+    last_time_to_reconnect: float = None
+    longest_time_to_reconnect: float = None
+
+class ReconnectManager:
+    """Decides when and to which mainboard the barbot connects.
+    The last known mainboard is connected again right away. After each failed attempt,
+    the delay grows exponentially up to the maximum delay and a random jitter is added,
+    so several barbots do not retry at the same time.
+    Only after repeated failures the mainboard is discovered again,
+    which takes several seconds, so it runs in a background thread.
+    :param find_bar_bot: Discovers the mainboard, returns its identifier or None
+    :param min_delay: Delay in seconds after the first failed attempt
+    :param max_delay: Longest delay in seconds between two attempts
+    :param backoff_factor: Factor the delay grows by with each failed attempt
+    :param jitter: Fraction of the delay that is randomly added or removed
+    :param failures_before_discovery: Failed attempts before the mainboard is discovered again
+    :param clock: Clock used for the delays
+    :param random_generator: Source of the jitter, e.g. seeded for tests
+    """
+    def __init__(self, find_bar_bot: Callable[[], Optional[str]], min_delay: float = 0.1,
+                 max_delay: float = 5, backoff_factor: float = 2, jitter: float = 0.2,
+                 failures_before_discovery: int = 5, clock: Clock = None,
+                 random_generator: random.Random = None):
+        self._find_bar_bot = find_bar_bot
+        self._min_delay = min_delay
+        self._max_delay = max(min_delay, max_delay)
+        self._backoff_factor = backoff_factor
+        self._jitter = jitter
+        self._failures_before_discovery = failures_before_discovery
+        self._clock = clock if clock is not None else Clock()
+        self._random = random_generator if random_generator is not None else random.Random()
+        self._failures = 0
+        self._lost_time: float = None
+        self._wake_event = threading.Event()
+        self._discovery_thread: threading.Thread = None
+        self._discovery_done = threading.Event()
+        self._discovered_identifier: str = None
+        self._metrics = ReconnectMetrics()
+
+    @property
+    def metrics(self) -> ReconnectMetrics:
+        """Get a snapshot of the current metrics"""
+        return ReconnectMetrics(**vars(self._metrics))
+
+    @property
+    def delay(self) -> float:
+        """Delay in seconds before the next attempt, without jitter"""
+        if self._failures == 0:
+            return 0
+        return min(self._min_delay * self._backoff_factor ** (self._failures - 1), self._max_delay)
+
+    @property
+    def is_discovering(self) -> bool:
+        """Whether the mainboard is being discovered in the background"""
+        return self._discovery_thread is not None and self._discovery_thread.is_alive()
+
+    def connection_lost(self):
+        """Remember when the connection was lost, to measure the time to reconnect"""
+        if self._lost_time is None:
+            self._lost_time = self._clock.time()
+
+    def attempt_failed(self):
+        """Increase the delay and start discovering the mainboard after repeated failures"""
+        self._failures += 1
+        self._metrics.failed_attempts += 1
+        if self._failures >= self._failures_before_discovery:
+            self.start_discovery()
+
+    def connected(self):
+        """Reset the delay and measure the time it took to reconnect"""
+        self._failures = 0
+        if self._lost_time is None:
+            return
+        duration = self._clock.time() - self._lost_time
+        self._lost_time = None
+        self._metrics.reconnects += 1
+        self._metrics.last_time_to_reconnect = duration
+        if self._metrics.longest_time_to_reconnect is None \
+                or duration > self._metrics.longest_time_to_reconnect:
+            self._metrics.longest_time_to_reconnect = duration
+        logging.info("Reconnected after %.1f s", duration)
+
+    def wait(self):
+        """Wait until the next attempt is due or wake() was called"""
+        delay = self.delay
+        if delay > 0:
+            delay *= 1 + self._random.uniform(-self._jitter, self._jitter)
+            self._clock.wait_event(self._wake_event, delay)
+        self._wake_event.clear()
+
+    def wake(self):
+        """Stop waiting, e.g. to stop the barbot"""
+        self._wake_event.set()
+
+    def start_discovery(self):
+        """Discover the mainboard in a background thread, if it is not discovered already"""
+        if self.is_discovering:
+            return
+        self._metrics.discoveries += 1
+        self._discovery_done.clear()
+        self._discovery_thread = threading.Thread(
+            target=self._discover, name="MainboardDiscovery", daemon=True
+        )
+        self._discovery_thread.start()
+
+    def wait_for_discovery(self, timeout: float) -> bool:
+        """Wait until the discovery is done or the timeout in seconds passed.
+        :returns: True if the discovery is done
+        """
+        if not self.is_discovering:
+            return self._discovery_done.is_set()
+        return self._clock.wait_event(self._discovery_done, timeout)
+
+    def take_discovered_identifier(self) -> Optional[str]:
+        """Get the identifier of the discovered mainboard, only once.
+        :returns: The identifier, None if nothing was discovered since the last call
+        """
+        identifier = self._discovered_identifier
+        self._discovered_identifier = None
+        return identifier
+
+    def _discover(self):
+        try:
+            identifier = self._find_bar_bot()
+        except Exception: # pylint: disable=broad-except
+            logging.exception("Discovering the mainboard failed")
+            identifier = None
+        if identifier:
+            logging.info("Mainboard discovered: %s", identifier)
+            self._discovered_identifier = identifier
+        self._discovery_done.set()
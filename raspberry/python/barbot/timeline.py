@@ -0,0 +1,169 @@
+"""Predict how long a drink takes, from placing the glas until it can be taken"""
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional, Tuple
+import statistics
+from .config import BarBotConfig, PortConfiguration, GLASS_REMOVAL_DELAY, HANDS_OFF_DELAY
+from .flow import FlowRateModel
+from .planner import CRUSHER_POSITION, HOME_POSITION, MIXING_POSITION, SUGAR_POSITION
+from .planner import MotionModel, plan_items, port_position
+from .program import ProgramStep, StepType, compile_mixing
+
+if TYPE_CHECKING:
+    from . import MixingOptions
+
+# assumed time in seconds until the glas is placed, if it is not there when the drink starts
+PLACE_GLASS_TIME = 5
+# flow rate of a pump in g/s until it was learned
+DEFAULT_FLOW_RATE = 10
+# rates of the other dispensers in g/s
+ICE_RATE = 20
+SUGAR_RATE = 2
+STRAW_DURATION = 1
+# number of drinks the accuracy of the predictions is measured over
+ACCURACY_HISTORY_LENGTH = 50
+
+class Phase(Enum):
+    """What the barbot does during an entry of the timeline"""
+    GLASS_WAIT = "glass_wait"
+    MOVE = "move"
+    DRAFT = "draft"
+    STIR = "stir"
+    SUGAR = "sugar"
+    CRUSH = "crush"
+    STRAW = "straw"
+    REMOVAL = "removal"
+
+@dataclass
+class TimelineEntry:
+    """Single phase of a drink"""
+    phase: Phase
+    # seconds since the drink was started
+    start: float
+    duration: float
+    # index of the program step the entry belongs to, None for waiting
+    step_index: Optional[int] = None
+
+    @property
+    def end(self) -> float:
+        """Seconds since the drink was started when the entry ends"""
+        return self.start + self.duration
+
+@dataclass
+class Timeline:
+    """Predicted phases of a drink in the order they happen"""
+    entries: List[TimelineEntry] = field(default_factory=list)
+
+    @property
+    def total(self) -> float:
+        """Duration of the whole drink in seconds"""
+        return self.entries[-1].end if len(self.entries) > 0 else 0
+
+    def duration_of(self, phase: Phase) -> float:
+        """Get the summed up duration of all entries of a phase in seconds"""
+        return sum(entry.duration for entry in self.entries if entry.phase == phase)
+
+    def add(self, phase: Phase, duration: float, step_index: int = None):
+        """Append an entry, phases without duration are left out"""
+        if duration > 0:
+            self.entries.append(TimelineEntry(phase, self.total, duration, step_index))
+
+class TimelineSimulator:
+    """Simulates a drink with the same program the barbot would execute.
+    Drafts use the learned flow rates, moves the motion model of the platform.
+    :param config: Config with the speed of the platform, stirring time and ice amount
+    :param ports: The port configuration
+    :param flow_model: Learned flow rates of the ports, None to use the default rate
+    :param empty_ports: Ports that are known to be empty, see compile_mixing()
+    :param port_levels: Fill levels of the ports, see compile_mixing()
+    """
+    def __init__(self, config: BarBotConfig, ports: PortConfiguration,
+                 flow_model: FlowRateModel = None, empty_ports: Collection[int] = (),
+                 port_levels: Dict[int, float] = None):
+        self._config = config
+        self._ports = ports
+        self._flow_model = flow_model
+        self._empty_ports = empty_ports
+        self._port_levels = port_levels
+        self._motion = MotionModel.from_config(config)
+
+    def simulate(self, options: "MixingOptions", has_glass: bool = True) -> Timeline:
+        """Predict the timeline of a drink.
+        :param options: The recipe and whether ice and a straw are added
+        :param has_glass: Whether the glas is already placed when the drink starts
+        """
+        items = options.recipe.items
+        if self._config.minimize_travel and not options.recipe.keep_order:
+            items = plan_items(items, self._ports, self._config, options.add_ice)
+        program = compile_mixing(items, self._ports, self._config, options.add_ice,
+                                 options.add_straw, self._empty_ports, self._port_levels)
+        timeline = Timeline()
+        timeline.add(Phase.GLASS_WAIT, HANDS_OFF_DELAY + (0 if has_glass else PLACE_GLASS_TIME))
+        position = HOME_POSITION
+        for step_index, step in enumerate(program.steps):
+            target, phase, duration = self._step_target(step, position)
+            timeline.add(Phase.MOVE, self._motion.move_time(position, target), step_index)
+            timeline.add(phase, duration, step_index)
+            position = target
+        timeline.add(Phase.REMOVAL, GLASS_REMOVAL_DELAY)
+        return timeline
+
+    def _step_target(self, step: ProgramStep, position: float) -> Tuple[float, Phase, float]:
+        """Get where the step is executed, its phase and the duration without moving"""
+        if step.type == StepType.DRAFT:
+            if step.port is None:
+                return position, Phase.DRAFT, 0
+            return port_position(step.port), Phase.DRAFT, step.amount / self._flow_rate(step)
+        if step.type == StepType.STIR:
+            return MIXING_POSITION, Phase.STIR, step.amount
+        if step.type == StepType.SUGAR:
+            return SUGAR_POSITION, Phase.SUGAR, step.amount / SUGAR_RATE
+        if step.type == StepType.CRUSH:
+            return CRUSHER_POSITION, Phase.CRUSH, step.amount / ICE_RATE
+        if step.type == StepType.MOVE:
+            return step.amount, Phase.MOVE, 0
+        return position, Phase.STRAW, STRAW_DURATION
+
+    def _flow_rate(self, step: ProgramStep) -> float:
+        if self._flow_model is not None and step.item is not None:
+            rate = self._flow_model.rate(step.port, step.item.ingredient.type)
+            if rate is not None:
+                return rate
+        return DEFAULT_FLOW_RATE
+
+@dataclass
+class TimelineAccuracyReport:
+    """How exact the predicted durations of the last drinks were"""
+    drinks: int
+    # average of the measured minus the predicted duration in seconds
+    mean_error: float
+    mean_absolute_error: float
+    # average of the absolute error relative to the measured duration
+    mean_relative_error: float
+
+class TimelineAccuracy:
+    """Compares the predicted durations of drinks with the measured ones"""
+    def __init__(self):
+        # predicted and measured duration of each drink
+        self._records: List[Tuple[float, float]] = []
+
+    def add(self, predicted: float, measured: float):
+        """Add a drink that was mixed completely, durations in seconds"""
+        if measured <= 0:
+            return
+        self._records = (self._records + [(predicted, measured)])[-ACCURACY_HISTORY_LENGTH:]
+
+    @property
+    def report(self) -> Optional[TimelineAccuracyReport]:
+        """Get the accuracy of the last drinks, None if no drink was measured yet"""
+        records = self._records
+        if len(records) == 0:
+            return None
+        return TimelineAccuracyReport(
+            drinks=len(records),
+            mean_error=statistics.mean(measured - predicted for predicted, measured in records),
+            mean_absolute_error=statistics.mean(
+                abs(measured - predicted) for predicted, measured in records),
+            mean_relative_error=statistics.mean(
+                abs(measured - predicted) / measured for predicted, measured in records)
+        )
@@ -5,6 +5,7 @@ from barbot.communication import BoardType
 from barbot.config import version as barbot_version
 from barbot.recipes import Recipe
 from barbot.config import PORT_COUNT
+from barbot.layout import LayoutOptimizer, ordered_drinks
 from barbotgui.core import BarBotWindow, qt_icon_from_file_name, View, Ingredient
 from barbotgui.userviews import UserView
 
@@ -105,7 +106,11 @@ class Overview(AdminView):
 
         self._add_title_to_fixed_content("Übersicht")
         self._add_admin_navigation_by_items()
+        self._add_flow_alerts()
         self._add_board_list()
+        self._add_command_statistics()
+        self._add_draft_accuracy()
+        self._add_timeline_accuracy()
         self._add_version_label()
 
         self._add_dummy_widget_to_content()
@@ -141,6 +146,26 @@ class Overview(AdminView):
                 column = 0
                 row += 1
 
+    def _add_flow_alerts(self):
+        alerts = self.barbot_.flow_model.alerts
+        if len(alerts) == 0:
+            return
+        wrapper = QtWidgets.QWidget()
+        wrapper.setLayout(QtWidgets.QGridLayout())
+        self._content.layout().addWidget(wrapper)
+        for row, alert in enumerate(alerts):
+            text = f"Position {alert.port + 1} fließt langsam: "
+            text += f"{alert.current_rate:.1f} g/s statt {alert.usual_rate:.1f} g/s.\n"
+            text += "Bitte den Schlauch prüfen."
+            wrapper.layout().addWidget(QtWidgets.QLabel(text), row, 0)
+            button = QtWidgets.QPushButton("Geprüft")
+            def clear(_, port=alert.port):
+                self.barbot_.flow_model.clear_alert(port)
+                self.barbot_.flow_model.save()
+                self.window.set_view(Overview(self.window))
+            button.clicked.connect(clear)
+            wrapper.layout().addWidget(button, row, 1)
+
     def _add_board_list(self):
         self.boards = [
             [BoardType.BALANCE, "balance.png"],
@@ -182,6 +207,61 @@ class Overview(AdminView):
         wrapper.layout().addWidget(QtWidgets.QWidget(), 0, 0)
         wrapper.layout().addWidget(QtWidgets.QWidget(), row, 0)
 
+    def _add_command_statistics(self):
+        statistics = self.barbot_.command_statistics
+        if len(statistics) == 0:
+            return
+        wrapper = QtWidgets.QWidget()
+        wrapper.setLayout(QtWidgets.QGridLayout())
+        self._content.layout().addWidget(wrapper)
+        headers = ["Befehl", "Anzahl", "p50", "p95", "p99", "Wdh.", "Fehler"]
+        for column, header in enumerate(headers):
+            wrapper.layout().addWidget(QtWidgets.QLabel(header), 0, column)
+        for row, item in enumerate(sorted(statistics.values(), key=lambda s: s.command), 1):
+            # DO commands are slow because of the time it takes to execute them
+            latency = item.done_latency if item.done_latency.count > 0 else item.ack_latency
+            values = [
+                item.command,
+                str(item.calls),
+                f"{latency.p50:.2f} s",
+                f"{latency.p95:.2f} s",
+                f"{latency.p99:.2f} s",
+                str(item.retries),
+                str(item.failed_calls)
+            ]
+            for column, value in enumerate(values):
+                wrapper.layout().addWidget(QtWidgets.QLabel(value), row, column)
+
+    def _add_draft_accuracy(self):
+        model = self.barbot_.overshoot_model
+        if len(model.ports) == 0:
+            return
+        wrapper = QtWidgets.QWidget()
+        wrapper.setLayout(QtWidgets.QGridLayout())
+        self._content.layout().addWidget(wrapper)
+        headers = ["Position", "Anzahl", "Überlauf", "Abweichung"]
+        for column, header in enumerate(headers):
+            wrapper.layout().addWidget(QtWidgets.QLabel(header), 0, column)
+        for row, port in enumerate(model.ports, 1):
+            accuracy = model.accuracy(port)
+            values = [
+                str(port + 1),
+                str(accuracy.drafts),
+                f"{accuracy.overshoot:.1f} g",
+                f"{accuracy.mean_error:+.1f} g (±{accuracy.mean_absolute_error:.1f} g)"
+            ]
+            for column, value in enumerate(values):
+                wrapper.layout().addWidget(QtWidgets.QLabel(value), row, column)
+
+    def _add_timeline_accuracy(self):
+        report = self.barbot_.timeline_accuracy
+        if report is None:
+            return
+        text = f"Zeitprognose: {report.mean_error:+.1f} s "
+        text += f"(±{report.mean_absolute_error:.1f} s, {report.mean_relative_error:.0%}) "
+        text += f"bei {report.drinks} Cocktails"
+        self._content.layout().addWidget(QtWidgets.QLabel(text))
+
     def _add_version_label(self):
         version_label = QtWidgets.QLabel(f"Version: {barbot_version}")
         self._content.layout().addWidget(version_label)
@@ -203,6 +283,7 @@ class Ports(AdminView):
         self._add_title_to_fixed_content("Positionen")
         self._add_back_button_to_fixed_content()
         self._add_list_of_ports()
+        self._add_optimize_button()
         self._add_save_button()
 
         self._add_dummy_widget_to_content()
@@ -212,6 +293,7 @@ class Ports(AdminView):
         table.setLayout(QtWidgets.QGridLayout())
         self._content.layout().addWidget(table)
         self._ingredient_widgets = {}
+        self._level_labels = {}
         for i in range(PORT_COUNT):
             label = QtWidgets.QLabel(f"Position {(i+1)}")
             table.layout().addWidget(label, i, 0)
@@ -219,6 +301,51 @@ class Ports(AdminView):
             cb_port = self.window.combobox_ingredients(ingredient, only_normal=True)
             self._ingredient_widgets[i] = cb_port
             table.layout().addWidget(cb_port, i, 1)
+            level_label = QtWidgets.QLabel()
+            self._level_labels[i] = level_label
+            table.layout().addWidget(level_label, i, 2)
+            button = QtWidgets.QPushButton("Neue Flasche")
+            button.clicked.connect(lambda checked, port=i: self._new_bottle(port))
+            table.layout().addWidget(button, i, 3)
+        self.update_levels()
+
+    def update_levels(self):
+        """Show the current fill levels of the ports"""
+        for port, label in self._level_labels.items():
+            level = self.barbot_.inventory.level(port)
+            label.setText(f"{level:.0f} g" if level is not None else "")
+
+    def _new_bottle(self, port: int):
+        """A full bottle was connected to the port"""
+        # the levels are shown once the barbot updated them
+        self.barbot_.bottles_changed([port])
+
+    def _add_optimize_button(self):
+        self._proposal_label = QtWidgets.QLabel()
+        self._proposal_label.setVisible(False)
+        self._content.layout().addWidget(self._proposal_label)
+        button = QtWidgets.QPushButton("Anordnung optimieren")
+        button.clicked.connect(self._show_proposal)
+        self._content.layout().addWidget(button)
+        self._content.layout().setAlignment(button, QtCore.Qt.AlignCenter)
+
+    def _show_proposal(self):
+        """Preview the layout proposed from the orders, it is applied by saving"""
+        optimizer = LayoutOptimizer(ordered_drinks(self.barbot_.parties), self.barbot_.config)
+        proposal = optimizer.propose(self.barbot_.ports)
+        if not proposal.is_improvement:
+            self.window.show_message("Die Anordnung ist bereits optimal.")
+            return
+        for port, cb_port in self._ingredient_widgets.items():
+            ingredient = proposal.ports.get(port)
+            for index in range(cb_port.count()):
+                if cb_port.itemData(index) == ingredient:
+                    cb_port.setCurrentIndex(index)
+        self._proposal_label.setText(
+            f"Erwartete Ersparnis: {proposal.saved_time:.1f} s pro Cocktail\n" +\
+            "Flaschen umstecken und speichern."
+        )
+        self._proposal_label.setVisible(True)
 
     def _add_save_button(self):
         button = QtWidgets.QPushButton("Speichern")
@@ -230,21 +357,15 @@ class Ports(AdminView):
         new_ports:Dict[int, Ingredient] = {}
         for port, cb in self._ingredient_widgets.items():
             new_ports[port] = cb.currentData()
-        # check for duplicates
-        not_none_entries = [
-            ing.name
-            for ing in new_ports.values()
-            if ing is not None
+        # an ingredient may be connected to several ports, the barbot switches when one is empty
+        changed_ports = [
+            port for port, ingredient in new_ports.items()
+            if ingredient != self.barbot_.ports.ingredient_at_port(port)
         ]
-        if len(not_none_entries) != len(set(not_none_entries)):
-            self.window.show_message(
-                "Jede Zutat darf nur einer\n" +\
-                "Position zugewiesen werden!"
-            )
-            return
         # update the ports list and save it
         self.barbot_.ports.update(new_ports)
         self.barbot_.ports.save()
+        self.barbot_.bottles_changed(changed_ports)
         self.window.show_message("Positionen wurden gespeichert.")
 
 class BalanceCalibration(AdminView):
@@ -503,6 +624,10 @@ class Settings(AdminView):
                 "type": bool},
             {"name": "Zucker g/Tl", "setting": "sugar_per_unit",
                 "type": int, "min": 1, "max": 10},
+            {"name": "Fahrwege optimieren", "setting": "minimize_travel",
+                "type": bool},
+            {"name": "Überlauf ausgleichen", "setting": "compensate_overshoot",
+                "type": bool},
         ]
 
         self._add_title_to_fixed_content("Einstellungen")
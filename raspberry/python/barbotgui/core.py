@@ -50,6 +50,8 @@ class BarBotWindow(QtWidgets.QMainWindow):
     _mixing_progress_trigger = QtCore.pyqtSignal(int)
     _message_trigger = QtCore.pyqtSignal(UserMessageType)
     _show_message_trigger = QtCore.pyqtSignal(str)
+    _orders_trigger = QtCore.pyqtSignal()
+    _inventory_trigger = QtCore.pyqtSignal()
 
     def __init__(self, barbot_:BarBot, recipes: RecipeCollection):
         super().__init__()
@@ -256,8 +258,10 @@ class BusyView(View):
             if ingredient.type == IngredientType.SUGAR:
                 message_string = f"{ingredient.name} ist leer. Bitte nachfüllen."
             else:
-                ports = self.barbot_.ports
-                position = ports.port_of_ingredient(ingredient) + 1
+                port = self.barbot_.current_port
+                if port is None:
+                    port = self.barbot_.ports.port_of_ingredient(ingredient)
+                position = port + 1
                 message_string = f"Die Zutat '{ingredient.name}'"
                 message_string += f" auf Position {position} ist leer.\n"
                 message_string += "Bitte neue Flasche anschließen."
@@ -337,6 +341,24 @@ class BusyView(View):
 
             add_button("OK", UserInputType.YES)
 
+        elif message == UserMessageType.RESUME_MIXING:
+            text = "Die Verbindung wurde während des Mischens unterbrochen.\n"
+            text += "Soll der Cocktail fertig gemischt werden?"
+            message_label.setText(text)
+
+            add_button("Ja", UserInputType.YES)
+            add_button("Nein", UserInputType.NO)
+
+        elif message == UserMessageType.INGREDIENTS_RUNNING_LOW:
+            recipe = self.barbot_.current_mixing_options.recipe
+            names = ", ".join(f"'{i.name}'" for i in self.barbot_.missing_ingredients(recipe))
+            text = f"{names} reicht voraussichtlich nicht.\n"
+            text += "Soll der Cocktail trotzdem gemischt werden?"
+            message_label.setText(text)
+
+            add_button("Cocktail\nabbrechen", UserInputType.NO)
+            add_button("Trotzdem\nmischen", UserInputType.YES)
+
         elif message == UserMessageType.ICE_EMPTY:
             message_label.setText("Eis konnte nicht hinzugefügt werden.")
 
@@ -442,6 +464,10 @@ class BusyView(View):
             button = QtWidgets.QPushButton("Abbrechen")
             button.clicked.connect(self.barbot_.abort_mixing)
             self._content_container.layout().addWidget(button)
+            # the next guest can order while this drink is mixed
+            button = QtWidgets.QPushButton("Weitere Bestellung")
+            button.clicked.connect(self.window.show_recipe_list)
+            self._content_container.layout().addWidget(button)
 
             if options is not None:
                 self._title_label.setText(f"'{options.recipe.name}'\nwird gemischt.")
@@ -4,13 +4,13 @@ import os
 
 from PyQt5 import QtWidgets, Qt, QtCore
 
-from barbot import BarBot
+from barbot import BarBot, UserMessageType
 from barbot.recipes import RecipeCollection
 
 from barbotgui.core import BarBotWindow, SystemBusyView, View, BusyView, css_path, is_raspberry
 from barbotgui.controls import Keyboard, Numpad, set_no_spacing
-from barbotgui.adminviews import AdminLogin
-from barbotgui.userviews import ListRecipes, OrderRecipe
+from barbotgui.adminviews import AdminLogin, Ports
+from barbotgui.userviews import ListRecipes, OrderRecipe, Orders
 
 SPLASH_MESSAGE_DURATION_IN_SECONDS = 1.5
 
@@ -49,9 +49,20 @@ class MainWindow(BarBotWindow):
         self._mixing_progress_trigger.connect(self._busyview_set_progress)
         self._barbot.on_mixing_progress_changed = self._mixing_progress_trigger.emit
 
+        # forward order queue changed
+        self._orders_trigger.connect(self._orders_update)
+        self._barbot.on_orders_changed = self._orders_trigger.emit
+
+        # forward fill levels changed
+        self._inventory_trigger.connect(self._inventory_update)
+        self._barbot.on_inventory_changed = self._inventory_trigger.emit
+
         # make sure the message splash is created from gui thread
         self._show_message_trigger.connect(self._show_message_splash)
 
+        # poll the mainboard more frequently while the user interacts with the gui
+        QtWidgets.QApplication.instance().installEventFilter(self)
+
         # remove borders and title bar
         self.setWindowFlags(QtCore.Qt.FramelessWindowHint)
         self.center.setLayout(QtWidgets.QVBoxLayout())
@@ -79,6 +90,16 @@ class MainWindow(BarBotWindow):
         else:
             self.show()
 
+    def eventFilter(self, watched, event: QtCore.QEvent):
+        """Tell the barbot about any user interaction"""
+        if event.type() in [
+                QtCore.QEvent.MouseButtonPress,
+                QtCore.QEvent.KeyPress,
+                QtCore.QEvent.TouchBegin
+            ]:
+            self._barbot.notify_user_activity()
+        return super().eventFilter(watched, event)
+
     def _busyview_set_progress(self, progress):
         """forward progress if the current view is a busyview"""
         if self._current_view is not None and isinstance(self._current_view, BusyView):
@@ -86,9 +107,27 @@ class MainWindow(BarBotWindow):
 
     def _busyview_update_message(self, message):
         """forward progress if the current view is a busyview"""
+        # the message might need an answer, so show it even if the next drink is ordered
+        if message not in [None, UserMessageType.NONE] and self._barbot.is_busy \
+                and not isinstance(self._current_view, BusyView):
+            self.set_view(BusyView(self))
         if self._current_view is not None and isinstance(self._current_view, BusyView):
             self._current_view.update_message(message)
 
+    def _orders_update(self):
+        """forward order queue changes if the current view shows the queue"""
+        if self._current_view is not None and isinstance(self._current_view, Orders):
+            self._current_view.update_orders()
+
+    def _inventory_update(self):
+        """forward fill level changes if the current view shows the ports"""
+        if self._current_view is not None and isinstance(self._current_view, Ports):
+            self._current_view.update_levels()
+
+    def show_recipe_list(self):
+        """Show the recipes, e.g. to order while the barbot is busy"""
+        self.set_view(ListRecipes(self))
+
     def header_clicked(self, _):
         """Handle the header click"""
         if not self._admin_button_active:
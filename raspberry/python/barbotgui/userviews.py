@@ -3,6 +3,7 @@ from enum import Enum, auto
 from PyQt5 import QtWidgets, QtCore
 
 from barbot import MixingOptions
+from barbot.orders import Order
 from barbot.recipes import PartyStatistics, RecipeItem, Recipe, Party
 from barbot.config import IngredientType, Stir as StirIngredient
 
@@ -20,6 +21,7 @@ class UserView(View):
             ["Neu", RecipeNewOrEdit],
             ["Nachschlag", SingleIngredient],
             ["Statistik", Statistics],
+            ["Warteschlange", Orders],
         ]
         self.setLayout(QtWidgets.QVBoxLayout())
         set_no_spacing(self.layout())
@@ -207,24 +209,34 @@ class ListRecipes(UserView):
             instruction.setWordWrap(True)
             right_column.layout().addWidget(instruction)
 
+        if not recipe.is_available(self.barbot_.ports, self.barbot_.config):
+            return
+        # the bottles would run dry while mixing
+        missing = self.barbot_.missing_ingredients(recipe)
+        if len(missing) > 0:
+            names = ", ".join(ingredient.name for ingredient in missing)
+            missing_label = QtWidgets.QLabel(f"Nicht genug {names}")
+            missing_label.setWordWrap(True)
+            right_column.layout().addWidget(missing_label)
+            return
+        # predicted duration
+        duration = self.barbot_.simulate(MixingOptions(recipe)).total
+        duration_label = QtWidgets.QLabel(f"ca. {duration:.0f} s")
+        right_column.layout().addWidget(duration_label)
+        right_column.layout().setAlignment(duration_label, QtCore.Qt.AlignRight)
         # order button
-        if recipe.is_available(self.barbot_.ports, self.barbot_.config):
-            icon = qt_icon_from_file_name("order.png")
-            order_button = QtWidgets.QPushButton(icon, "")
-            order_button.setProperty("class", "BtnOrder")
-            order_button.clicked.connect(
-                lambda _, r=recipe: self._order(r))
-            right_column.layout().addWidget(order_button, 0)
-            right_column.layout().setAlignment(order_button, QtCore.Qt.AlignRight)
+        icon = qt_icon_from_file_name("order.png")
+        order_button = QtWidgets.QPushButton(icon, "")
+        order_button.setProperty("class", "BtnOrder")
+        order_button.clicked.connect(
+            lambda _, r=recipe: self._order(r))
+        right_column.layout().addWidget(order_button, 0)
+        right_column.layout().setAlignment(order_button, QtCore.Qt.AlignRight)
 
     def _open_edit(self, recipe: Recipe):
         self.window.set_view(RecipeNewOrEdit(self.window, recipe))
 
     def _order(self, recipe):
-        if self.barbot_.is_busy:
-            self.window.show_message(
-                "Bitte warten bis die laufende\nAktion abgeschlossen ist.")
-            return
         if recipe is None:
             self.window.show_message("Rezept nicht gefunden")
             return
@@ -293,6 +305,11 @@ class RecipeNewOrEdit(UserView):
         label = QtWidgets.QLabel("Nachher:")
         wrapper.layout().addRow(label, self._post_instruction_widget)
 
+        # keep order
+        self._keep_order_widget = QtWidgets.QCheckBox("Reihenfolge beibehalten")
+        self._keep_order_widget.setChecked(self._recipe.keep_order)
+        wrapper.layout().addRow(self._keep_order_widget)
+
     def _open_keyboard_for_name_widget(self, _):
         self.window.open_keyboard(self._name_widget)
 
@@ -406,6 +423,7 @@ class RecipeNewOrEdit(UserView):
             return
         self._recipe.pre_instruction = self._pre_instruction_widget.text()
         self._recipe.post_instruction = self._post_instruction_widget.text()
+        self._recipe.keep_order = self._keep_order_widget.isChecked()
         # prepare data
         self._recipe.items = []
         for ingredient_widget, amount_widget in self._ingredient_widgets:
@@ -753,10 +771,80 @@ class OrderRecipe(UserView):
     def _order(self):
         add_ice = self._cb_ice.isChecked() if self._cb_ice is not None else False
         add_straw = self._cb_straw.isChecked() if self._cb_straw is not None else False
-        self.barbot_.start_mixing(
+        missing = self.barbot_.missing_ingredients(self._recipe)
+        if len(missing) > 0:
+            names = ", ".join(f"'{ingredient.name}'" for ingredient in missing)
+            self.window.show_message(f"Nicht genug {names}\nfür diesen Cocktail.")
+            return
+        self.barbot_.enqueue_order(
             MixingOptions(
                 self._recipe,
                 add_straw=add_straw,
                 add_ice=add_ice
             )
         )
+        # an order that is not mixed right away is shown in the queue
+        position = len(self.barbot_.orders)
+        if self.barbot_.is_busy or position > 1:
+            self.window.show_message(f"Deine Bestellung ist\nan Position {position}.")
+            self.window.set_view(Orders(self.window))
+
+
+class Orders(UserView):
+    """Queue of the ordered drinks, orders can be canceled or mixed earlier"""
+    def __init__(self, window: BarBotWindow):
+        super().__init__(window)
+        self._content.setLayout(QtWidgets.QVBoxLayout())
+        self._fixed_content.setLayout(QtWidgets.QVBoxLayout())
+
+        self._add_title_to_fixed_content("Warteschlange")
+        self._add_metrics_label()
+        self._add_orders_container()
+        self._add_dummy_widget_to_content()
+
+        self.update_orders()
+
+    def _add_metrics_label(self):
+        self._metrics_label = QtWidgets.QLabel()
+        self._fixed_content.layout().addWidget(self._metrics_label)
+
+    def _add_orders_container(self):
+        self._orders_container = QtWidgets.QWidget()
+        self._orders_container.setLayout(QtWidgets.QGridLayout())
+        self._content.layout().addWidget(self._orders_container)
+
+    def update_orders(self):
+        """Show the current orders, called whenever the queue changed"""
+        metrics = self.barbot_.order_metrics
+        self._metrics_label.setText(
+            f"Gemischt: {metrics.drinks_mixed} ({metrics.drinks_per_hour:.0f} pro Stunde)")
+        self._clear_orders_container()
+        etas = self.barbot_.order_etas()
+        if len(etas) == 0:
+            self._orders_container.layout().addWidget(QtWidgets.QLabel("Keine Bestellungen"))
+        for row, (order, eta) in enumerate(etas):
+            self._add_order_row(row, order, eta)
+
+    def _clear_orders_container(self):
+        while self._orders_container.layout().count():
+            item = self._orders_container.layout().takeAt(0)
+            widget = item.widget()
+            if widget is not None:
+                widget.setParent(None)
+
+    def _add_order_row(self, row: int, order: Order, eta: float):
+        layout = self._orders_container.layout()
+        label = QtWidgets.QLabel(f"{row + 1}. {order.recipe.name}")
+        label.setProperty("class", "RecipeTitle")
+        layout.addWidget(label, row, 0)
+        layout.addWidget(QtWidgets.QLabel(f"ca. {max(1, round(eta / 60))} min"), row, 1)
+        # move up
+        if row > 0:
+            button = QtWidgets.QPushButton("Vor")
+            button.clicked.connect(
+                lambda _, o=order, r=row: self.barbot_.move_order(o.order_id, r - 1))
+            layout.addWidget(button, row, 2)
+        # cancel
+        button = QtWidgets.QPushButton("Stornieren")
+        button.clicked.connect(lambda _, o=order: self.barbot_.cancel_order(o.order_id))
+        layout.addWidget(button, row, 3)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
 import sys
 import traceback
@@ -18,7 +19,8 @@ from barbotgui import MainWindow
 from barbot import BarBot, Mainboard
 from barbot.recipes import RecipeCollection
 from barbot.config import log_directory, BarBotConfig, PortConfiguration
-from barbot.communication import MainboardConnectionBluetooth
+from barbot.communication import MainboardConnectionBluetooth, MainboardConnectionSerial
+from barbot.communication import MainboardConnectionTCP
 from barbot.mockup import MaiboardConnectionMockup
 
 # cofigure logging
@@ -51,13 +53,26 @@ logging.info("--------------------------")
 is_demo = "-d" in sys.argv[1:]
 ports = PortConfiguration()
 config = BarBotConfig()
-mainboard = Mainboard(MaiboardConnectionMockup() if is_demo else MainboardConnectionBluetooth())
+# the mainboard is connected with bluetooth, with a cable if "-s" is passed
+# or through a bridge on another host if "-n" is passed
+if is_demo:
+    connection = MaiboardConnectionMockup()
+elif "-s" in sys.argv[1:]:
+    connection = MainboardConnectionSerial(config.serial_baud_rate)
+elif "-n" in sys.argv[1:]:
+    connection = MainboardConnectionTCP()
+else:
+    connection = MainboardConnectionBluetooth()
+mainboard = Mainboard(connection)
 bot = BarBot(config, ports, mainboard)
 recipe_collection = RecipeCollection()
 recipe_collection.load()
 
-# create statemachine
-bar_bot_thread = threading.Thread(target=bot.run)
+# create statemachine, optionally running in an asyncio event loop
+if "-a" in sys.argv[1:]:
+    bar_bot_thread = threading.Thread(target=asyncio.run, args=(bot.run_async(),))
+else:
+    bar_bot_thread = threading.Thread(target=bot.run)
 bar_bot_thread.start()
 
 app = None
@@ -0,0 +1,115 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from barbot import BarBot, BarBotState, MixingOptions
+from barbot.clock import Clock, VirtualClock
+from barbot.communication import Mainboard, BoardType
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.mockup import MaiboardConnectionMockup
+from barbot.recipes import Recipe, RecipeItem
+
+def create_connection_mockup(clock: Clock = None) -> MaiboardConnectionMockup:
+    """Mockup that answers fast and reports all boards needed for mixing"""
+    connection = MaiboardConnectionMockup(clock)
+    connection.duration_DO = 0.01
+    connection.duration_SET = 0.001
+    connection.duration_GET = 0.001
+    connection.status_interval = 0.01
+    boards = 1 << BoardType.BALANCE.value | 1 << BoardType.MIXER.value
+    connection.set_result_for_getter("GetConnectedBoards", boards)
+    connection.set_result_for_getter("GetFirmwareVersion", 40500)
+    connection.set_result_for_getter("IsIdle", 1)
+    connection.set_result_for_getter("HasGlas", 1)
+    return connection
+
+def create_config(directory: str) -> BarBotConfig:
+    """Config saved to the given directory, that skips searching for the mainboard"""
+    config = BarBotConfig(load_on_init=False, directory=directory)
+    config.mac_address = "00:00:00:00:00:00"
+    return config
+
+def create_recipe(*items) -> Recipe:
+    recipe = Recipe()
+    recipe.name = "Test"
+    for identifier, amount in items:
+        recipe.items.append(RecipeItem(get_ingredient_by_identifier(identifier), amount))
+    return recipe
+
+class BarBotTestCase(unittest.TestCase):
+    """Runs a barbot with a mockup connection in virtual time in a background thread"""
+    def setUp(self):
+        # nothing is saved to the real data folder
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.config = create_config(self.directory)
+        self.ports = PortConfiguration(load_on_init=False, directory=self.directory)
+        self.ports.update({
+            0: get_ingredient_by_identifier("vodka"),
+            1: get_ingredient_by_identifier("saft orange"),
+            2: get_ingredient_by_identifier("sirup grenadine"),
+            5: get_ingredient_by_identifier("rum weiss"),
+        })
+        self.start_bot(VirtualClock())
+
+    def tearDown(self):
+        self.stop_bot()
+
+    def start_bot(self, clock: Clock):
+        self.clock = clock
+        self.connection = create_connection_mockup(clock)
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def run_bot(self, mainboard: Mainboard):
+        """Run a barbot with the given mainboard and wait until it is idle"""
+        self.bot = BarBot(self.config, self.ports, mainboard, self.clock, self.directory)
+        # the parties are always saved to the orders folder of the real data folder
+        self.bot._parties = MagicMock()
+        self.bot_thread = threading.Thread(target=self.bot.run, daemon=True)
+        self.bot_thread.start()
+        self.wait_for_state(BarBotState.IDLE)
+
+    def stop_bot(self):
+        self.bot.abort()
+        self.bot_thread.join(2)
+
+    def wait_for_state(self, state: BarBotState, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while self.bot.state != state:
+            assert time.monotonic() < deadline, f"BarBot stuck in state {self.bot.state}"
+            time.sleep(0.01)
+
+    def change_bottles(self, ports):
+        changed = threading.Event()
+        self.bot.on_inventory_changed = changed.set
+        self.bot.bottles_changed(ports)
+        assert changed.wait(5), "Bottles were not changed"
+
+    def mix(self, recipe: Recipe):
+        finished = threading.Event()
+        self.bot.on_mixing_finished = lambda _: finished.set()
+        self.bot.start_mixing(MixingOptions(recipe))
+        assert finished.wait(10), "Mixing did not finish"
+        self.wait_for_state(BarBotState.IDLE)
+
+class TestBarBot(BarBotTestCase):
+    def test_known_set_values_are_skipped(self):
+        recipe = create_recipe(("vodka", 4), ("saft orange", 10), ("rum weiss", 2))
+        self.mix(recipe)
+        # pump power is the same for all items and the LEDs are the same as before mixing
+        assert self.bot.saved_round_trips_last_drink >= 3
+        self.connection.clear_command_history()
+        self.mix(recipe)
+        assert "SetPumpPower" not in self.connection.command_history
+        assert self.connection.command_history.count("Draft") == 3
+
+    def test_command_statistics(self):
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        statistics = self.bot.command_statistics
+        assert statistics["Draft"].calls == 2
+        assert statistics["Draft"].done_latency.count == 2
+        assert statistics["Draft"].failed_calls == 0
+        assert statistics["IsIdle"].ack_latency.count > 0
@@ -0,0 +1,58 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import socket
+import time
+import unittest
+from barbot.bridge import MainboardBridge
+from barbot.communication import FirmwareVersion, Mainboard, MainboardConnectionTCP
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+
+class TestBridge(unittest.TestCase):
+    def setUp(self):
+        self.emulator = MainboardEmulator()
+        self.emulator.tick = 0.001
+        self.bridge = MainboardBridge(MainboardConnectionEmulator(self.emulator), "emulator", port=0)
+        self.bridge.start()
+        self.address = f"127.0.0.1:{self.bridge.port}"
+
+    def tearDown(self):
+        self.bridge.stop()
+
+    def test_mainboard_over_tcp(self):
+        connection = MainboardConnectionTCP()
+        mainboard = Mainboard(connection)
+        try:
+            assert mainboard.connect(self.address)
+            options = connection._socket.getsockopt
+            assert options(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+            assert options(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+            assert mainboard.firmware_version == FirmwareVersion(99, 99, 99)
+            # move and pump quickly to keep the test short
+            self.emulator.flow_rates[0] = 50
+            assert mainboard.set("SetAccel", 2000).was_successfull
+            assert mainboard.set("SetSpeed", 2000).was_successfull
+            assert mainboard.do("Draft", 0, 20).was_successfull
+            assert int(mainboard.get("GetWeight").return_parameters[0]) >= 370
+        finally:
+            mainboard.disconnect()
+
+    def test_client_can_reconnect(self):
+        connection = MainboardConnectionTCP()
+        for _ in range(2):
+            assert connection.connect(self.address)
+            connection.send("HasGlas")
+            while (line := connection.read_line()).startswith("STATUS"):
+                pass
+            assert line == "ACK HasGlas 1"
+            connection.disconnect()
+            # the bridge notices the closed connection
+            deadline = time.monotonic() + 2
+            while self.bridge.has_client:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+    def test_connection_fails_without_bridge(self):
+        connection = MainboardConnectionTCP()
+        self.bridge.stop()
+        assert not connection.connect(self.address)
+        assert not connection.is_connected
+        assert connection.read_line() is None
@@ -0,0 +1,135 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import os
+import tempfile
+import threading
+import unittest
+from barbot import BarBotState, MixingOptions, UserInputType, UserMessageType
+from barbot.checkpoint import CheckpointStore, MixingCheckpoint
+from barbot.communication import Mainboard
+from barbot.config import BarBotConfig
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from barbot.program import compile_mixing
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+from test.barbot.test_program import create_ports
+
+class DroppingConnection(MainboardConnectionEmulator):
+    """Loses the connection once a line starting with the given text was sent,
+    the emulator keeps executing the command"""
+    def __init__(self, emulator: MainboardEmulator, drop_after: str):
+        super().__init__(emulator)
+        self.drop_after = drop_after
+        self.sent_lines = []
+
+    def send(self, line: str):
+        self.sent_lines.append(line)
+        super().send(line)
+        if self.drop_after is not None and line.startswith(self.drop_after):
+            self.drop_after = None
+            self._is_connected = False
+
+class TestMixingCheckpoint(unittest.TestCase):
+    def setUp(self):
+        recipe = create_recipe(("vodka", 4), ("sirup grenadine", 2), ("ruehren", 0))
+        self.program = compile_mixing(recipe.items, create_ports(), BarBotConfig(load_on_init=False))
+        self.checkpoint = MixingCheckpoint(recipe, False, True, 1, None, 350)
+
+    def test_resume_in_the_middle_of_a_step(self):
+        # vodka and 5 g of the sirup were added
+        assert self.checkpoint.resume_point(self.program, 350 + 40 + 5) == (1, 15)
+
+    def test_skip_finished_step(self):
+        assert self.checkpoint.resume_point(self.program, 350 + 40 + 20.5) == (2, None)
+
+    def test_other_glass_does_not_match(self):
+        assert self.checkpoint.matches(self.program, 350 + 40 - 2)
+        # the vodka is missing, the drink was taken away
+        assert not self.checkpoint.matches(self.program, 350)
+        assert self.checkpoint.matches(self.program, None)
+
+    def test_shorter_program_does_not_match(self):
+        self.checkpoint.step_index = len(self.program) + 1
+        assert not self.checkpoint.matches(self.program, 390)
+
+    def test_unknown_weight_repeats_remaining(self):
+        self.checkpoint.remaining = 12
+        assert self.checkpoint.resume_point(self.program, None) == (1, 12)
+        self.checkpoint.start_weight = None
+        assert self.checkpoint.resume_point(self.program, 400) == (1, 12)
+
+    def test_store(self):
+        store = CheckpointStore(os.path.join(tempfile.mkdtemp(), "checkpoint.yaml"))
+        assert store.load() is None
+        assert store.save(self.checkpoint)
+        loaded = store.load()
+        assert loaded.recipe.equal_to(self.checkpoint.recipe)
+        assert (loaded.add_ice, loaded.add_straw) == (False, True)
+        assert (loaded.step_index, loaded.remaining, loaded.start_weight) == (1, None, 350)
+        store.clear()
+        assert store.load() is None
+
+class TestResumeMixing(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        # the link is lost while the orange juice is drafted
+        self.connection = DroppingConnection(self.emulator, "Draft 1")
+        self.run_bot(Mainboard(self.connection, clock))
+        self.recipe = create_recipe(("vodka", 4), ("saft orange", 10), ("ruehren", 0))
+
+    def answer_resume(self, answer: UserInputType, replace_glass: bool = False):
+        def on_message(message):
+            if message == UserMessageType.RESUME_MIXING:
+                if replace_glass:
+                    self.emulator.place_glass()
+                # the barbot resets the input after showing the message
+                threading.Timer(0.1, self.bot.set_user_input, [answer]).start()
+        self.bot.on_message_changed = on_message
+
+    def start_and_lose_connection(self):
+        self.bot.start_mixing(MixingOptions(self.recipe))
+        self.wait_for_state(BarBotState.MIXING)
+        # the drink was interrupted and is offered to be resumed after reconnecting
+        self.wait_for_state(BarBotState.IDLE)
+
+    def test_resume_after_reconnect(self):
+        self.answer_resume(UserInputType.YES)
+        finished = threading.Event()
+        self.bot.on_mixing_finished = lambda _: finished.set()
+        self.start_and_lose_connection()
+        assert finished.is_set()
+        # the mainboard finished the juice while the connection was lost, so it is not repeated
+        drafts = [line for line in self.connection.sent_lines if line.startswith("Draft")]
+        assert drafts == ["Draft 0 40", "Draft 1 100"]
+        assert "Mix 3" in self.connection.sent_lines
+        self.assertAlmostEqual(self.emulator.content_weight, 140, delta=2)
+        self.bot._parties.current_party.add_order.assert_called_once()
+        assert self.bot._checkpoints.load() is None
+
+    def test_decline_resume(self):
+        self.answer_resume(UserInputType.NO)
+        self.start_and_lose_connection()
+        assert "Mix 3" not in self.connection.sent_lines
+        self.bot._parties.current_party.add_order.assert_not_called()
+        assert self.bot._checkpoints.load() is None
+
+    def test_abort_resume_question(self):
+        def on_message(message):
+            if message == UserMessageType.RESUME_MIXING:
+                threading.Timer(0.1, self.bot.abort_mixing).start()
+        self.bot.on_message_changed = on_message
+        with self.assertLogs(level="WARNING"):
+            self.start_and_lose_connection()
+        assert "Mix 3" not in self.connection.sent_lines
+        assert self.bot._checkpoints.load() is None
+        assert self.bot.current_message == UserMessageType.NONE
+
+    def test_resume_into_other_glass_is_refused(self):
+        self.answer_resume(UserInputType.YES, replace_glass=True)
+        with self.assertLogs(level="WARNING") as logs:
+            self.start_and_lose_connection()
+        assert any("cannot be resumed" in line for line in logs.output)
+        drafts = [line for line in self.connection.sent_lines if line.startswith("Draft")]
+        assert drafts == ["Draft 0 40", "Draft 1 100"]
+        self.bot._parties.current_party.add_order.assert_not_called()
+        assert self.bot._checkpoints.load() is None
+        assert self.bot.current_message == UserMessageType.NONE
@@ -0,0 +1,76 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import threading
+import time
+import unittest
+from barbot import BarBotState, MixingOptions
+from barbot.clock import Clock, VirtualClock
+from barbot.communication import Mainboard
+from test.barbot.test_barbot import BarBotTestCase, create_connection_mockup, create_recipe
+
+class TestVirtualClock(unittest.TestCase):
+    def test_sleep_advances_time(self):
+        clock = VirtualClock(10)
+        start_time = time.monotonic()
+        clock.sleep(3600)
+        assert clock.time() == 3610
+        assert time.monotonic() - start_time < 1
+
+    def test_wait_for_set_event_does_not_advance_time(self):
+        clock = VirtualClock()
+        event = threading.Event()
+        assert not clock.wait_event(event, 5)
+        assert clock.time() == 5
+        event.set()
+        assert clock.wait_event(event, 5)
+        assert clock.time() == 5
+
+    def test_mockup_commands_take_virtual_time(self):
+        clock = VirtualClock()
+        connection = create_connection_mockup(clock)
+        connection.duration_DO = 10
+        mainboard = Mainboard(connection, clock)
+        assert mainboard.do("Draft", 0, 40).was_successfull
+        assert clock.time() >= 10
+
+class TestPartySimulation(BarBotTestCase):
+    def setUp(self):
+        super().setUp()
+        # close to the durations of the real mainboard
+        self.connection.duration_DO = 5
+        self.connection.duration_SET = 0.05
+        self.connection.duration_GET = 0.05
+        self.connection.status_interval = 0.3
+        self.recipe = create_recipe(("vodka", 4), ("saft orange", 10), ("ruehren", 0))
+
+    def test_six_hour_party(self):
+        finished = threading.Semaphore(0)
+        self.bot.on_mixing_finished = lambda _: finished.release()
+        start_time = time.monotonic()
+        party_start = self.clock.time()
+        orders = 360
+        for order in range(orders):
+            # one order per minute
+            while self.bot.state != BarBotState.IDLE \
+                    or self.clock.time() < party_start + order * 60:
+                time.sleep(0.001)
+            self.bot.start_mixing(MixingOptions(self.recipe))
+            assert finished.acquire(timeout=10), "Mixing did not finish"
+        self.wait_for_state(BarBotState.IDLE)
+        assert self.clock.time() - party_start >= 6 * 3600 - 60
+        assert self.bot._parties.current_party.add_order.call_count == orders
+        assert time.monotonic() - start_time < 60
+
+    def test_same_commands_as_in_real_time(self):
+        commands = []
+        for clock in [self.clock, Clock()]:
+            self.stop_bot()
+            self.start_bot(clock)
+            self.connection.clear_command_history()
+            self.mix(self.recipe)
+            # the barbot moves home after going to idle
+            self.stop_bot()
+            # only the number of polls depends on the time
+            commands.append([command for command in self.connection.command_history
+                             if command not in ["IsIdle", "HasGlas"]])
+        assert commands[0] == commands[1]
+        assert commands[0].count("Draft") == 2
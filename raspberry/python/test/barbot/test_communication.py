@@ -1,9 +1,33 @@
 # pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import asyncio
+import os
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock
 from barbot.communication import decode_firmware_version, FirmwareVersion, Mainboard
+from barbot.communication import AsyncMainboard
+from barbot.communication import MainboardReader, MainboardConnectionBluetooth, LineReader
+from barbot.communication import MainboardConnectionSerial
+from barbot.communication import RawResponse, ResponseTypes, ResponseParser
+from barbot.communication import ErrorType, LatencyHistogram
+from barbot.clock import VirtualClock
+from barbot.emulator import MainboardEmulator, serve_pty
 from barbot.mockup import MaiboardConnectionMockup
 
+def chunked_recv_into(chunks):
+    """Create a function that receives the given chunks like socket.recv_into"""
+    chunks = list(chunks)
+    def recv_into(buffer):
+        # like a socket, only fill the buffer and keep the rest for the next call
+        length = min(len(buffer), len(chunks[0]))
+        buffer[:length] = chunks[0][:length]
+        chunks[0] = chunks[0][length:]
+        if len(chunks[0]) == 0:
+            chunks.pop(0)
+        return length
+    return recv_into
+
 class TestCommunication(unittest.TestCase):
     def test_firmware_version_decoding(self):
         assert FirmwareVersion(0, 0, 0) == decode_firmware_version(0)
@@ -99,3 +123,358 @@ class TestCommunication(unittest.TestCase):
         result = mainboard.set(command, *params)
         assert result.was_successfull
         connection_mockup.send.assert_called_once_with(f"{command} {' '.join(params)}")
+
+    def test_mainboard_set_pipelined(self):
+        attrs = {
+            "read_line.side_effect" : [
+                "ACK SetSpeed",
+                "STATUS IDLE",
+                "NAK SetAccel",
+                "ACK SetLED",
+                # retry of the failed command
+                "ACK SetAccel"
+                ],
+            "is_connected" : True
+        }
+        connection_mockup = MagicMock()
+        connection_mockup.configure_mock(**attrs)
+        mainboard = Mainboard(connection_mockup)
+
+        results = mainboard.set_pipelined(("SetSpeed", 200), ("SetAccel", 300), ("SetLED", 3))
+        assert all(result.was_successfull for result in results)
+        sent_lines = [call.args[0] for call in connection_mockup.send.call_args_list]
+        assert sent_lines == ["SetSpeed 200", "SetAccel 300", "SetLED 3", "SetAccel 300"]
+
+    def test_mainboard_set_pipelined_skips_unexpected_answers(self):
+        attrs = {
+            "read_line.side_effect" : [
+                # stale answer of an earlier command
+                "ACK PlatformLED",
+                "ACK SetSpeed",
+                "ACK SetAccel",
+                "ACK SetLED"
+                ],
+            "is_connected" : True
+        }
+        connection_mockup = MagicMock()
+        connection_mockup.configure_mock(**attrs)
+        mainboard = Mainboard(connection_mockup)
+
+        results = mainboard.set_pipelined(("SetSpeed", 200), ("SetAccel", 300), ("SetLED", 3))
+        assert all(result.was_successfull for result in results)
+        assert connection_mockup.send.call_count == 3
+
+    def test_mainboard_skips_known_set_values(self):
+        connection_mockup = MaiboardConnectionMockup()
+        connection_mockup.duration_SET = 0.001
+        mainboard = Mainboard(connection_mockup)
+        assert mainboard.set("SetPumpPower", 100).was_successfull
+        assert mainboard.set("SetPumpPower", 100).was_successfull
+        assert mainboard.set_pipelined(("SetPumpPower", 100), ("SetLED", 3))[0].was_successfull
+        assert connection_mockup.command_history == ["SetPumpPower", "SetLED"]
+        assert mainboard.set_cache.saved_round_trips == 2
+        # changed values and forced commands are sent
+        mainboard.set("SetPumpPower", 255)
+        mainboard.set("SetPumpPower", 255, force=True)
+        assert connection_mockup.command_history[2:] == ["SetPumpPower", "SetPumpPower"]
+        # values are unknown after reconnecting
+        mainboard.connect("mainboard_mockup")
+        mainboard.disconnect()
+        connection_mockup.clear_command_history()
+        mainboard.set("SetPumpPower", 255)
+        assert connection_mockup.command_history == ["SetPumpPower"]
+
+    def test_mainboard_forgets_failed_set_values(self):
+        attrs = {
+            "read_line.side_effect" : ["ACK SetLED", "NAK SetLED", "NAK SetLED", "NAK SetLED", "ACK SetLED"],
+            "is_connected" : True
+        }
+        connection_mockup = MagicMock()
+        connection_mockup.configure_mock(**attrs)
+        mainboard = Mainboard(connection_mockup)
+        assert mainboard.set("SetLED", 3).was_successfull
+        assert not mainboard.set("SetLED", 4).was_successfull
+        # the mainboard might still have the old value or the new one
+        assert mainboard.set("SetLED", 3).was_successfull
+        assert connection_mockup.send.call_count == 5
+
+    def test_latency_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        assert histogram.percentile(0.5) == 0
+        for _ in range(90):
+            histogram.add(0.015)
+        for _ in range(9):
+            histogram.add(0.3)
+        histogram.add(3)
+        summary = histogram.summary()
+        assert summary.count == 100
+        assert summary.p50 == 0.02
+        assert summary.p95 == 0.5
+        # the maximum is lower than the upper bound of its bucket
+        assert summary.p99 == 0.5
+        assert summary.max == 3
+        assert abs(summary.mean - (90 * 0.015 + 9 * 0.3 + 3) / 100) < 1e-9
+
+    def test_mainboard_records_command_statistics(self):
+        clock = VirtualClock()
+        connection_mockup = MaiboardConnectionMockup(clock)
+        connection_mockup.duration_DO = 3
+        connection_mockup.duration_GET = 0.04
+        connection_mockup.status_interval = 1
+        mainboard = Mainboard(connection_mockup, clock)
+        assert mainboard.do("Draft", 0, 40).done_latency == 3
+        assert mainboard.get("GetWeight").done_latency is None
+        connection_mockup.set_error_for_command("Crush", ErrorType.CRUSHER_TIMEOUT.value)
+        mainboard.do("Crush", 100)
+        statistics = mainboard.instrumentation.snapshot()
+        draft = statistics["Draft"]
+        assert draft.calls == 1
+        assert draft.ack_latency.count == 1
+        assert draft.done_latency.p50 == 3
+        assert draft.status_messages == 2
+        assert abs(statistics["GetWeight"].ack_latency.p99 - 0.04) < 1e-9
+        assert statistics["GetWeight"].done_latency.count == 0
+        assert statistics["Crush"].errors == {ErrorType.CRUSHER_TIMEOUT: 1}
+        # mainboard errors are not retried
+        assert statistics["Crush"].retries == 0
+        mainboard.instrumentation.reset()
+        assert mainboard.instrumentation.snapshot() == {}
+
+    def test_mainboard_records_retries(self):
+        attrs = {
+            "read_line.side_effect" : [
+                "NAK SetLED", "NAK SetLED", "NAK SetLED",
+                "ACK SetSpeed", "NAK SetAccel", "ACK SetAccel"
+                ],
+            "is_connected" : True
+        }
+        connection_mockup = MagicMock()
+        connection_mockup.configure_mock(**attrs)
+        mainboard = Mainboard(connection_mockup)
+        mainboard.set("SetLED", 3)
+        mainboard.set_pipelined(("SetSpeed", 200), ("SetAccel", 300))
+        statistics = mainboard.instrumentation.snapshot()
+        assert statistics["SetLED"].retries == 2
+        assert statistics["SetLED"].errors == {ErrorType.NACK_RECEIVED: 1}
+        assert statistics["SetLED"].ack_latency.count == 0
+        assert statistics["SetSpeed"].retries == 0
+        assert statistics["SetAccel"].retries == 1
+        assert statistics["SetAccel"].failed_calls == 0
+        assert statistics["SetAccel"].ack_latency.count == 1
+
+    def test_mainboard_get_pipelined(self):
+        connection_mockup = MaiboardConnectionMockup()
+        connection_mockup.duration_GET = 0.01
+        connection_mockup.set_result_for_getter("HasGlas", 1)
+        connection_mockup.set_result_for_getter("GetWeight", 150)
+        mainboard = Mainboard(connection_mockup)
+
+        has_glas, weight = mainboard.get_pipelined(("HasGlas",), ("GetWeight",))
+        assert has_glas.return_parameters == ["1"]
+        assert weight.return_parameters == ["150"]
+
+    def test_bluetooth_keeps_all_lines_of_a_packet(self):
+        connection = MainboardConnectionBluetooth()
+        # socket without recv_into
+        connection._conn = MagicMock(spec=["recv", "send", "close", "settimeout"])
+        connection._conn.recv.side_effect = [b"STATUS IDLE\r\nACK SetLED\r\n", b"ACK SetSpeed\r\n"]
+        assert connection.read_line() == "STATUS IDLE"
+        assert connection.read_line() == "ACK SetLED"
+        assert connection.read_line() == "ACK SetSpeed"
+
+    def test_serial_reads_lines_from_pty(self):
+        controller, terminal = os.openpty()
+        connection = MainboardConnectionSerial(57600)
+        try:
+            # the mainboard sends after the port is configured
+            threading.Timer(0.1, os.write, [controller, b"STATUS IDLE\r\nACK Set"]).start()
+            assert connection.connect(os.ttyname(terminal))
+            os.write(controller, b"LED\r\n")
+            assert connection.read_line() == "ACK SetLED"
+            connection.send("GetWeight")
+            assert os.read(controller, 100) == b"GetWeight\r"
+        finally:
+            connection.disconnect()
+            os.close(controller)
+            os.close(terminal)
+
+    def test_serial_connection_lost_on_timeout(self):
+        controller, terminal = os.openpty()
+        connection = MainboardConnectionSerial()
+        try:
+            # nothing is sent, so the mainboard is not running
+            assert not connection.connect(os.ttyname(terminal))
+            assert not connection.is_connected
+        finally:
+            os.close(controller)
+            os.close(terminal)
+        with self.assertRaises(ValueError):
+            MainboardConnectionSerial(12345)
+
+    def test_serial_send_times_out(self):
+        controller, terminal = os.openpty()
+        connection = MainboardConnectionSerial()
+        try:
+            threading.Timer(0.1, os.write, [controller, b"STATUS IDLE\r\n"]).start()
+            assert connection.connect(os.ttyname(terminal))
+            # nobody reads, so the buffer of the terminal runs full
+            with self.assertRaises(TimeoutError):
+                connection.send("x" * 1000000)
+            assert not connection.is_connected
+        finally:
+            connection.disconnect()
+            os.close(controller)
+            os.close(terminal)
+
+    def test_mainboard_with_serial_emulator(self):
+        server, path = serve_pty(MainboardEmulator())
+        mainboard = Mainboard(MainboardConnectionSerial())
+        try:
+            assert mainboard.connect(path)
+            assert mainboard.firmware_version == FirmwareVersion(99, 99, 99)
+            assert mainboard.set("SetSpeed", 200).was_successfull
+            assert mainboard.get("HasGlas").return_parameters == ["1"]
+        finally:
+            mainboard.disconnect()
+            server.stop()
+
+    def test_line_reader_keeps_partial_lines(self):
+        chunks = [b"STATUS ID", b"LE\r\nACK Set", b"LED\r\nDONE Draft\r\nACK", b" Draft\r\n"]
+        reader = LineReader(chunked_recv_into(chunks), buffer_size=16)
+        assert reader.read_line() == "STATUS IDLE"
+        assert reader.read_line() == "ACK SetLED"
+        assert reader.read_line() == "DONE Draft"
+        assert reader.lines_available == 0
+        assert reader.read_line() == "ACK Draft"
+
+    def test_line_reader_grows_for_long_lines(self):
+        line = b"STATUS " + b"x" * 100 + b"\n"
+        reader = LineReader(chunked_recv_into([line[:50], line[50:]]), buffer_size=8)
+        assert reader.read_line() == line[:-1].decode()
+
+    def test_line_reader_connection_closed(self):
+        reader = LineReader(lambda buffer: 0)
+        with self.assertRaises(ConnectionError):
+            reader.read_line()
+
+    def test_reader_sorts_messages_by_type(self):
+        reader = MainboardReader(MagicMock(), None)
+        reader.put(RawResponse(ResponseTypes.STATUS, "Draft"))
+        reader.put(RawResponse(ResponseTypes.ACK, "SetLED"))
+        reader.put(RawResponse(ResponseTypes.DONE, "Draft"))
+        reader.put(RawResponse(ResponseTypes.ACK, "SetSpeed"))
+
+        message = reader.get([ResponseTypes.DONE, ResponseTypes.ERROR], timeout=0)
+        assert message.message_type == ResponseTypes.DONE
+        # oldest message of any type
+        assert reader.get(timeout=0).message_type == ResponseTypes.STATUS
+        assert reader.get(timeout=0).command == "SetLED"
+        assert reader.get(timeout=0).command == "SetSpeed"
+        assert reader.get(timeout=0).message_type == ResponseTypes.TIMEOUT
+
+    def test_reader_reports_connection_lost(self):
+        attrs = {
+            "read_line.side_effect" : ["STATUS IDLE", None],
+            "is_connected" : True
+        }
+        connection_mockup = MagicMock()
+        connection_mockup.configure_mock(**attrs)
+        mainboard = Mainboard(connection_mockup)
+        reader = MainboardReader(connection_mockup, mainboard._parse_line)
+        reader.start()
+        message = reader.get([ResponseTypes.ACK], timeout=1)
+        assert message.message_type == ResponseTypes.COMM_ERROR
+        assert reader.connection_lost
+
+    def test_reader_reports_unexpected_errors(self):
+        connection = MagicMock()
+        connection.is_connected = True
+        connection.read_line.side_effect = ["STATUS IDLE", UnicodeDecodeError("utf-8", b"", 0, 1, "")]
+        reader = MainboardReader(connection, ResponseParser().parse)
+        reader.start()
+        message = reader.get([ResponseTypes.ACK], timeout=1)
+        assert message.message_type == ResponseTypes.COMM_ERROR
+        assert reader.connection_lost
+
+    def test_line_reader_replaces_corrupt_bytes(self):
+        reader = LineReader(chunked_recv_into([b"STATUS \xff\r\nACK SetLED\r\n"]))
+        assert reader.read_line() == "STATUS \ufffd"
+        assert reader.read_line() == "ACK SetLED"
+
+    def test_mainboard_commands_with_reader(self):
+        connection_mockup = MaiboardConnectionMockup()
+        connection_mockup.duration_DO = 0.01
+        connection_mockup.duration_SET = 0.01
+        connection_mockup.duration_GET = 0.01
+        connection_mockup.status_interval = 0.01
+        mainboard = Mainboard(connection_mockup)
+        assert mainboard.connect("mainboard_mockup")
+        assert mainboard.uses_reader
+        try:
+            assert mainboard.do("Move", 100).was_successfull
+            assert mainboard.set("SetSpeed", 100).was_successfull
+            connection_mockup.set_result_for_getter("GetWeight", 123)
+            assert mainboard.get("GetWeight").return_parameters == ["123"]
+        finally:
+            mainboard.disconnect()
+        assert not mainboard.uses_reader
+
+    def test_async_mainboard(self):
+        connection_mockup = MaiboardConnectionMockup()
+        connection_mockup.duration_DO = 0.2
+        connection_mockup.duration_SET = 0.01
+        connection_mockup.duration_GET = 0.01
+        connection_mockup.status_interval = 0.01
+        mainboard = AsyncMainboard(Mainboard(connection_mockup))
+        ticks = []
+
+        async def ticker():
+            while len(ticks) < 5:
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            assert await mainboard.connect("mainboard_mockup")
+            try:
+                # other coroutines keep running while waiting for the DO command
+                do_result, _ = await asyncio.gather(mainboard.do("Move", 100), ticker())
+                assert do_result.was_successfull
+                assert len(ticks) == 5
+                assert (await mainboard.set("SetSpeed", 100)).was_successfull
+                connection_mockup.set_result_for_getter("GetWeight", 123)
+                result = await mainboard.get("GetWeight")
+                assert result.return_parameters == ["123"]
+            finally:
+                await mainboard.disconnect()
+
+        asyncio.run(run())
+        assert not mainboard.mainboard.uses_reader
+
+    def test_parser(self):
+        parser = ResponseParser()
+        assert parser.parse("ACK GetWeight 123") == RawResponse(ResponseTypes.ACK, "GetWeight", ("123",))
+        assert parser.parse("ERROR Draft 33 2") == RawResponse(ResponseTypes.ERROR, "Draft", ("33", "2"))
+        assert parser.parse("DONE Draft") == RawResponse(ResponseTypes.DONE, "Draft")
+        assert parser.parse("HELLO World").message_type == ResponseTypes.COMM_ERROR
+        assert parser.parse("ACK").message_type == ResponseTypes.COMM_ERROR
+        assert parser.parse("").message_type == ResponseTypes.COMM_ERROR
+        assert parser.parse(None).message_type == ResponseTypes.COMM_ERROR
+
+    def test_mainboard_logs_invalid_lines(self):
+        mainboard = Mainboard(MagicMock())
+        with self.assertLogs(level="DEBUG") as logs:
+            message = mainboard._parse_line("HELLO World")
+        assert message.message_type == ResponseTypes.COMM_ERROR
+        assert logs.output == ["DEBUG:root:<- 'HELLO World'"]
+
+    def test_parser_reuses_recurring_responses(self):
+        parser = ResponseParser()
+        status = parser.parse("STATUS IDLE")
+        assert status is parser.parse("STATUS IDLE")
+        assert parser.is_idle_message(status)
+        assert parser.parse("ACK IsIdle 1") is parser.parse("ACK IsIdle 1")
+        assert parser.is_idle_message(parser.parse("ACK IsIdle 1"))
+        assert parser.parse("STATUS Draft") is parser.parse("STATUS Draft")
+        assert not parser.is_idle_message(parser.parse("STATUS Draft"))
+        # values change, so they are not cached
+        assert parser.parse("ACK GetWeight 1") is not parser.parse("ACK GetWeight 1")
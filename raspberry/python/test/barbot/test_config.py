@@ -25,6 +25,14 @@ class TestConfig(unittest.TestCase):
             "straw_dispenser_connected" : ('true', True),
             "sugar_dispenser_connected" : ('true', True),
             "sugar_per_unit" : ('17', 17),
+            "idle_poll_min_interval" : ('0.5', 0.5),
+            "idle_poll_max_interval" : ('10', 10),
+            "disconnect_detection_time" : ('3.5', 3.5),
+            "upload_mixing_program" : ('true', True),
+            "serial_baud_rate" : ('57600', 57600),
+            "minimize_travel" : ('true', True),
+            "bottle_size" : ('1000', 1000),
+            "compensate_overshoot" : ('true', True),
         }
 
     def get_test_data_yaml_stream(self) -> TextIOWrapper:
@@ -0,0 +1,150 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import os
+import unittest
+from barbot.clock import VirtualClock
+from barbot.communication import ErrorType, LineReader, Mainboard
+from barbot.emulator import Fault, MainboardConnectionEmulator
+from barbot.emulator import MainboardEmulator, serve_pty
+from barbot.planner import port_position
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+class TestProtocol(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.emulator = MainboardEmulator(self.clock)
+        # the status message sent after startup
+        assert self.emulator.read_line() == "STATUS IDLE"
+
+    def send(self, line: str) -> str:
+        self.emulator.receive_line(line)
+        return self.emulator.read_line()
+
+    def test_answers(self):
+        assert self.send("GetFirmwareVersion") == "ACK GetFirmwareVersion 999999"
+        assert self.send("SetSpeed 200") == "ACK SetSpeed"
+        assert self.send("SetSpeed 0") == "NAK SetSpeed"
+        assert self.send("Unknown 1") == "NAK Unknown"
+        # not a command of the firmware, only accepted while a command is running
+        assert self.send("ABORT") == "NAK ABORT"
+        assert self.send("SetSpeed fast") == "NAK SetSpeed"
+        assert self.send("SetSpeed 200 300") == "NAK SetSpeed"
+
+    def test_blank_lines_are_ignored(self):
+        for line in ["", "\n", "  "]:
+            self.emulator.receive_line(line)
+        assert self.send("GetFirmwareVersion") == "ACK GetFirmwareVersion 999999"
+
+    def test_status_is_sent_when_nothing_else_is_sent(self):
+        start_time = self.clock.time()
+        assert self.emulator.read_line() == "STATUS IDLE"
+        self.assertAlmostEqual(self.clock.time() - start_time, 0.3, delta=0.02)
+
+    def test_commands_are_ignored_while_running(self):
+        assert self.send("Delay 1000") == "ACK Delay"
+        self.emulator.receive_line("GetWeight")
+        assert self.emulator.read_line() == "STATUS Delay"
+        lines = [self.emulator.read_line() for _ in range(3)]
+        assert lines == ["STATUS Delay", "STATUS Delay", "DONE Delay"]
+
+    def test_abort(self):
+        assert self.send("Move 500") == "ACK Move"
+        assert self.emulator.read_line() == "STATUS Move"
+        self.emulator.receive_line("ABORT")
+        # the platform decelerates before the error is sent
+        while (line := self.emulator.read_line()).startswith("STATUS"):
+            pass
+        assert line == "ERROR Move 41 0"
+        assert 0 < self.emulator.position < 500
+
+    def test_trapezoidal_move(self):
+        self.send("SetSpeed 200")
+        self.send("SetAccel 300")
+        start_time = self.clock.time()
+        assert self.send("Move 500") == "ACK Move"
+        while self.emulator.read_line() != "DONE Move":
+            pass
+        # accelerate and brake for 2/3 s each, 366.7 mm at full speed
+        self.assertAlmostEqual(self.clock.time() - start_time, 500 / 200 + 200 / 300, delta=0.05)
+        assert self.emulator.position == 500
+
+    def test_draft(self):
+        self.emulator.flow_rates[2] = 10
+        assert self.send("Draft 2 40") == "ACK Draft"
+        while self.emulator.read_line() != "DONE Draft":
+            pass
+        assert self.emulator.position == port_position(2)
+        self.assertAlmostEqual(self.emulator.content_weight, 40, delta=0.2)
+        self.assertAlmostEqual(self.emulator.bottles[2], 1000 - 40, delta=0.2)
+
+    def test_empty_bottle(self):
+        self.emulator.bottles[0] = 15
+        self.send("Draft 0 40")
+        while (line := self.emulator.read_line()).startswith("STATUS"):
+            pass
+        assert line == "ERROR Draft 33 25"
+
+    def test_glass_removed(self):
+        self.emulator.remove_glass()
+        self.send("Draft 0 40")
+        while (line := self.emulator.read_line()).startswith("STATUS"):
+            pass
+        assert line.startswith("ERROR Draft 37")
+
+    def test_faults(self):
+        self.emulator.faults.add(Fault.CRUSHER_COVER_OPEN)
+        self.send("Crush 20")
+        while (line := self.emulator.read_line()).startswith("STATUS"):
+            pass
+        assert line.startswith("ERROR Crush 39")
+        self.emulator.faults.clear()
+        self.emulator.straws_left = 0
+        self.send("Straw")
+        while (line := self.emulator.read_line()).startswith("STATUS"):
+            pass
+        assert line == "ERROR Straw 36 0"
+
+class TestMainboardWithEmulator(unittest.TestCase):
+    def test_commands(self):
+        clock = VirtualClock()
+        connection = MainboardConnectionEmulator(MainboardEmulator(clock))
+        mainboard = Mainboard(connection, clock)
+        assert mainboard.connect(connection.find_bar_bot())
+        assert mainboard.do("Draft", 1, 30).was_successfull
+        assert mainboard.get("GetWeight").return_parameters == ["380"]
+        connection.emulator.bottles[1] = 0
+        result = mainboard.do("Draft", 1, 30)
+        assert result.error == ErrorType.INGREDIENT_EMPTY
+        assert result.return_parameters == ["30"]
+
+class TestBarBotWithEmulator(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.config.pump_power_sirup = 100
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def test_mix(self):
+        recipe = create_recipe(("vodka", 4), ("saft orange", 10), ("ruehren", 0))
+        start_time = self.clock.time()
+        self.mix(recipe)
+        # every ingredient slightly overshoots its target weight
+        self.assertAlmostEqual(self.emulator.content_weight, 140, delta=2)
+        self.bot._parties.current_party.add_order.assert_called_once()
+        # drafting at 12 g/s and stirring for 3 s
+        assert self.clock.time() - start_time > 140 / 12 + 3
+
+class TestStreams(unittest.TestCase):
+    def test_pty(self):
+        emulator = MainboardEmulator()
+        server, path = serve_pty(emulator)
+        file_descriptor = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        try:
+            reader = LineReader(lambda view: os.readv(file_descriptor, [view]))
+            os.write(file_descriptor, b"GetFirmwareVersion\r")
+            while (line := reader.read_line()).startswith("STATUS"):
+                pass
+            assert line == "ACK GetFirmwareVersion 999999"
+        finally:
+            server.stop()
+            os.close(file_descriptor)
@@ -0,0 +1,133 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import threading
+import time
+import unittest
+from barbot import BarBotState, GLASS_CHECK_INTERVAL, MixingOptions, UserInputType, UserMessageType
+from barbot.clock import VirtualClock
+from barbot.communication import Mainboard
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from barbot.events import EventQueue, EventType, StateTransition, TransitionTrace
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+class TestEventQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.events = EventQueue(self.clock)
+
+    def test_events_keep_their_order(self):
+        self.events.put(EventType.ORDER, True)
+        self.clock.sleep(1)
+        self.events.put(EventType.USER_INPUT, "yes")
+        first, second = self.events.get(), self.events.get()
+        assert (first.type, first.value, first.time) == (EventType.ORDER, True, 0)
+        assert (second.type, second.value, second.time) == (EventType.USER_INPUT, "yes", 1)
+        assert len(self.events) == 0
+
+    def test_timer_event_after_timeout(self):
+        event = self.events.get(5)
+        assert event.type == EventType.TIMER
+        assert self.clock.time() == 5
+
+    def test_wake_up_events_are_merged(self):
+        for _ in range(3):
+            self.events.put(EventType.MESSAGE_RECEIVED)
+            self.events.put(EventType.ABORT)
+        assert [event.type for event in [self.events.get() for _ in range(len(self.events))]] \
+            == [EventType.MESSAGE_RECEIVED, EventType.ABORT, EventType.ABORT, EventType.ABORT]
+
+    def test_waiting_is_interrupted(self):
+        events = EventQueue()
+        threading.Timer(0.05, events.put, [EventType.ABORT]).start()
+        start_time = time.monotonic()
+        assert events.get(5).type == EventType.ABORT
+        assert time.monotonic() - start_time < 1
+
+class TestTransitionTrace(unittest.TestCase):
+    def test_only_the_last_transitions_are_kept(self):
+        trace = TransitionTrace(length=2)
+        for index in range(3):
+            trace.add(StateTransition(index, BarBotState.IDLE, BarBotState.MIXING))
+        assert trace.count == 3
+        assert [transition.time for transition in trace.transitions] == [1, 2]
+        assert trace.transitions[0].latency is None
+
+class TestBarBotEvents(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def wait_for_message(self, message: UserMessageType, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while self.bot.current_message != message:
+            assert time.monotonic() < deadline, f"Message {message} not shown"
+            time.sleep(0.01)
+
+    def test_transitions_are_traced(self):
+        self.mix(create_recipe(("vodka", 2)))
+        transitions = self.bot.transitions
+        assert [transition.target for transition in transitions] == [
+            BarBotState.STARTUP, BarBotState.IDLE, BarBotState.MIXING, BarBotState.IDLE
+        ]
+        start = transitions[2]
+        assert start.event.type == EventType.START
+        assert start.latency >= 0
+        assert transitions[3].event is None
+        times = [transition.time for transition in transitions]
+        assert times == sorted(times)
+
+    def test_abort_ends_prompt(self):
+        self.emulator.remove_glass()
+        self.bot.start_mixing(MixingOptions(create_recipe(("vodka", 2))))
+        self.wait_for_message(UserMessageType.PLACE_GLAS)
+        # nothing else can be started while mixing
+        with self.assertLogs(level="WARNING") as logs:
+            self.bot.start_crushing()
+            self.bot.abort_mixing()
+            self.wait_for_state(BarBotState.IDLE)
+        assert any("Cannot start 'CRUSHING'" in line for line in logs.output)
+        assert self.bot.transitions[-1].event.type == EventType.ABORT
+        assert "Draft" not in self.bot.command_statistics
+
+    def test_abort_right_after_start_is_not_lost(self):
+        self.emulator.remove_glass()
+        with self.assertLogs(level="WARNING"):
+            self.bot.start_mixing(MixingOptions(create_recipe(("vodka", 2))))
+            self.bot.abort_mixing()
+            deadline = time.monotonic() + 5
+            while not any(transition.event is not None and transition.event.type == EventType.ABORT
+                          for transition in self.bot.transitions):
+                assert time.monotonic() < deadline, "Abort was lost"
+                time.sleep(0.01)
+        assert self.bot.transitions[-1].target == BarBotState.IDLE
+        assert "Draft" not in self.bot.command_statistics
+
+    def request_rate(self, duration: float) -> float:
+        """Measure the requests per second sent to the mainboard,
+        while at least the given virtual time passes"""
+        def requests():
+            return sum(statistics.calls for statistics in self.bot.command_statistics.values())
+        start_requests, start_time = requests(), self.clock.time()
+        deadline = time.monotonic() + 5
+        while self.clock.time() < start_time + duration:
+            assert time.monotonic() < deadline, "Virtual time does not advance"
+            time.sleep(0.001)
+        return (requests() - start_requests) / (self.clock.time() - start_time)
+
+    def test_glass_is_polled_with_bounded_rate(self):
+        self.emulator.remove_glass()
+        finished = threading.Event()
+        self.bot.on_mixing_finished = lambda _: finished.set()
+        self.bot.start_mixing(MixingOptions(create_recipe(("vodka", 2))))
+        self.wait_for_message(UserMessageType.PLACE_GLAS)
+        assert self.request_rate(60) <= 1.1 / GLASS_CHECK_INTERVAL
+        self.emulator.place_glass()
+        assert finished.wait(5)
+
+    def test_no_requests_while_waiting_for_user(self):
+        self.bot.start_cleaning(0)
+        self.wait_for_message(UserMessageType.CLEANING_ADAPTER)
+        assert self.request_rate(60) == 0
+        self.bot.set_user_input(UserInputType.NO)
+        self.wait_for_state(BarBotState.IDLE)
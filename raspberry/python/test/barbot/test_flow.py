@@ -0,0 +1,86 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import unittest
+from io import StringIO
+from barbot.communication import Mainboard
+from barbot.config import IngredientType, get_ingredient_by_identifier
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from barbot.flow import FlowRateModel
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+class TestFlowRateModel(unittest.TestCase):
+    def setUp(self):
+        self.model = FlowRateModel(load_on_init=False)
+
+    def add_drafts(self, *rates: float, port: int = 0):
+        return [self.model.add_draft(port, IngredientType.SPIRIT, 40, 40 / rate) for rate in rates]
+
+    def test_rate(self):
+        self.assertIsNone(self.model.rate(0, IngredientType.SPIRIT))
+        self.add_drafts(10, 12, 11)
+        self.assertAlmostEqual(self.model.rate(0, IngredientType.SPIRIT), 11)
+        self.assertAlmostEqual(self.model.draft_duration(0, IngredientType.SPIRIT, 22), 2)
+        # the rate is learned per ingredient type
+        self.assertIsNone(self.model.rate(0, IngredientType.SIRUP))
+        # durations that could not be measured are ignored
+        self.assertIsNone(self.model.add_draft(0, IngredientType.SPIRIT, 40, 0))
+
+    def test_outliers_are_ignored(self):
+        self.add_drafts(10, 10.5, 9.5, 10, 30, 5)
+        self.assertAlmostEqual(self.model.rate(0, IngredientType.SPIRIT), 10)
+        self.assertEqual(self.model.alerts, [])
+
+    def test_alert_when_flow_drops(self):
+        self.add_drafts(10, 10.5, 9.5, 10)
+        alerts = self.add_drafts(4, 4, 4)
+        self.assertIsNone(alerts[0])
+        self.assertEqual(alerts[1].port, 0)
+        self.assertAlmostEqual(alerts[1].usual_rate, 10)
+        self.assertAlmostEqual(alerts[1].current_rate, 4)
+        # the alert is raised only once
+        self.assertIsNone(alerts[2])
+        self.assertEqual(len(self.model.alerts), 1)
+        # the port was cleaned, the rate is learned again
+        self.model.clear_alert(0)
+        self.assertEqual(self.model.alerts, [])
+        self.assertIsNone(self.model.rate(0, IngredientType.SPIRIT))
+
+    def test_save_and_load(self):
+        self.add_drafts(10, 12)
+        self.model.add_draft(3, IngredientType.SIRUP, 20, 4)
+        stream = StringIO()
+        self.assertTrue(self.model.save(stream))
+        stream.seek(0)
+        loaded = FlowRateModel(load_on_init=False)
+        self.assertTrue(loaded.load(stream))
+        self.assertAlmostEqual(loaded.rate(0, IngredientType.SPIRIT), 11)
+        self.assertAlmostEqual(loaded.rate(3, IngredientType.SIRUP), 5)
+
+class TestBarBotFlowRate(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def test_flow_rate_is_learned(self):
+        alerts = []
+        self.bot.on_flow_alert = alerts.append
+        recipe = create_recipe(("saft orange", 10), ("vodka", 4))
+        for _ in range(3):
+            self.mix(recipe)
+        # the emulator pumps 12 g/s, the travel of the platform is not included
+        self.assertAlmostEqual(self.bot.flow_model.rate(0, IngredientType.SPIRIT), 12, delta=1)
+        self.assertAlmostEqual(self.bot.flow_model.rate(1, IngredientType.JUICE), 12, delta=1)
+        # the hose of the vodka is clogged
+        self.emulator.flow_rates[0] = 7
+        for _ in range(2):
+            self.mix(recipe)
+        self.assertEqual([alert.port for alert in alerts], [0])
+
+    def test_continued_draft_is_measured_without_travel(self):
+        self.ports.update({11: get_ingredient_by_identifier("vodka")})
+        # the bottle at port 0 runs empty after 10 g, the rest is drafted at port 11
+        self.emulator.bottles[0] = 10
+        self.mix(create_recipe(("vodka", 4)))
+        self.assertEqual(self.bot.empty_ports, {0})
+        self.assertAlmostEqual(self.bot.flow_model.rate(11, IngredientType.SPIRIT), 12, delta=1)
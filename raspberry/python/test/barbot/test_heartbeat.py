@@ -0,0 +1,91 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from barbot import BarBot, BarBotState
+from barbot.communication import Mainboard
+from barbot.config import PortConfiguration
+from barbot.heartbeat import IdleHeartbeat
+from test.barbot.test_barbot import create_config, create_connection_mockup
+
+class TestHeartbeat(unittest.TestCase):
+    def test_interval_backs_off(self):
+        heartbeat = IdleHeartbeat(0.1, 1)
+        intervals = []
+        for _ in range(6):
+            intervals.append(heartbeat.interval)
+            heartbeat.poll_done()
+        assert intervals == [0.1, 0.2, 0.4, 0.8, 1, 1]
+        assert not heartbeat.is_poll_due
+
+    def test_activity_resets_interval(self):
+        heartbeat = IdleHeartbeat(0.01, 10)
+        for _ in range(5):
+            heartbeat.poll_done()
+        assert heartbeat.interval == 0.32
+        heartbeat.notify_activity()
+        assert heartbeat.interval == 0.01
+        time.sleep(0.01)
+        assert heartbeat.is_poll_due
+
+    def test_wait_is_interrupted(self):
+        heartbeat = IdleHeartbeat(10, 10)
+        heartbeat.poll_done()
+        threading.Timer(0.05, heartbeat.wake).start()
+        start_time = time.monotonic()
+        heartbeat.wait(5)
+        assert time.monotonic() - start_time < 1
+
+    def test_async_wait_is_interrupted(self):
+        heartbeat = IdleHeartbeat(10, 10)
+        heartbeat.poll_done()
+        async def wait():
+            start_time = time.monotonic()
+            await heartbeat.wait_async(5)
+            return time.monotonic() - start_time
+        threading.Timer(0.05, heartbeat.notify_activity).start()
+        assert asyncio.run(wait()) < 1
+
+    def test_metrics(self):
+        heartbeat = IdleHeartbeat(0.1, 1)
+        heartbeat.poll_done()
+        heartbeat.poll_done()
+        heartbeat.add_idle_time(1.8, 0.009)
+        heartbeat.add_idle_time(1.8, 0.009)
+        metrics = heartbeat.metrics
+        assert metrics.polls == 2
+        assert metrics.polls_per_hour == 2000
+        assert abs(metrics.idle_cpu_load - 0.005) < 1e-9
+        # the snapshot does not change
+        heartbeat.poll_done()
+        assert metrics.polls == 2
+
+    def test_barbot_polls_less_while_idle(self):
+        connection = create_connection_mockup()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = create_config(directory.name)
+        config.idle_poll_max_interval = 0.4
+        ports = PortConfiguration(load_on_init=False, directory=directory.name)
+        bot = BarBot(config, ports, Mainboard(connection), directory=directory.name)
+        bot_thread = threading.Thread(target=bot.run, daemon=True)
+        bot_thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while bot.state != BarBotState.IDLE:
+                assert time.monotonic() < deadline, f"BarBot stuck in state {bot.state}"
+                time.sleep(0.01)
+            connection.clear_command_history()
+            time.sleep(2)
+            polls = connection.command_history.count("IsIdle")
+            metrics = bot.idle_metrics
+        finally:
+            bot.abort()
+            bot_thread.join(2)
+        # polling every 100 ms would have sent 20 requests
+        assert 0 < polls <= 8
+        assert metrics.polls > 0
+        assert metrics.poll_interval == 0.4
+        assert metrics.idle_time > 1
@@ -0,0 +1,99 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import threading
+import unittest
+from io import StringIO
+from barbot import UserInputType, UserMessageType
+from barbot.communication import ErrorType
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.inventory import PortInventory
+from barbot.program import compile_mixing
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+def create_ports() -> PortConfiguration:
+    ports = PortConfiguration(load_on_init=False)
+    ports.update({
+        0: get_ingredient_by_identifier("vodka"),
+        1: get_ingredient_by_identifier("saft orange"),
+        4: get_ingredient_by_identifier("vodka"),
+    })
+    return ports
+
+class TestPortInventory(unittest.TestCase):
+    def setUp(self):
+        self.inventory = PortInventory(load_on_init=False)
+        self.ports = create_ports()
+        self.program = compile_mixing(
+            create_recipe(("vodka", 4), ("saft orange", 10)).items,
+            self.ports, BarBotConfig(load_on_init=False)
+        )
+
+    def test_drafted(self):
+        self.inventory.set_level(0, 100)
+        self.inventory.drafted(0, 40)
+        self.inventory.drafted(1, 40)
+        self.assertEqual(self.inventory.level(0), 60)
+        # unknown levels stay unknown
+        self.assertIsNone(self.inventory.level(1))
+        self.inventory.drafted(0, 100)
+        self.assertEqual(self.inventory.level(0), 0)
+
+    def test_missing_ingredients(self):
+        vodka = get_ingredient_by_identifier("vodka")
+        orange = get_ingredient_by_identifier("saft orange")
+        # unknown levels are assumed to be sufficient
+        self.assertEqual(self.inventory.missing_ingredients(self.program, self.ports), [])
+        self.inventory.set_level(0, 30)
+        self.inventory.set_level(1, 99)
+        self.inventory.set_level(4, 0)
+        self.assertEqual(self.inventory.missing_ingredients(self.program, self.ports),
+                         [vodka, orange])
+        # the bottles of an ingredient are added up
+        self.inventory.set_level(4, 10)
+        self.assertEqual(self.inventory.available(vodka, self.ports), 40)
+        self.assertEqual(self.inventory.missing_ingredients(self.program, self.ports), [orange])
+        # empty ports do not count
+        self.assertEqual(self.inventory.missing_ingredients(self.program, self.ports, {4}),
+                         [vodka, orange])
+
+    def test_save_and_load(self):
+        self.inventory.set_level(0, 250)
+        self.inventory.set_level(4, 12.5)
+        stream = StringIO()
+        self.assertTrue(self.inventory.save(stream))
+        stream.seek(0)
+        loaded = PortInventory(load_on_init=False)
+        self.assertTrue(loaded.load(stream))
+        self.assertEqual(loaded.levels, {0: 250, 4: 12.5})
+
+class TestBarBotInventory(BarBotTestCase):
+    def answer_message(self, message_type: UserMessageType, messages: list):
+        """Answer with yes once the message is shown"""
+        def answer(message):
+            messages.append(message)
+            if message == message_type:
+                threading.Timer(0.1, self.bot.set_user_input, [UserInputType.YES]).start()
+        self.bot.on_message_changed = answer
+
+    def test_levels_decrease_while_mixing(self):
+        self.change_bottles([0, 1])
+        self.assertEqual(self.bot.inventory.levels, {0: 700, 1: 700})
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        self.assertEqual(self.bot.inventory.levels, {0: 660, 1: 600})
+
+    def test_ask_before_mixing_with_low_level(self):
+        self.bot.inventory.set_level(0, 30)
+        recipe = create_recipe(("vodka", 4))
+        self.assertEqual(self.bot.missing_ingredients(recipe),
+                         [get_ingredient_by_identifier("vodka")])
+        messages = []
+        self.answer_message(UserMessageType.INGREDIENTS_RUNNING_LOW, messages)
+        self.mix(recipe)
+        self.assertIn(UserMessageType.INGREDIENTS_RUNNING_LOW, messages)
+        self.assertEqual(self.bot.inventory.level(0), 0)
+
+    def test_refilled_bottle_is_full(self):
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 25)
+        self.answer_message(UserMessageType.INGREDIENT_EMPTY, [])
+        self.mix(create_recipe(("vodka", 4)))
+        # the new bottle was used for what was missing
+        self.assertEqual(self.bot.inventory.level(0), 700 - 25)
@@ -0,0 +1,62 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import unittest
+from datetime import datetime
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.layout import LayoutOptimizer, co_occurrence, ordered_drinks
+from barbot.planner import port_position
+from barbot.recipes import Order, OrderItem, Party
+
+def create_party(*drinks) -> Party:
+    """Party with the given drinks, each is a tuple of the number of orders and the items"""
+    party = Party(datetime(2024, 1, 1))
+    for count, items in drinks:
+        for _ in range(count):
+            party.orders.append(Order("Test", datetime(2024, 1, 1),
+                [OrderItem(amount, identifier) for identifier, amount in items]))
+    return party
+
+class TestLayoutOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.config = BarBotConfig(load_on_init=False)
+        self.ports = PortConfiguration(load_on_init=False)
+        self.ports.update({
+            0: get_ingredient_by_identifier("rum weiss"),
+            5: get_ingredient_by_identifier("saft orange"),
+            6: get_ingredient_by_identifier("sirup grenadine"),
+            11: get_ingredient_by_identifier("vodka"),
+        })
+        self.parties = [
+            create_party(
+                (10, [("vodka", 4), ("saft orange", 10)]),
+                (1, [("rum weiss", 4), ("sirup grenadine", 2), ("ruehren", 0)]),
+            ),
+            create_party((2, [("vodka", 4), ("saft orange", 10)])),
+        ]
+        self.drinks = ordered_drinks(self.parties)
+
+    def test_ordered_drinks(self):
+        counts = sorted(count for _, count in self.drinks)
+        assert counts == [1, 12]
+        pairs = co_occurrence(self.drinks)
+        assert pairs[("saft orange", "vodka")] == pairs[("vodka", "saft orange")] == 12
+        # stirring is not connected to a port
+        assert ("ruehren", "rum weiss") not in pairs
+
+    def test_popular_drinks_are_near_the_start(self):
+        optimizer = LayoutOptimizer(self.drinks, self.config)
+        proposal = optimizer.propose(self.ports)
+        assert proposal.is_improvement
+        positions = {ingredient.identifier: port_position(port)
+                     for port, ingredient in proposal.ports.items() if ingredient is not None}
+        # the same ingredients are connected, just at other ports
+        assert sorted(positions) == ["rum weiss", "saft orange", "sirup grenadine", "vodka"]
+        assert max(positions["vodka"], positions["saft orange"]) <= port_position(1)
+        # the preview matches the time of the applied layout
+        self.ports.update(proposal.ports)
+        self.assertAlmostEqual(optimizer.expected_time(self.ports), proposal.proposed_time)
+        assert optimizer.propose(self.ports).saved_time == 0
+
+    def test_no_history(self):
+        proposal = LayoutOptimizer([], self.config).propose(self.ports)
+        assert not proposal.is_improvement
+        assert proposal.ports[11].identifier == "vodka"
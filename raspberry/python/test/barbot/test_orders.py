@@ -0,0 +1,144 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import os
+import tempfile
+import threading
+import time
+import unittest
+from barbot import BarBotState, MixingOptions, UserInputType, UserMessageType
+from barbot.clock import VirtualClock
+from barbot.communication import ErrorType
+from barbot.orders import DEFAULT_DRINK_DURATION, OrderQueue
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+class TestOrderQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.filepath = os.path.join(tempfile.mkdtemp(), "queue.yaml")
+        self.queue = OrderQueue(self.filepath, self.clock)
+        self.recipes = [create_recipe(("vodka", 2)) for _ in range(3)]
+        for index, recipe in enumerate(self.recipes):
+            recipe.name = f"Test {index}"
+
+    def enqueue_all(self):
+        return [self.queue.enqueue(recipe) for recipe in self.recipes]
+
+    def names(self, queue: OrderQueue = None):
+        return [order.recipe.name for order in (queue or self.queue).orders]
+
+    def test_first_in_first_out(self):
+        self.enqueue_all()
+        assert self.queue.pop().recipe.name == "Test 0"
+        assert self.queue.pop().recipe.name == "Test 1"
+        assert len(self.queue) == 1
+
+    def test_cancel_and_move(self):
+        orders = self.enqueue_all()
+        assert self.queue.move(orders[2].order_id, 0)
+        assert self.names() == ["Test 2", "Test 0", "Test 1"]
+        # the position is limited to the queue
+        assert self.queue.move(orders[2].order_id, 10)
+        assert self.names() == ["Test 0", "Test 1", "Test 2"]
+        assert self.queue.cancel(orders[1].order_id)
+        assert not self.queue.cancel(orders[1].order_id)
+        assert not self.queue.move(orders[1].order_id, 0)
+        assert self.names() == ["Test 0", "Test 2"]
+
+    def test_persistence(self):
+        orders = self.enqueue_all()
+        self.queue.cancel(orders[0].order_id)
+        loaded = OrderQueue(self.filepath, self.clock)
+        loaded.load()
+        assert self.names(loaded) == ["Test 1", "Test 2"]
+        assert loaded.orders[0].recipe.equal_to(self.recipes[1])
+        # ids stay unique after loading
+        assert loaded.enqueue(self.recipes[0]).order_id > orders[2].order_id
+
+    def test_etas(self):
+        self.enqueue_all()
+        assert [eta for _, eta in self.queue.etas()] == \
+            [DEFAULT_DRINK_DURATION * (i + 1) for i in range(3)]
+        for _ in range(2):
+            self.queue.pop()
+            self.queue.drink_started()
+            self.clock.sleep(30)
+            self.queue.drink_finished(was_mixed=True)
+        self.queue.drink_started()
+        self.clock.sleep(10)
+        # 20 s left of the running drink
+        assert [eta for _, eta in self.queue.etas()] == [50]
+
+    def test_metrics(self):
+        self.enqueue_all()
+        for was_mixed in [True, False, True]:
+            self.clock.sleep(60)
+            self.queue.pop()
+            self.queue.drink_started()
+            self.clock.sleep(120)
+            self.queue.drink_finished(was_mixed)
+        metrics = self.queue.metrics
+        assert metrics.queued == 0
+        assert metrics.drinks_mixed == 2
+        assert metrics.average_drink_duration == 120
+        # the orders waited 60, 240 and 420 s
+        assert metrics.average_waiting_time == 240
+        # two drinks within 8 minutes since the first one was started
+        self.assertAlmostEqual(metrics.drinks_per_hour, 2 * 60 / 8)
+        self.clock.sleep(3601)
+        assert self.queue.metrics.drinks_per_hour == 0
+
+class TestBarBotOrders(BarBotTestCase):
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "Condition not met"
+            time.sleep(0.01)
+
+    def test_next_order_starts_after_glass_was_removed(self):
+        finished = []
+        mixed = threading.Event()
+        def on_mixing_finished(recipe):
+            finished.append(recipe.name)
+            mixed.set()
+        self.bot.on_mixing_finished = on_mixing_finished
+        first, second = create_recipe(("vodka", 2)), create_recipe(("saft orange", 4))
+        first.name, second.name = "First", "Second"
+        self.bot.enqueue_order(MixingOptions(first))
+        self.bot.enqueue_order(MixingOptions(second))
+        assert mixed.wait(10)
+        mixed.clear()
+        self.wait_for_state(BarBotState.IDLE)
+        # the glas of the first drink is still there
+        self.wait_for(lambda: self.clock.time() > 60)
+        assert self.bot.state == BarBotState.IDLE
+        assert [order.recipe.name for order in self.bot.orders] == ["Second"]
+        self.connection.set_result_for_getter("HasGlas", 0)
+        self.wait_for_state(BarBotState.MIXING)
+        assert len(self.bot.orders) == 0
+        self.connection.set_result_for_getter("HasGlas", 1)
+        assert mixed.wait(10)
+        assert finished == ["First", "Second"]
+        assert self.bot.order_metrics.drinks_mixed == 2
+
+    def test_order_is_started_right_away_if_idle(self):
+        changes = []
+        mixed = threading.Event()
+        # queued and started
+        self.bot.on_orders_changed = lambda: changes.append(True)
+        self.bot.on_mixing_finished = lambda _: mixed.set()
+        self.bot.enqueue_order(MixingOptions(create_recipe(("vodka", 2))))
+        assert mixed.wait(10)
+        assert len(changes) == 2
+
+    def test_incomplete_drink_is_not_counted(self):
+        self.connection.set_error_for_command("Draft", ErrorType.GLAS_REMOVED.value)
+        def answer(message):
+            if message == UserMessageType.GLAS_REMOVED_WHILE_DRAFTING:
+                threading.Timer(0.1, self.bot.set_user_input, [UserInputType.YES]).start()
+        self.bot.on_message_changed = answer
+        mixed = threading.Event()
+        self.bot.on_mixing_finished = lambda _: mixed.set()
+        self.bot.enqueue_order(MixingOptions(create_recipe(("vodka", 2))))
+        assert mixed.wait(10)
+        self.wait_for_state(BarBotState.IDLE)
+        assert self.bot.order_metrics.drinks_mixed == 0
+        assert self.bot.order_metrics.average_drink_duration is None
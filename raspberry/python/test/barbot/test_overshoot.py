@@ -0,0 +1,89 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import unittest
+from io import StringIO
+from barbot.communication import Mainboard
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from barbot.overshoot import OvershootModel
+from barbot.program import UploadProgramExecutor
+from test.barbot.test_barbot import BarBotTestCase, create_connection_mockup, create_recipe
+from test.barbot.test_program import create_program
+
+class TestOvershootModel(unittest.TestCase):
+    def setUp(self):
+        self.model = OvershootModel(load_on_init=False)
+
+    def test_target_weight(self):
+        self.assertEqual(self.model.target_weight(0, 40), 40)
+        self.model.add_draft(0, 40, 40, 44)
+        self.model.add_draft(0, 40, 36, 41)
+        self.model.add_draft(0, 40, 35, 40)
+        self.assertEqual(self.model.overshoot(0), 5)
+        self.assertEqual(self.model.target_weight(0, 40), 35)
+        # small drafts still draft something
+        self.assertEqual(self.model.target_weight(0, 3), 1)
+        # other ports are not compensated
+        self.assertEqual(self.model.target_weight(1, 40), 40)
+
+    def test_disturbed_drafts_are_ignored(self):
+        self.model.add_draft(0, 20, 20, 60)
+        self.assertEqual(self.model.overshoot(0), 0)
+        self.assertIsNone(self.model.accuracy(0))
+
+    def test_accuracy(self):
+        self.model.add_draft(0, 40, 40, 44)
+        self.model.add_draft(0, 40, 36, 38)
+        accuracy = self.model.accuracy(0)
+        self.assertEqual(accuracy.drafts, 2)
+        self.assertAlmostEqual(accuracy.mean_error, 1)
+        self.assertAlmostEqual(accuracy.mean_absolute_error, 3)
+        self.assertEqual(self.model.ports, [0])
+
+    def test_save_and_load(self):
+        self.model.add_draft(2, 40, 40, 43)
+        stream = StringIO()
+        self.assertTrue(self.model.save(stream))
+        stream.seek(0)
+        loaded = OvershootModel(load_on_init=False)
+        self.assertTrue(loaded.load(stream))
+        self.assertEqual(loaded.overshoot(2), 3)
+        self.assertEqual(loaded.accuracy(2).drafts, 1)
+
+class TestUploadCompensation(unittest.TestCase):
+    def test_drafts_are_compensated(self):
+        model = OvershootModel(load_on_init=False)
+        model.add_draft(0, 40, 40, 44)
+        connection = create_connection_mockup()
+        sent_lines = []
+        send = connection.send
+        def record_and_send(line):
+            sent_lines.append(line)
+            send(line)
+        connection.send = record_and_send
+        executor = UploadProgramExecutor(Mainboard(connection), overshoot=model)
+        self.assertTrue(executor.execute(create_program()).was_successfull)
+        program_line = [line for line in sent_lines if line.startswith("Program")][0]
+        self.assertIn("D0:36:", program_line)
+        # the resumed amount is compensated as well
+        sent_lines.clear()
+        self.assertTrue(executor.execute(create_program(), 0, 10).was_successfull)
+        program_line = [line for line in sent_lines if line.startswith("Program")][0]
+        self.assertIn("D0:6:", program_line)
+
+class TestBarBotOvershoot(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        self.emulator.hose_overshoot[0] = 5
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.config.compensate_overshoot = True
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def test_overshoot_is_compensated(self):
+        recipe = create_recipe(("vodka", 4), ("saft orange", 10))
+        self.mix(recipe)
+        # the first drink overshoots
+        self.assertAlmostEqual(self.emulator.content_weight, 145, delta=2)
+        self.assertAlmostEqual(self.bot.overshoot_model.overshoot(0), 5, delta=1.5)
+        weight_before = self.emulator.content_weight
+        self.mix(recipe)
+        self.assertAlmostEqual(self.emulator.content_weight - weight_before, 140, delta=2)
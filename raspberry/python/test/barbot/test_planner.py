@@ -0,0 +1,91 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import threading
+import unittest
+from barbot import BarBotState, MixingOptions
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.planner import MotionModel, item_position, plan_items, port_position, travel_time
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+def identifiers(items):
+    return [item.ingredient.identifier for item in items]
+
+class TestMotionModel(unittest.TestCase):
+    def test_move_time(self):
+        motion = MotionModel(max_speed=200, max_accel=400)
+        # accelerating and braking takes 0.5 s each and covers 100 mm
+        self.assertAlmostEqual(motion.move_time(0, 100), 1)
+        self.assertAlmostEqual(motion.move_time(600, 100), 0.5 + 400 / 200 + 0.5)
+        # the maximum speed is not reached
+        self.assertAlmostEqual(motion.move_time(0, 25), 0.5)
+        assert motion.move_time(100, 100) == 0
+
+class TestPlanItems(unittest.TestCase):
+    def setUp(self):
+        self.config = BarBotConfig(load_on_init=False)
+        self.ports = PortConfiguration(load_on_init=False)
+        self.ports.update({
+            0: get_ingredient_by_identifier("vodka"),
+            5: get_ingredient_by_identifier("saft orange"),
+            11: get_ingredient_by_identifier("sirup grenadine"),
+            3: get_ingredient_by_identifier("rum weiss"),
+        })
+
+    def test_sorted_by_position(self):
+        recipe = create_recipe(("sirup grenadine", 2), ("vodka", 4), ("saft orange", 10),
+                               ("rum weiss", 2))
+        planned = plan_items(recipe.items, self.ports, self.config)
+        assert identifiers(planned) == ["vodka", "rum weiss", "saft orange", "sirup grenadine"]
+        motion = MotionModel.from_config(self.config)
+        assert travel_time(planned, self.ports, motion) \
+            < travel_time(recipe.items, self.ports, motion)
+
+    def test_barriers_stay_in_place(self):
+        recipe = create_recipe(("sirup grenadine", 2), ("vodka", 4), ("ruehren", 0),
+                               ("saft orange", 10), ("rum weiss", 2), ("zucker", 1))
+        planned = plan_items(recipe.items, self.ports, self.config)
+        # the section before stirring ends at the mixing position, so the far port is last
+        assert identifiers(planned) == \
+            ["vodka", "sirup grenadine", "ruehren", "saft orange", "rum weiss", "zucker"]
+
+    def test_order_is_kept_if_not_faster(self):
+        recipe = create_recipe(("vodka", 4), ("rum weiss", 2))
+        planned = plan_items(recipe.items, self.ports, self.config)
+        assert identifiers(planned) == ["vodka", "rum weiss"]
+        # the same port twice in a row
+        recipe = create_recipe(("saft orange", 4), ("saft orange", 2))
+        assert plan_items(recipe.items, self.ports, self.config)[0].amount == 4
+
+    def test_nearest_of_several_ports(self):
+        self.ports.update({10: get_ingredient_by_identifier("vodka")})
+        vodka = create_recipe(("vodka", 4)).items[0]
+        assert item_position(vodka, self.ports) == port_position(0)
+        assert item_position(vodka, self.ports, port_position(11)) == port_position(10)
+        # after the far port the platform does not go back to the first bottle
+        recipe = create_recipe(("sirup grenadine", 2), ("vodka", 4))
+        motion = MotionModel.from_config(self.config)
+        assert travel_time(recipe.items, self.ports, motion) == \
+            motion.move_time(0, port_position(11)) \
+            + motion.move_time(port_position(11), port_position(10)) \
+            + motion.move_time(port_position(10), 0)
+
+class TestBarBotPlanner(BarBotTestCase):
+    def mixed_items(self, recipe):
+        """Mix the recipe and get the items in the order they were mixed"""
+        mixed = []
+        finished = threading.Event()
+        def on_mixing_finished(mixed_recipe):
+            mixed.append(mixed_recipe)
+            finished.set()
+        self.bot.on_mixing_finished = on_mixing_finished
+        self.bot.start_mixing(MixingOptions(recipe))
+        assert finished.wait(10), "Mixing did not finish"
+        self.wait_for_state(BarBotState.IDLE)
+        return identifiers(mixed[0].items)
+
+    def test_planned_when_enabled(self):
+        recipe = create_recipe(("rum weiss", 2), ("vodka", 4), ("ruehren", 0))
+        assert self.mixed_items(recipe) == ["rum weiss", "vodka", "ruehren"]
+        self.config.minimize_travel = True
+        assert self.mixed_items(recipe) == ["vodka", "rum weiss", "ruehren"]
+        recipe.keep_order = True
+        assert self.mixed_items(recipe) == ["rum weiss", "vodka", "ruehren"]
@@ -0,0 +1,210 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import threading
+import unittest
+from barbot import UserInputType, UserMessageType
+from barbot.communication import ErrorType, Mainboard
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.overshoot import OvershootModel
+from barbot.program import StepType, StepwiseProgramExecutor, UploadProgramExecutor
+from barbot.program import ProgramResult, compile_mixing
+from test.barbot.test_barbot import BarBotTestCase, create_connection_mockup, create_recipe
+
+def create_ports() -> PortConfiguration:
+    ports = PortConfiguration(load_on_init=False)
+    ports.update({
+        0: get_ingredient_by_identifier("vodka"),
+        2: get_ingredient_by_identifier("sirup grenadine"),
+    })
+    return ports
+
+def create_program(add_ice=False, add_straw=False):
+    config = BarBotConfig(load_on_init=False)
+    recipe = create_recipe(("vodka", 4), ("sirup grenadine", 2), ("ruehren", 0), ("zucker", 2))
+    return compile_mixing(recipe.items, create_ports(), config, add_ice, add_straw)
+
+class TestCompileMixing(unittest.TestCase):
+    def test_steps(self):
+        program = create_program(add_ice=True, add_straw=True)
+        self.assertEqual(
+            [step.type for step in program.steps],
+            [StepType.DRAFT, StepType.DRAFT, StepType.STIR, StepType.SUGAR,
+             StepType.CRUSH, StepType.MOVE, StepType.STRAW]
+        )
+        config = BarBotConfig(load_on_init=False)
+        self.assertEqual(program.encode(), (
+            f"D0:40:{config.pump_power}",
+            f"D2:20:{config.pump_power_sirup}",
+            f"M{int(config.stirring_time / 1000)}",
+            f"S{2 * config.sugar_per_unit}",
+            f"C{config.ice_amount}",
+            "P0",
+            "T"
+        ))
+
+    def test_resume_with_remaining_amount(self):
+        program = create_program()
+        self.assertEqual(program.encode(1, 5)[0], f"D2:5:{BarBotConfig.pump_power_sirup}")
+        self.assertEqual(len(program.encode(1, 5)), len(program) - 1)
+
+    def test_moves_do_not_count_as_progress(self):
+        program = create_program(add_ice=True, add_straw=True)
+        self.assertEqual(program.progress_before(len(program)), len(program) - 1)
+
+    def test_drafted(self):
+        program = create_program()
+        self.assertEqual(program.drafted(0, None, ProgramResult(step_index=len(program))),
+                         [(0, 40), (2, 20)])
+        # the second draft failed with 5 g missing, it was resumed with 12 g
+        failed = ProgramResult(ErrorType.INGREDIENT_EMPTY, 1, 5)
+        self.assertEqual(program.drafted(0, None, failed), [(0, 40), (2, 15)])
+        self.assertEqual(program.drafted(1, 12, ProgramResult(step_index=len(program))),
+                         [(2, 12)])
+
+    def test_nearest_of_several_ports(self):
+        config = BarBotConfig(load_on_init=False)
+        ports = create_ports()
+        ports.update({8: get_ingredient_by_identifier("vodka")})
+        self.assertEqual(ports.ports_of_ingredient(get_ingredient_by_identifier("vodka")), [0, 8])
+        # the platform starts next to port 0, stirring is next to the last port
+        recipe = create_recipe(("vodka", 4), ("ruehren", 0), ("vodka", 2))
+        program = compile_mixing(recipe.items, ports, config)
+        self.assertEqual([step.port for step in program.steps[:3]], [0, None, 8])
+        # empty ports are only used if there is no other
+        program = compile_mixing(recipe.items, ports, config, empty_ports={8})
+        self.assertEqual([step.port for step in program.steps[:3]], [0, None, 0])
+        # the fullest port is used if the fill levels are known
+        program = compile_mixing(recipe.items, ports, config, port_levels={0: 100, 8: 500})
+        self.assertEqual([step.port for step in program.steps[:3]], [8, None, 8])
+
+class TestProgramExecutors(unittest.TestCase):
+    def execute(self, executor_class, program, start_step=0, start_amount=None):
+        self.connection = create_connection_mockup()
+        started_steps = []
+        executor = executor_class(Mainboard(self.connection), started_steps.append)
+        return executor.execute(program, start_step, start_amount), started_steps
+
+    def test_stepwise(self):
+        program = create_program()
+        result, started_steps = self.execute(StepwiseProgramExecutor, program)
+        self.assertTrue(result.was_successfull)
+        self.assertEqual(result.step_index, len(program))
+        self.assertEqual(started_steps, list(range(len(program))))
+        self.assertEqual(self.connection.command_history.count("Draft"), 2)
+
+    def test_upload(self):
+        program = create_program()
+        result, started_steps = self.execute(UploadProgramExecutor, program)
+        self.assertTrue(result.was_successfull)
+        self.assertEqual(result.step_index, len(program))
+        self.assertEqual(started_steps, list(range(len(program))))
+        # the whole program is sent as one command
+        self.assertEqual(self.connection.command_history, ["Program"])
+
+    def test_ingredient_empty_is_reported_for_the_step(self):
+        program = create_program()
+        for executor_class in [StepwiseProgramExecutor, UploadProgramExecutor]:
+            self.connection = create_connection_mockup()
+            self.connection.set_error_for_command("Sugar", ErrorType.INGREDIENT_EMPTY.value, 3)
+            executor = executor_class(Mainboard(self.connection))
+            result = executor.execute(program)
+            self.assertEqual(result.error, ErrorType.INGREDIENT_EMPTY)
+            self.assertEqual(result.step_index, 3)
+            self.assertEqual(result.remaining, 3)
+            # resuming only executes what is left
+            self.connection.clear_command_history()
+            result = executor.execute(program, result.step_index, result.remaining)
+            self.assertTrue(result.was_successfull)
+            self.assertNotIn("Draft", self.connection.command_history)
+
+    def test_remaining_weight_of_compensated_draft(self):
+        overshoot = OvershootModel(load_on_init=False)
+        overshoot.add_draft(0, 40, 40, 44)
+        program = create_program()
+        for executor_class in [StepwiseProgramExecutor, UploadProgramExecutor]:
+            self.connection = create_connection_mockup()
+            self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 10)
+            executor = executor_class(Mainboard(self.connection), overshoot=overshoot)
+            result = executor.execute(program)
+            # 36 g were sent, so 26 g of the 40 g are in the glas
+            self.assertEqual((result.step_index, result.remaining), (0, 14))
+            self.assertEqual(program.drafted(0, None, result), [(0, 26)])
+
+    def test_reached_target_weight_completes_the_draft(self):
+        self.connection = create_connection_mockup()
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 0)
+        executor = StepwiseProgramExecutor(Mainboard(self.connection))
+        result = executor.execute(create_program())
+        self.assertEqual((result.step_index, result.remaining), (0, 0))
+
+class TestMixingProgram(BarBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.config.upload_mixing_program = True
+        self.sent_lines = []
+        send = self.connection.send
+        def record_and_send(line):
+            self.sent_lines.append(line)
+            send(line)
+        self.connection.send = record_and_send
+
+    def answer_message(self, message_type: UserMessageType):
+        """Answer with yes once the message is shown"""
+        def answer(message):
+            if message == message_type:
+                # the barbot resets the input after showing the message
+                threading.Timer(0.1, self.bot.set_user_input, [UserInputType.YES]).start()
+        self.bot.on_message_changed = answer
+
+    def programs_sent(self):
+        return [line for line in self.sent_lines if line.startswith("Program")]
+
+    def test_resume_after_ingredient_empty(self):
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 25)
+        self.answer_message(UserMessageType.INGREDIENT_EMPTY)
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        programs = self.programs_sent()
+        self.assertEqual(len(programs), 2)
+        # the program is resumed with the remaining weight of the empty ingredient
+        self.assertTrue(programs[1].startswith("Program D0:25:"))
+        self.bot._parties.current_party.add_order.assert_called_once()
+
+    def test_continue_with_other_port_of_empty_ingredient(self):
+        self.ports.update({3: get_ingredient_by_identifier("vodka")})
+        messages = []
+        self.bot.on_message_changed = messages.append
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 25)
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        programs = self.programs_sent()
+        self.assertEqual(len(programs), 2)
+        # the remaining weight is drafted from the other bottle without asking the user
+        self.assertTrue(programs[1].startswith("Program D3:25:"))
+        self.assertNotIn(UserMessageType.INGREDIENT_EMPTY, messages)
+        self.assertEqual(self.bot.empty_ports, {0})
+        # the next drink starts with the other bottle, until the bottle was replaced
+        self.mix(create_recipe(("vodka", 4)))
+        self.assertTrue(self.programs_sent()[2].startswith("Program D3:40:"))
+        self.change_bottles([0])
+        self.assertEqual(self.bot.empty_ports, set())
+
+    def test_other_port_is_not_used_for_nothing(self):
+        self.ports.update({3: get_ingredient_by_identifier("vodka")})
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 0)
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        programs = self.programs_sent()
+        self.assertEqual(len(programs), 2)
+        # the mainboard can not draft 0 g, the program continues with the next step
+        self.assertTrue(programs[1].startswith("Program D1:100:"))
+        self.assertEqual(self.bot.empty_ports, {0})
+
+    def test_refilled_port_is_used_again(self):
+        self.connection.set_error_for_command("Draft", ErrorType.INGREDIENT_EMPTY.value, 25)
+        self.answer_message(UserMessageType.INGREDIENT_EMPTY)
+        self.mix(create_recipe(("vodka", 4)))
+        # the user refilled the only bottle
+        self.assertEqual(self.bot.empty_ports, set())
+
+    def test_glas_removed_stops_mixing(self):
+        self.connection.set_error_for_command("Draft", ErrorType.GLAS_REMOVED.value)
+        self.answer_message(UserMessageType.GLAS_REMOVED_WHILE_DRAFTING)
+        self.mix(create_recipe(("vodka", 4), ("saft orange", 10)))
+        self.assertEqual(len(self.programs_sent()), 1)
@@ -48,3 +48,10 @@ class TestRecipe(unittest.TestCase):
         # load test data
         recipe = load_recipe_from_yaml(data, self.test_recipe.name)
         assert self.test_recipe.equal_to(recipe)
+
+    def test_keep_order(self):
+        assert "keep_order" not in self.test_recipe.to_yaml()
+        self.test_recipe.keep_order = True
+        recipe = load_recipe_from_yaml(self.test_recipe.to_yaml(), self.test_recipe.name)
+        assert recipe.keep_order
+        assert recipe.copy().keep_order
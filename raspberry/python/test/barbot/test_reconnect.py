@@ -0,0 +1,149 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import random
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import bluetooth
+from barbot import BarBotState
+from barbot.clock import VirtualClock
+from barbot.communication import Mainboard, MainboardConnectionBluetooth
+from barbot.emulator import MainboardEmulator
+from barbot.reconnect import ReconnectManager
+from test.barbot.test_barbot import BarBotTestCase
+
+class FakeBluetooth:
+    """Replaces the sockets and the discovery of pybluez, the sockets talk to an emulator"""
+    def __init__(self, clock: VirtualClock, address: str):
+        self.emulator = MainboardEmulator(clock)
+        self.address = address
+        # whether the connection works
+        self.available = True
+        # number of connection attempts that fail before the connection works again
+        self.failing_connects = 0
+        self.discoveries = 0
+
+    def discover_devices(self, lookup_names=False):
+        self.discoveries += 1
+        return [(self.address, "Bar Bot 4.0")]
+
+    def create_socket(self, _protocol):
+        return FakeSocket(self)
+
+class FakeSocket:
+    def __init__(self, fake: FakeBluetooth):
+        self._fake = fake
+
+    def connect(self, address):
+        if self._fake.failing_connects > 0 or address[0] != self._fake.address:
+            self._fake.failing_connects -= 1
+            raise bluetooth.BluetoothError("Host is down")
+        self._fake.available = True
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, data: bytes):
+        # like a real socket, sending does not fail before the connection timed out
+        if self._fake.available:
+            self._fake.emulator.receive_line(data.decode().strip())
+
+    def recv_into(self, buffer: memoryview) -> int:
+        line = self._fake.emulator.read_line() if self._fake.available else None
+        if line is None:
+            raise bluetooth.BluetoothError("timed out")
+        data = f"{line}\r\n".encode()
+        buffer[:len(data)] = data
+        return len(data)
+
+class TestReconnectManager(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.found = threading.Event()
+        self.manager = ReconnectManager(self.find, min_delay=0.1, max_delay=1, jitter=0.2,
+            failures_before_discovery=3, clock=self.clock, random_generator=random.Random(1))
+
+    def find(self):
+        self.found.set()
+        return "00:00:00:00:00:01"
+
+    def test_exponential_backoff_with_jitter(self):
+        assert self.manager.delay == 0
+        delays = []
+        for _ in range(6):
+            self.manager.attempt_failed()
+            start_time = self.clock.time()
+            self.manager.wait()
+            delays.append(self.clock.time() - start_time)
+        for delay, expected in zip(delays, [0.1, 0.2, 0.4, 0.8, 1, 1]):
+            assert expected * 0.8 <= delay <= expected * 1.2
+        self.manager.connected()
+        assert self.manager.delay == 0
+
+    def test_discovery_after_repeated_failures(self):
+        self.manager.attempt_failed()
+        self.manager.attempt_failed()
+        assert not self.manager.is_discovering
+        assert self.manager.take_discovered_identifier() is None
+        self.manager.attempt_failed()
+        assert self.found.wait(1)
+        self.manager.wait_for_discovery(1)
+        assert self.manager.take_discovered_identifier() == "00:00:00:00:00:01"
+        assert self.manager.take_discovered_identifier() is None
+        assert self.manager.metrics.discoveries == 1
+
+    def test_time_to_reconnect(self):
+        # connecting on startup is not a reconnect
+        self.manager.connected()
+        assert self.manager.metrics.reconnects == 0
+        self.manager.connection_lost()
+        self.clock.sleep(2.5)
+        # only the first loss counts
+        self.manager.connection_lost()
+        self.manager.connected()
+        assert self.manager.metrics.reconnects == 1
+        assert self.manager.metrics.last_time_to_reconnect == 2.5
+
+class TestBarBotReconnect(BarBotTestCase):
+    address = "00:80:41:ae:fd:7e"
+
+    def start_bot(self, clock):
+        self.clock = clock
+        self.fake = FakeBluetooth(clock, self.address)
+        self.config.mac_address = self.address
+        patches = [
+            patch.object(bluetooth, "BluetoothSocket", self.fake.create_socket),
+            patch.object(bluetooth, "discover_devices", self.fake.discover_devices),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.run_bot(Mainboard(MainboardConnectionBluetooth(), clock))
+
+    def drop_connection(self, failed_attempts: int):
+        """Drop the connection, it works again after the given number of attempts failed"""
+        self.fake.failing_connects = failed_attempts
+        self.fake.available = False
+        deadline = time.monotonic() + 5
+        while self.bot.reconnect_metrics.reconnects == 0:
+            assert time.monotonic() < deadline, "Not reconnected"
+            time.sleep(0.001)
+        self.wait_for_state(BarBotState.IDLE)
+
+    def test_reconnects_to_cached_address(self):
+        self.drop_connection(failed_attempts=3)
+        metrics = self.bot.reconnect_metrics
+        assert metrics.reconnects == 1
+        assert metrics.discoveries == 0
+        assert self.fake.discoveries == 0
+        # three attempts with a growing delay, much faster than the fixed second it used to be
+        assert 0 < metrics.last_time_to_reconnect < 3
+
+    def test_discovers_after_repeated_failures(self):
+        self.drop_connection(failed_attempts=8)
+        assert self.bot.reconnect_metrics.discoveries >= 1
+        assert self.bot.reconnect_metrics.reconnects == 1
+        assert self.config.mac_address == self.address
@@ -0,0 +1,105 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import unittest
+from barbot import MixingOptions
+from barbot.communication import Mainboard
+from barbot.config import BarBotConfig, GLASS_REMOVAL_DELAY, HANDS_OFF_DELAY, IngredientType
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from barbot.flow import FlowRateModel
+from barbot.planner import MotionModel, port_position
+from barbot.timeline import PLACE_GLASS_TIME, Phase, TimelineAccuracy, TimelineSimulator
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+from test.barbot.test_program import create_ports
+
+class TestTimelineSimulator(unittest.TestCase):
+    def setUp(self):
+        self.config = BarBotConfig(load_on_init=False)
+        self.flow_model = FlowRateModel(load_on_init=False)
+        self.simulator = TimelineSimulator(self.config, create_ports(), self.flow_model)
+        self.recipe = create_recipe(("vodka", 4), ("sirup grenadine", 2), ("ruehren", 0))
+
+    def test_phases(self):
+        self.flow_model.add_draft(0, IngredientType.SPIRIT, 40, 2)
+        options = MixingOptions(self.recipe, add_straw=True, add_ice=True)
+        timeline = self.simulator.simulate(options)
+        self.assertEqual(
+            [entry.phase for entry in timeline.entries if entry.phase != Phase.MOVE],
+            [Phase.GLASS_WAIT, Phase.DRAFT, Phase.DRAFT, Phase.STIR, Phase.CRUSH,
+             Phase.STRAW, Phase.REMOVAL]
+        )
+        self.assertEqual(timeline.duration_of(Phase.GLASS_WAIT), HANDS_OFF_DELAY)
+        # the learned rate of vodka is 20 g/s, grenadine uses the default rate
+        drafts = [entry for entry in timeline.entries if entry.phase == Phase.DRAFT]
+        self.assertAlmostEqual(drafts[0].duration, 2)
+        self.assertAlmostEqual(drafts[1].duration, 2)
+        self.assertEqual(timeline.duration_of(Phase.STIR), self.config.stirring_time / 1000)
+        self.assertEqual(timeline.duration_of(Phase.CRUSH), self.config.ice_amount / 20)
+        self.assertEqual(timeline.entries[-1].duration, GLASS_REMOVAL_DELAY)
+        # the entries follow each other
+        for previous, following in zip(timeline.entries, timeline.entries[1:]):
+            self.assertAlmostEqual(previous.end, following.start)
+
+    def test_moves(self):
+        timeline = self.simulator.simulate(MixingOptions(create_recipe(("sirup grenadine", 2))))
+        motion = MotionModel.from_config(self.config)
+        # to the port and back to the start
+        self.assertAlmostEqual(timeline.duration_of(Phase.MOVE),
+                               2 * motion.move_time(0, port_position(2)))
+
+    def test_glass_wait(self):
+        options = MixingOptions(self.recipe)
+        self.assertAlmostEqual(
+            self.simulator.simulate(options, has_glass=False).total
+                - self.simulator.simulate(options).total,
+            PLACE_GLASS_TIME
+        )
+
+class TestTimelineAccuracy(unittest.TestCase):
+    def test_report(self):
+        accuracy = TimelineAccuracy()
+        self.assertIsNone(accuracy.report)
+        accuracy.add(40, 50)
+        accuracy.add(60, 50)
+        accuracy.add(50, 50)
+        report = accuracy.report
+        self.assertEqual(report.drinks, 3)
+        self.assertAlmostEqual(report.mean_error, 0)
+        self.assertAlmostEqual(report.mean_absolute_error, 20 / 3)
+        self.assertAlmostEqual(report.mean_relative_error, 0.4 / 3)
+
+class TestBarBotTimeline(BarBotTestCase):
+    def start_bot(self, clock):
+        self.clock = clock
+        self.emulator = MainboardEmulator(clock)
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.run_bot(Mainboard(self.connection, clock))
+
+    def test_prediction_matches_emulator(self):
+        recipe = create_recipe(("saft orange", 10), ("vodka", 4), ("ruehren", 0))
+        # the flow rates are learned with the first drink
+        self.mix(recipe)
+        self.bot._timeline_accuracy = TimelineAccuracy()
+        for _ in range(2):
+            self.mix(recipe)
+        report = self.bot.timeline_accuracy
+        self.assertEqual(report.drinks, 2)
+        self.assertLess(report.mean_relative_error, 0.1)
+
+    def test_queue_etas_are_simulated(self):
+        short = create_recipe(("vodka", 2))
+        long = create_recipe(("saft orange", 20), ("ruehren", 0))
+        # the glas of the previous drink is still there, so the orders wait
+        self.bot._glass_removal_pending = True
+        self.bot._orders.enqueue(short)
+        self.bot._orders.enqueue(long)
+        etas = [eta for _, eta in self.bot.order_etas()]
+        self.assertAlmostEqual(etas[0], self.bot.simulate(MixingOptions(short), False).total)
+        self.assertAlmostEqual(etas[1] - etas[0],
+                               self.bot.simulate(MixingOptions(long), False).total)
+
+    def test_aborted_drink_is_not_measured(self):
+        def abort_after_first_step(progress):
+            if progress > 0:
+                self.bot.abort_mixing()
+        self.bot.on_mixing_progress_changed = abort_after_first_step
+        self.mix(create_recipe(("saft orange", 10), ("vodka", 4)))
+        self.assertIsNone(self.bot.timeline_accuracy)
@@ -11,7 +11,7 @@ from barbot.communication import BoardType
 from barbot.mockup import MaiboardConnectionMockup
 from barbotgui.main_window import MainWindow
 from barbotgui.userviews import ListRecipes, RecipeNewOrEdit
-from barbotgui.userviews import SingleIngredient, Statistics, OrderRecipe
+from barbotgui.userviews import SingleIngredient, Statistics, OrderRecipe, Orders
 from barbotgui.adminviews import AdminLogin, BalanceCalibration, Overview
 from barbotgui.adminviews import Ports, Cleaning, Settings, RemoveRecipe
 
@@ -91,6 +91,7 @@ class TestGui:
             RecipeNewOrEdit,
             SingleIngredient,
             Statistics,
+            Orders,
             RecipeNewOrEdit
         ]
         for view in views:
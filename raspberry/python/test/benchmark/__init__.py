@@ -0,0 +1 @@
+"""This file is need to make test a module. This makes it possible to import other modules."""
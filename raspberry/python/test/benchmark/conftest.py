@@ -0,0 +1,16 @@
+"""Timing comparisons depend on the load of the machine, so they only run on request"""
+import os
+import pytest
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "timing: compares durations, only runs if BARBOT_TIMING=1 is set"
+    )
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("BARBOT_TIMING") == "1":
+        return
+    skip_timing = pytest.mark.skip(reason="timing comparison, set BARBOT_TIMING=1 to run it")
+    for item in items:
+        if "timing" in item.keywords:
+            item.add_marker(skip_timing)
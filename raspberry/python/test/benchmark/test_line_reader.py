@@ -0,0 +1,64 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import time
+import unittest
+import pytest
+from barbot.communication import LineReader
+
+LINE_COUNT = 100000
+PACKET_SIZE = 1024
+
+def read_lines_concatenating(packets):
+    """Framing as it was done before the LineReader was introduced"""
+    packets = iter(packets)
+    data = b''
+    while True:
+        received = next(packets)
+        data += received
+        if len(received) == PACKET_SIZE:
+            continue
+        if data[-1:] == b'\n':
+            break
+    return data.decode('utf-8').replace('\r', '').split('\n')[:-1]
+
+class TestLineReader(unittest.TestCase):
+    def setUp(self):
+        # a burst of status messages, e.g. after the raspberry was busy for a while
+        stream = b"".join(
+            f"STATUS Draft\r\nACK GetWeight {i % 400}\r\n".encode() for i in range(LINE_COUNT // 2)
+        )
+        self.packets = [stream[i:i + PACKET_SIZE] for i in range(0, len(stream), PACKET_SIZE)]
+        # the old implementation only stops reading on a packet that is not full
+        if len(self.packets[-1]) == PACKET_SIZE:
+            self.packets.append(b"")
+
+    def _read_with_line_reader(self):
+        packets = iter(self.packets)
+        current = [memoryview(b"")]
+        def recv_into(buffer):
+            if len(current[0]) == 0:
+                current[0] = memoryview(next(packets))
+            length = min(len(buffer), len(current[0]))
+            buffer[:length] = current[0][:length]
+            current[0] = current[0][length:]
+            return length
+        reader = LineReader(recv_into)
+        return [reader.read_line() for _ in range(LINE_COUNT)]
+
+    def test_status_burst(self):
+        assert self._read_with_line_reader() == read_lines_concatenating(self.packets)
+
+    @pytest.mark.timing
+    def test_status_burst_duration(self):
+        start_time = time.perf_counter()
+        read_lines_concatenating(self.packets)
+        concatenating_duration = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        self._read_with_line_reader()
+        line_reader_duration = time.perf_counter() - start_time
+
+        logging.info("%i lines in %i packets: concatenating %.1f ms, LineReader %.1f ms",
+            LINE_COUNT, len(self.packets), concatenating_duration * 1000, line_reader_duration * 1000)
+        # concatenating the packets is quadratic in the size of the burst
+        assert line_reader_duration < concatenating_duration
@@ -0,0 +1,74 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import time
+import tracemalloc
+import unittest
+import pytest
+from barbot.communication import RawResponse, ResponseParser, ResponseTypes
+
+def parse_line_iterating(line: str):
+    """Parser as it was implemented before the ResponseParser was introduced"""
+    tokens = line.split()
+    if len(tokens) > 0:
+        for msg_type in ResponseTypes:
+            if msg_type.name != tokens[0]:
+                continue
+            if len(tokens) < 2:
+                return (ResponseTypes.COMM_ERROR, "wrong format", [])
+            return (ResponseTypes[tokens[0]], tokens[1], tokens[2:])
+    return (ResponseTypes.COMM_ERROR, "unknown type", [])
+
+def recorded_stream():
+    """Messages as received while waiting for orders and mixing a drink"""
+    idle = ["ACK IsIdle 1", "STATUS IDLE"] * 300
+    draft = ["ACK SetLED", "ACK PlatformLED", "ACK Draft"] \
+        + ["STATUS Draft"] * 20 \
+        + ["DONE Draft", "ACK GetWeight 152"]
+    move = ["ACK Move"] + ["STATUS Move"] * 5 + ["DONE Move"]
+    return (idle + (move + draft) * 5 + ["ACK HasGlas 1"]) * 20
+
+class TestParser(unittest.TestCase):
+    def setUp(self):
+        self.lines = recorded_stream()
+        self.parser = ResponseParser()
+
+    def test_parser_results(self):
+        for line in self.lines:
+            old = parse_line_iterating(line)
+            assert self.parser.parse(line) == RawResponse(old[0], old[1], tuple(old[2]))
+
+    @pytest.mark.timing
+    def test_parser_speed(self):
+        start_time = time.perf_counter()
+        for line in self.lines:
+            parse_line_iterating(line)
+        iterating_duration = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for line in self.lines:
+            self.parser.parse(line)
+        parser_duration = time.perf_counter() - start_time
+
+        logging.info("%i lines: iterating %.1f ms, ResponseParser %.1f ms",
+            len(self.lines), iterating_duration * 1000, parser_duration * 1000)
+        assert parser_duration < iterating_duration
+
+    def test_idle_lines_do_not_allocate(self):
+        idle_lines = ["ACK IsIdle 1", "STATUS IDLE"] * 1000
+        # fill the cache
+        for line in idle_lines:
+            self.parser.parse(line)
+        tracemalloc.start()
+        try:
+            snapshot_before = tracemalloc.take_snapshot()
+            for line in idle_lines:
+                self.parser.parse(line)
+            snapshot_after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        allocated = sum(
+            stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename")
+            if stat.traceback[0].filename.endswith("communication.py")
+        )
+        logging.info("allocated while parsing %i idle lines: %i bytes", len(idle_lines), allocated)
+        assert allocated <= 0
@@ -0,0 +1,52 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import time
+import unittest
+import pytest
+from barbot.communication import Mainboard
+from barbot.mockup import MaiboardConnectionMockup
+
+class TestPipelining(unittest.TestCase):
+    def setUp(self):
+        # same commands as sent on startup
+        self.commands = [
+            ("SetLED", 3),
+            ("SetSpeed", 200),
+            ("SetAccel", 300),
+            ("SetPumpPower", 100),
+            ("SetBalanceCalibration", -1040),
+            ("SetBalanceOffset", -119),
+        ]
+        self.connection_mockup = MaiboardConnectionMockup()
+        # the mockup answers a SET after this time, which is close to a bluetooth round trip
+        self.connection_mockup.duration_SET = 0.05
+        self.mainboard = Mainboard(self.connection_mockup)
+
+    def test_pipelined_sends_same_commands(self):
+        for command in self.commands:
+            assert self.mainboard.set(*command).was_successfull
+        sequential_history = self.connection_mockup.command_history
+        self.connection_mockup.clear_command_history()
+
+        # the values are known already, so they have to be forced
+        results = self.mainboard.set_pipelined(*self.commands, force=True)
+
+        assert all(result.was_successfull for result in results)
+        assert self.connection_mockup.command_history == sequential_history
+
+    @pytest.mark.timing
+    def test_pipelined_saves_round_trips(self):
+        start_time = time.perf_counter()
+        for command in self.commands:
+            assert self.mainboard.set(*command).was_successfull
+        sequential_duration = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        results = self.mainboard.set_pipelined(*self.commands, force=True)
+        pipelined_duration = time.perf_counter() - start_time
+
+        assert all(result.was_successfull for result in results)
+        logging.info("%i SET commands: sequential %.0f ms, pipelined %.0f ms",
+            len(self.commands), sequential_duration * 1000, pipelined_duration * 1000)
+        # only the first round trip has to be waited for
+        assert pipelined_duration < sequential_duration / 2
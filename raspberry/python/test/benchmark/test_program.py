@@ -0,0 +1,51 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import time
+import unittest
+import pytest
+from barbot.communication import Mainboard
+from barbot.config import BarBotConfig, PortConfiguration, get_ingredient_by_identifier
+from barbot.mockup import MaiboardConnectionMockup
+from barbot.program import StepwiseProgramExecutor, UploadProgramExecutor, compile_mixing
+from barbot.recipes import RecipeItem
+
+class TestProgramUpload(unittest.TestCase):
+    def setUp(self):
+        ingredients = ["rum weiss", "rum braun", "sirup grenadine", "saft orange", "saft ananas"]
+        ports = PortConfiguration(load_on_init=False)
+        ports.update({port: get_ingredient_by_identifier(identifier)
+                      for port, identifier in enumerate(ingredients)})
+        items = [RecipeItem(get_ingredient_by_identifier(identifier), 2)
+                 for identifier in ingredients]
+        self.program = compile_mixing(items, ports, BarBotConfig(load_on_init=False))
+        self.connection_mockup = MaiboardConnectionMockup()
+        # a step takes this long on the mainboard, shortened to keep the benchmark fast
+        self.connection_mockup.duration_DO = 0.02
+        self.connection_mockup.duration_SET = 0
+        self.connection_mockup.status_interval = 0.01
+        # close to a bluetooth round trip
+        self.connection_mockup.latency = 0.05
+
+    def mix(self, executor_class) -> float:
+        """Execute the program and return the drinks per hour"""
+        executor = executor_class(Mainboard(self.connection_mockup))
+        start_time = time.perf_counter()
+        assert executor.execute(self.program).was_successfull
+        return 3600 / (time.perf_counter() - start_time)
+
+    def test_upload_executes_same_steps(self):
+        self.mix(StepwiseProgramExecutor)
+        stepwise_history = self.connection_mockup.command_history
+        self.connection_mockup.clear_command_history()
+        self.mix(UploadProgramExecutor)
+        assert self.connection_mockup.command_history == ["Program"]
+        assert stepwise_history.count("Draft") == 5
+
+    @pytest.mark.timing
+    def test_upload_increases_drinks_per_hour(self):
+        stepwise_drinks_per_hour = self.mix(StepwiseProgramExecutor)
+        upload_drinks_per_hour = self.mix(UploadProgramExecutor)
+        logging.info("%i steps: per item %.0f drinks/h, uploaded %.0f drinks/h",
+            len(self.program), stepwise_drinks_per_hour, upload_drinks_per_hour)
+        # only one round trip instead of one per step and pump power
+        assert upload_drinks_per_hour > stepwise_drinks_per_hour * 1.5
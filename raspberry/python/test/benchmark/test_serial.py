@@ -0,0 +1,46 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import unittest
+import pytest
+from barbot.communication import Mainboard, MainboardConnectionSerial
+from barbot.emulator import MainboardEmulator, serve_pty
+from barbot.mockup import MaiboardConnectionMockup
+
+class TestSerialLatency(unittest.TestCase):
+    def setUp(self):
+        emulator = MainboardEmulator()
+        # answer as fast as the firmware loop
+        emulator.tick = 0.001
+        self.server, self.path = serve_pty(emulator)
+        self.serial = Mainboard(MainboardConnectionSerial())
+        assert self.serial.connect(self.path)
+        connection_mockup = MaiboardConnectionMockup()
+        connection_mockup.duration_GET = 0
+        connection_mockup.status_interval = 0.3
+        # close to a bluetooth round trip
+        connection_mockup.latency = 0.05
+        connection_mockup.set_result_for_getter("GetWeight", 350)
+        self.bluetooth = Mainboard(connection_mockup)
+
+    def tearDown(self):
+        self.serial.disconnect()
+        self.server.stop()
+
+    def get_weight_latency(self, mainboard: Mainboard, count: int = 50) -> float:
+        """Read the weight several times and return the median latency in seconds"""
+        mainboard.instrumentation.reset()
+        for _ in range(count):
+            assert mainboard.get("GetWeight").was_successfull
+        return mainboard.instrumentation.snapshot()["GetWeight"].ack_latency.p50
+
+    def test_same_answers(self):
+        assert self.serial.get("GetWeight").return_parameters == ["350"]
+        assert self.bluetooth.get("GetWeight").return_parameters == ["350"]
+
+    @pytest.mark.timing
+    def test_serial_is_faster_than_bluetooth(self):
+        serial_latency = self.get_weight_latency(self.serial)
+        bluetooth_latency = self.get_weight_latency(self.bluetooth)
+        logging.info("GetWeight round trip: serial %.1f ms, bluetooth %.1f ms",
+            serial_latency * 1000, bluetooth_latency * 1000)
+        assert serial_latency < bluetooth_latency / 2
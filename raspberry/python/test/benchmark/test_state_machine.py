@@ -0,0 +1,71 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import time
+import pytest
+from barbot import BarBotState, MixingOptions, UserInputType, UserMessageType
+from barbot.clock import Clock
+from barbot.communication import Mainboard
+from barbot.emulator import MainboardConnectionEmulator, MainboardEmulator
+from test.barbot.test_barbot import BarBotTestCase, create_recipe
+
+class TestStateMachineLatency(BarBotTestCase):
+    def start_bot(self, clock):
+        # the latencies are only meaningful in real time
+        self.clock = Clock()
+        self.emulator = MainboardEmulator(self.clock)
+        self.connection = MainboardConnectionEmulator(self.emulator)
+        self.run_bot(Mainboard(self.connection, self.clock))
+
+    def wait_for_message(self, message: UserMessageType):
+        deadline = time.monotonic() + 5
+        while self.bot.current_message != message:
+            assert time.monotonic() < deadline, f"Message {message} not shown"
+            time.sleep(0.01)
+
+    def cpu_load_of_bot(self, duration: float) -> float:
+        """Measure the fraction of the time the thread of the state machine used the cpu"""
+        clock_id = time.pthread_getcpuclockid(self.bot_thread.ident)
+        start_cpu_time = time.clock_gettime(clock_id)
+        time.sleep(duration)
+        return (time.clock_gettime(clock_id) - start_cpu_time) / duration
+
+    @pytest.mark.timing
+    def test_abort_while_waiting_for_glass(self):
+        self.emulator.remove_glass()
+        self.bot.start_mixing(MixingOptions(create_recipe(("vodka", 2))))
+        self.wait_for_message(UserMessageType.PLACE_GLAS)
+        self.bot.abort_mixing()
+        self.wait_for_state(BarBotState.IDLE)
+        latency = self.bot.transitions[-1].latency
+        logging.info("Abort while waiting for the glass: %.1f ms", latency * 1000)
+        # the prompt ends right away, not after the glass was placed
+        assert latency < 0.2
+
+    @pytest.mark.timing
+    def test_idle_cpu_load(self):
+        before = self.bot.idle_metrics
+        time.sleep(3)
+        after = self.bot.idle_metrics
+        cpu_load = (after.idle_cpu_time - before.idle_cpu_time) \
+            / (after.idle_time - before.idle_time)
+        logging.info("CPU load while idle: %.3f %%", cpu_load * 100)
+        assert cpu_load < 0.01
+
+    @pytest.mark.timing
+    def test_cpu_load_during_prompts(self):
+        self.emulator.remove_glass()
+        self.bot.start_mixing(MixingOptions(create_recipe(("vodka", 2))))
+        self.wait_for_message(UserMessageType.PLACE_GLAS)
+        glass_load = self.cpu_load_of_bot(2)
+        self.bot.set_user_input(UserInputType.NO)
+        self.wait_for_state(BarBotState.IDLE)
+        self.bot.start_cleaning(0)
+        self.wait_for_message(UserMessageType.CLEANING_ADAPTER)
+        answer_load = self.cpu_load_of_bot(2)
+        # nothing can be read anymore, so reading must not be what the prompt waits for
+        self.connection.disconnect()
+        disconnected_load = self.cpu_load_of_bot(2)
+        logging.info("CPU load waiting for the glass: %.2f %%, for an answer: %.2f %%, "
+            "for an answer without connection: %.2f %%",
+            glass_load * 100, answer_load * 100, disconnected_load * 100)
+        assert max(glass_load, answer_load, disconnected_load) < 0.05
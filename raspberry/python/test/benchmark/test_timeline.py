@@ -0,0 +1,52 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring, protected-access
+import logging
+import os
+import time
+import unittest
+import pytest
+from barbot import MixingOptions
+from barbot.config import BarBotConfig, IngredientType, PortConfiguration, PORT_COUNT
+from barbot.recipes import load_recipe_from_file
+from barbot.timeline import TimelineSimulator
+
+recipes_directory = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "recipes")
+REPETITIONS = 20
+
+class TestTimelineSimulator(unittest.TestCase):
+    def setUp(self):
+        self.config = BarBotConfig(load_on_init=False)
+        self.recipes = [
+            load_recipe_from_file(recipes_directory, filename)
+            for filename in sorted(os.listdir(recipes_directory))
+            if filename.endswith(".yaml")
+        ]
+        # connect the ingredients of the first recipes, like a party setup
+        ingredients = []
+        for recipe in self.recipes:
+            for item in recipe.items:
+                if item.ingredient.type in [IngredientType.STIRR, IngredientType.SUGAR]:
+                    continue
+                if item.ingredient not in ingredients:
+                    ingredients.append(item.ingredient)
+        self.ports = PortConfiguration(load_on_init=False)
+        self.ports.update(dict(enumerate(ingredients[:PORT_COUNT])))
+
+    def simulate_all(self) -> float:
+        """Simulate every recipe, like the recipe list does
+        :returns: The average time per recipe in seconds"""
+        simulator = TimelineSimulator(self.config, self.ports)
+        start = time.perf_counter()
+        for _ in range(REPETITIONS):
+            for recipe in self.recipes:
+                simulator.simulate(MixingOptions(recipe, add_ice=True))
+        return (time.perf_counter() - start) / REPETITIONS / len(self.recipes)
+
+    @pytest.mark.timing
+    def test_fast_enough_for_the_recipe_list(self):
+        for minimize_travel in [False, True]:
+            self.config.minimize_travel = minimize_travel
+            duration = self.simulate_all()
+            logging.info("%i recipes, planned %s: %.2f ms per recipe",
+                len(self.recipes), minimize_travel, duration * 1000)
+            # the whole list is shown without a noticeable delay
+            assert duration * len(self.recipes) < 0.1